@@ -0,0 +1,171 @@
+
+from bisect import bisect_left, insort
+
+from snap7_connection import ACCESS_SIZES
+from tag_model import DataType
+
+# Widest tag (LReal) in bits, bounds how far back an overlap search looks
+MAX_SPAN_BITS = 64
+
+# Block read limits: an S7 read fits ~220 bytes with the default 240 byte PDU
+DEFAULT_MAX_GAP = 16
+DEFAULT_MAX_READ_SIZE = 200
+
+
+def tag_span(tag):
+    """
+    Storage used by a tag, in bits
+    A Bool on a bit address takes one bit, anything else whole bytes: the
+    declared type size, or more if PLCConnection reads/writes more (Int is
+    written as 4 bytes).
+    Returns: ((area, db), start_bit, end_bit) or None if the address is invalid
+    """
+    if not tag.location:
+        return None
+    area, db_num, byte_addr, bit_addr = tag.location
+    key = (int(area), db_num)
+
+    type_name = tag.type_name
+    if bit_addr is not None and type_name == 'Bool':
+        start = byte_addr * 8 + bit_addr
+        return key, start, start + 1
+
+    bits = tag.data_type.bits if isinstance(tag.data_type, DataType) else 8
+    bits = max(bits, ACCESS_SIZES.get(type_name, 0) * 8, 8)
+    start = byte_addr * 8
+    return key, start, start + bits
+
+
+class AddressIndex:
+    """
+    Interval index over the PLC storage used by the tags of one station
+
+    Intervals are kept sorted by start bit per (area, db). Since no tag is
+    wider than MAX_SPAN_BITS, overlaps with a new interval are found with
+    one bisect plus a short scan.
+    """
+
+    def __init__(self):
+        self._spans = {}   # tag_name -> (key, start, end)
+        self._sorted = {}  # (area, db) -> sorted [(start, end, tag_name)]
+        self._reads = {}   # tag_name -> (location, type_name) of readable tags
+
+    def __len__(self):
+        return len(self._spans)
+
+    def __contains__(self, tag_name):
+        return tag_name in self._spans
+
+    def rebuild(self, station_tags):
+        """
+        Index all tags of a station
+        Returns: [(tag_name, other_tag_name), ...] overlapping pairs
+        """
+        self._spans.clear()
+        self._sorted.clear()
+        self._reads.clear()
+        for tag_name, tag in station_tags.items():
+            self._add(tag_name, tag)
+        for intervals in self._sorted.values():
+            intervals.sort()
+        return self.conflict_pairs()
+
+    def update(self, tag_name, tag):
+        """
+        Re-index one tag after its address or type changed
+        Returns: names of the tags it now overlaps
+        """
+        self.remove(tag_name)
+        span = self._add(tag_name, tag, keep_sorted=True)
+        if span is None:
+            return []
+        return self.overlaps(*span, exclude=tag_name)
+
+    def remove(self, tag_name):
+        span = self._spans.pop(tag_name, None)
+        self._reads.pop(tag_name, None)
+        if span is None:
+            return
+        key, start, end = span
+        intervals = self._sorted[key]
+        i = bisect_left(intervals, (start, end, tag_name))
+        if i < len(intervals) and intervals[i] == (start, end, tag_name):
+            del intervals[i]
+
+    def rename(self, old_name, new_name, tag):
+        self.remove(old_name)
+        return self.update(new_name, tag)
+
+    def _add(self, tag_name, tag, keep_sorted=False):
+        span = tag_span(tag)
+        if span is None:
+            return None
+        key, start, end = span
+        self._spans[tag_name] = span
+        intervals = self._sorted.setdefault(key, [])
+        if keep_sorted:
+            insort(intervals, (start, end, tag_name))
+        else:
+            intervals.append((start, end, tag_name))
+        if tag.type_name in ACCESS_SIZES:
+            self._reads[tag_name] = (tag.location, tag.type_name)
+        return span
+
+    def overlaps(self, key, start, end, exclude=None):
+        """Names of the tags using any bit of [start, end) in an (area, db)"""
+        intervals = self._sorted.get(key)
+        if not intervals:
+            return []
+        result = []
+        i = bisect_left(intervals, (start - MAX_SPAN_BITS + 1,))
+        while i < len(intervals) and intervals[i][0] < end:
+            other_start, other_end, other_name = intervals[i]
+            if other_end > start and other_name != exclude:
+                result.append(other_name)
+            i += 1
+        return result
+
+    def conflicts(self, tag_name):
+        """Names of the tags overlapping tag_name"""
+        span = self._spans.get(tag_name)
+        if span is None:
+            return []
+        return self.overlaps(*span, exclude=tag_name)
+
+    def conflict_pairs(self):
+        """All overlapping pairs, one sweep per (area, db)"""
+        pairs = []
+        for intervals in self._sorted.values():
+            active = []
+            for start, end, tag_name in intervals:
+                active = [item for item in active if item[0] > start]
+                for _, other_name in active:
+                    pairs.append((other_name, tag_name))
+                active.append((end, tag_name))
+        return pairs
+
+    def read_ranges(self, max_gap=DEFAULT_MAX_GAP, max_size=DEFAULT_MAX_READ_SIZE):
+        """
+        Merge readable tags into contiguous byte ranges for block reads
+        Tags closer than max_gap bytes share one range, a range never grows
+        beyond max_size bytes.
+        Returns: [(area, db, start_byte, size, [(tag_name, location, type_name), ...]), ...]
+        """
+        ranges = []
+        for (area, db_num), intervals in self._sorted.items():
+            current = None
+            for start, end, tag_name in intervals:
+                read = self._reads.get(tag_name)
+                if read is None:
+                    continue
+                location, type_name = read
+                first = location[2]
+                last = first + ACCESS_SIZES[type_name]
+                if current and first - current[1] <= max_gap and max(last, current[1]) - current[0] <= max_size:
+                    current[1] = max(current[1], last)
+                    current[2].append((tag_name, location, type_name))
+                else:
+                    current = [first, last, [(tag_name, location, type_name)]]
+                    ranges.append((location[0], db_num, current))
+        return [(area, db_num, first, last - first, members)
+                for area, db_num, (first, last, members) in ranges]
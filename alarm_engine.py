@@ -0,0 +1,213 @@
+
+import time
+
+import numpy as np
+
+# HI/LO: analog limits with hysteresis, ON/OFF: bit-state alarms
+ALARM_TYPES = ('HI', 'LO', 'ON', 'OFF')
+_KIND_CODES = {name: code for code, name in enumerate(ALARM_TYPES)}
+HI, LO, ON, OFF = range(len(ALARM_TYPES))
+
+RAISED = 'RAISED'
+CLEARED = 'CLEARED'
+
+
+class AlarmEvent:
+    """One alarm state transition"""
+
+    __slots__ = ('station', 'tag_name', 'kind', 'state', 'value', 'limit', 'timestamp', 'message')
+
+    def __init__(self, station, tag_name, kind, state, value, limit, timestamp, message=''):
+        self.station = station
+        self.tag_name = tag_name
+        self.kind = kind
+        self.state = state
+        self.value = value
+        self.limit = limit
+        self.timestamp = timestamp
+        self.message = message
+
+    def __str__(self):
+        if self.kind in ('HI', 'LO'):
+            text = f"{self.kind} alarm {self.state.lower()} on {self.tag_name}: {self.value:g} (limit {self.limit:g})"
+        else:
+            text = f"{self.kind} alarm {self.state.lower()} on {self.tag_name}: {self.value:g}"
+        return f"{text} - {self.message}" if self.message else text
+
+
+def parse_alarm_rules(tag_name, tag):
+    """
+    Alarm rules of a tag, from its 'alarms' entry in tag_values.json:
+        "alarms": [{"type": "HI", "limit": 80, "hysteresis": 2, "delay_s": 1.0, "message": "..."},
+                   {"type": "ON", "delay_s": 0.5}]
+    Returns: [(tag_name, kind code, limit, hysteresis, delay_s, message), ...]
+    Raises: ValueError for an invalid rule
+    """
+    rules = []
+    for rule in tag.get('alarms') or []:
+        kind = str(rule.get('type', '')).upper()
+        if kind not in _KIND_CODES:
+            raise ValueError(f"{tag_name}: unknown alarm type {rule.get('type')!r}")
+        if kind in ('HI', 'LO') and 'limit' not in rule:
+            raise ValueError(f"{tag_name}: {kind} alarm needs a limit")
+        rules.append((tag_name, _KIND_CODES[kind], float(rule.get('limit', 0.0)),
+                      abs(float(rule.get('hysteresis', 0.0))), float(rule.get('delay_s', 0.0)),
+                      str(rule.get('message', ''))))
+    return rules
+
+
+class AlarmEngine:
+    """
+    Alarm rules of one station compiled into arrays
+
+    compile() turns every rule into one slot of the limit/hysteresis/delay
+    arrays, evaluate() checks all of them against a scan with a handful of
+    vectorized operations. A rule with a delay only raises after its
+    condition held for delay_s; once raised, HI/LO alarms clear only when
+    the value is back past the limit by the hysteresis.
+    """
+
+    def __init__(self, station):
+        self.station = station
+        self.subscribers = []
+        self.columns = {}  # tag_name -> position in the scan vector
+        self.errors = []
+        self._compile_rules([])
+
+    def _compile_rules(self, rules):
+        self.rules = rules
+        self.rule_tags = [rule[0] for rule in rules]
+        self.messages = [rule[5] for rule in rules]
+        self.columns = {}
+        for tag_name in self.rule_tags:
+            self.columns.setdefault(tag_name, len(self.columns))
+        self.column = np.array([self.columns[name] for name in self.rule_tags], dtype=np.int64)
+        self.kind = np.array([rule[1] for rule in rules], dtype=np.int8)
+        self.limit = np.array([rule[2] for rule in rules], dtype=np.float64)
+        self.hysteresis = np.array([rule[3] for rule in rules], dtype=np.float64)
+        self.delay = np.array([rule[4] for rule in rules], dtype=np.float64)
+        self.active = np.zeros(len(rules), dtype=bool)
+        self.pending_since = np.full(len(rules), np.nan)
+        self._is_hi = self.kind == HI
+        self._is_lo = self.kind == LO
+        self._is_on = self.kind == ON
+
+    def compile(self, station_tags):
+        """
+        Build the rule arrays from the tags of the station
+        Nothing changes if the rules are the same as before. Otherwise the
+        state of every (tag, kind) that still has a rule is kept, alarms
+        whose rule is gone are cleared (CLEARED event to the subscribers).
+        Invalid rules are skipped and listed in self.errors.
+        Returns: number of rules
+        """
+        rules = []
+        self.errors = []
+        for tag_name, tag in station_tags.items():
+            try:
+                rules.extend(parse_alarm_rules(tag_name, tag))
+            except (ValueError, TypeError, AttributeError) as e:
+                self.errors.append(str(e))
+        if rules == self.rules:
+            return len(rules)
+
+        previous = {}  # (tag_name, kind code) -> [(active, pending_since, rule), ...] in rule order
+        for i, rule in enumerate(self.rules):
+            previous.setdefault(rule[:2], []).append((bool(self.active[i]), float(self.pending_since[i]), rule))
+        self._compile_rules(rules)
+        for i, rule in enumerate(rules):
+            states = previous.get(rule[:2])
+            if states:
+                self.active[i], self.pending_since[i], _ = states.pop(0)
+
+        now = time.time()
+        removed = [AlarmEvent(self.station, rule[0], ALARM_TYPES[rule[1]], CLEARED, float('nan'), rule[2], now,
+                              'alarm rule removed')
+                   for states in previous.values() for active, _, rule in states if active]
+        for event in removed:
+            for callback in list(self.subscribers):
+                callback(event)
+        return len(rules)
+
+    def rename(self, old_name, new_name):
+        """Follow a renamed tag, its alarm states are kept"""
+        if old_name not in self.columns:
+            return
+        self.rules = [(new_name,) + rule[1:] if rule[0] == old_name else rule for rule in self.rules]
+        self.rule_tags = [rule[0] for rule in self.rules]
+        self.columns = {new_name if name == old_name else name: column for name, column in self.columns.items()}
+
+    def __len__(self):
+        return len(self.rule_tags)
+
+    def subscribe(self, callback):
+        """callback(AlarmEvent) for every transition"""
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+
+    def scan_vector(self, values):
+        """{tag_name: value} -> float vector in rule column order, NaN if missing"""
+        vector = np.full(len(self.columns), np.nan)
+        for tag_name, column in self.columns.items():
+            value = values.get(tag_name)
+            if value is not None:
+                try:
+                    vector[column] = float(value)
+                except (TypeError, ValueError):
+                    pass
+        return vector
+
+    def evaluate(self, values, now):
+        """
+        Check all rules against one scan
+        Args:
+            values: {tag_name: value} or a scan_vector() array
+            now: Scan time (time.time())
+        Returns: [AlarmEvent, ...] transitions of this scan (also sent to subscribers)
+        """
+        if not len(self.rule_tags):
+            return []
+        vector = values if isinstance(values, np.ndarray) else self.scan_vector(values)
+        v = vector[self.column]
+        known = ~np.isnan(v)
+
+        # Raise condition, and the (looser) condition that keeps an active alarm
+        raise_hi = v > self.limit
+        keep_hi = v > self.limit - self.hysteresis
+        raise_lo = v < self.limit
+        keep_lo = v < self.limit + self.hysteresis
+        bit = v != 0
+        condition = np.where(self._is_hi, np.where(self.active, keep_hi, raise_hi),
+                             np.where(self._is_lo, np.where(self.active, keep_lo, raise_lo),
+                                      np.where(self._is_on, bit, ~bit)))
+        # Rules without a value in this scan keep their state
+        condition = np.where(known, condition, self.active)
+
+        starting = condition & ~self.active & np.isnan(self.pending_since)
+        self.pending_since[starting] = now
+        self.pending_since[~condition] = np.nan
+        raised = condition & ~self.active & (now - self.pending_since >= self.delay)
+        cleared = self.active & ~condition
+
+        if not raised.any() and not cleared.any():
+            return []
+        self.active |= raised
+        self.active &= ~cleared
+        self.pending_since[raised] = np.nan
+
+        events = []
+        for i in np.flatnonzero(raised | cleared).tolist():
+            events.append(AlarmEvent(self.station, self.rule_tags[i], ALARM_TYPES[self.kind[i]],
+                                     RAISED if raised[i] else CLEARED, float(v[i]), float(self.limit[i]),
+                                     now, self.messages[i]))
+        for event in events:
+            for callback in list(self.subscribers):
+                callback(event)
+        return events
+
+    def active_alarms(self):
+        """[(tag_name, kind), ...] of the raised alarms"""
+        return [(self.rule_tags[i], ALARM_TYPES[self.kind[i]]) for i in np.flatnonzero(self.active).tolist()]
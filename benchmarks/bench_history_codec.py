@@ -0,0 +1,89 @@
+"""
+History compression benchmark: ratio and throughput of history_codec
+
+Generates PLC-like traces polled every 50 ms with timer jitter (mostly idle
+bools, slowly drifting analog values quantized like a 16 bit input,
+counters, noisy Reals) and reports bytes per sample, compression ratio
+against the fixed-width record format and encode/decode speed.
+
+Usage: python benchmarks/bench_history_codec.py [--samples 100000] [--block 1200]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from history_codec import decode_block, encode_block, iter_block
+from historian_storage import RECORD_DTYPE
+
+
+def poll_times(rng, count, interval_s=0.05):
+    """Polling timestamps with a few ms of timer jitter and rare stalls"""
+    steps = interval_s + rng.integers(-3, 4, count) / 1000.0
+    steps[rng.random(count) < 0.001] += 0.5
+    return 1.7e9 + np.cumsum(steps)
+
+
+def traces(rng, count):
+    """{name: values} of typical PLC signals"""
+    toggles = rng.random(count) < 0.002
+    drift = np.cumsum(rng.normal(0, 0.02, count))
+    return {
+        'bool_idle': (np.cumsum(toggles) % 2).astype(np.float64),
+        'bool_blink_1hz': ((np.arange(count) // 10) % 2).astype(np.float64),
+        'analog_int_16bit': np.round(8000 + drift * 10),
+        'analog_real_scaled': np.round(8000 + drift * 10) * (100.0 / 27648.0),
+        'counter_dint': np.cumsum(rng.random(count) < 0.05).astype(np.float64),
+        'setpoint_constant': np.full(count, 42.5),
+        'noisy_real': 20.0 + rng.normal(0, 0.5, count),
+    }
+
+
+def measure(times, values, block):
+    encoded = []
+    started = time.perf_counter()
+    for i in range(0, len(times), block):
+        encoded.append(encode_block(0, times[i:i + block], values[i:i + block]))
+    encode_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for data in encoded:
+        decode_block(data)
+    decode_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for data in encoded:
+        for _ in iter_block(data):
+            pass
+    stream_s = time.perf_counter() - started
+    return sum(len(data) for data in encoded), encode_s, decode_s, stream_s
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--samples', type=int, default=100000, help='samples per trace')
+    parser.add_argument('--block', type=int, default=1200, help='samples per block (60 s at 50 ms)')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    times = poll_times(rng, args.samples)
+    raw_bytes = RECORD_DTYPE.itemsize * args.samples
+
+    print(f'{args.samples} samples per trace, blocks of {args.block}, raw record {RECORD_DTYPE.itemsize} bytes')
+    print(f"{'trace':<20} {'bytes/sample':>12} {'ratio':>7} {'encode/s':>11} {'decode/s':>11} {'stream/s':>11}")
+    total_size = 0
+    for name, values in traces(rng, args.samples).items():
+        size, encode_s, decode_s, stream_s = measure(times, values, args.block)
+        total_size += size
+        print(f'{name:<20} {size / args.samples:>12.2f} {raw_bytes / size:>7.1f} '
+              f'{args.samples / encode_s:>11,.0f} {args.samples / decode_s:>11,.0f} {args.samples / stream_s:>11,.0f}')
+    count = len(traces(rng, 1))
+    print(f'{"all":<20} {total_size / (args.samples * count):>12.2f} {raw_bytes * count / total_size:>7.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Startup benchmark: time-to-first-paint of TIAPortalGUI
+
+Builds a synthetic tag_values.json with 100 stations in a temp directory,
+starts the GUI there and reports how long it takes until the main window
+is painted for the first time and until the first station is shown.
+
+Usage: python benchmarks/bench_startup.py [--stations 100] [--tags 200]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+TYPES = ['Bool', 'Byte', 'Int', 'DInt', 'Real']
+
+
+def synthetic_tag_values(station_count, tags_per_station):
+    """{station: {tag_name: tag_data}} with the stations of the GUI combo first"""
+    stations = [f'Module{i:02d}_192.168.0.{i * 10}' for i in range(1, 10)] + ['PLCSim Station']
+    i = len(stations)
+    while len(stations) < station_count:
+        stations.append(f'Module{i:03d}_10.0.{i // 250}.{i % 250}')
+        i += 1
+
+    tag_values = {}
+    for station in stations[:station_count]:
+        tags = {}
+        for n in range(tags_per_station):
+            data_type = TYPES[n % len(TYPES)]
+            address = f'M{n // 8}.{n % 8}' if data_type == 'Bool' else f'DB1.DBD{n * 4}'
+            tags[f'tag_{n}'] = {
+                'db': '',
+                'address': address,
+                'type': data_type,
+                'value': str(n),
+                'display_format': 'DEC',
+                'sending_format': 'DEC'
+            }
+        tag_values[station] = tags
+    return tag_values
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--stations', type=int, default=100)
+    parser.add_argument('--tags', type=int, default=200, help='tags per station')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='bench_startup_')
+    with open(os.path.join(work_dir, 'tag_values.json'), 'w') as f:
+        json.dump(synthetic_tag_values(args.stations, args.tags), f, indent=4)
+    with open(os.path.join(work_dir, 'plc_config.json'), 'w') as f:
+        json.dump({'simulator_ip': '127.0.0.1'}, f)
+    os.chdir(work_dir)
+    setup_done = time.perf_counter()
+
+    from PyQt5.QtWidgets import QApplication
+    from PyQt5.QtCore import QObject, QEvent, QTimer
+    app = QApplication(sys.argv)
+
+    import tia_gui
+    imported = time.perf_counter()
+
+    timings = {}
+
+    class FirstPaint(QObject):
+        def eventFilter(self, obj, event):
+            if event.type() == QEvent.Paint and 'first_paint' not in timings:
+                timings['first_paint'] = time.perf_counter()
+                QTimer.singleShot(0, select_station)
+            return False
+
+    def select_station():
+        before = time.perf_counter()
+        gui.station_combo.setCurrentIndex(1)
+        timings['select_station'] = time.perf_counter() - before
+        app.quit()
+
+    gui = tia_gui.TIAPortalGUI()
+    constructed = time.perf_counter()
+    gui.installEventFilter(FirstPaint(gui))
+    gui.show()
+    QTimer.singleShot(10000, app.quit)
+    app.exec_()
+
+    if 'first_paint' not in timings:
+        print("No paint event received")
+        return 1
+
+    print(f"Synthetic file: {args.stations} stations x {args.tags} tags "
+          f"({os.path.getsize('tag_values.json') / 1e6:.1f} MB)")
+    print(f"  import tia_gui:        {(imported - setup_done) * 1000:8.1f} ms")
+    print(f"  TIAPortalGUI():        {(constructed - imported) * 1000:8.1f} ms")
+    print(f"  time-to-first-paint:   {(timings['first_paint'] - setup_done) * 1000:8.1f} ms")
+    print(f"  first station shown:   {timings['select_station'] * 1000:8.1f} ms "
+          f"({gui.tag_table.rowCount()} rows)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
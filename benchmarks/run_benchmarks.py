@@ -0,0 +1,375 @@
+"""
+Benchmark suite for the acquisition and formatting hot paths
+
+Times parse_address, format_value, read_tag/send_tag against the in-memory
+PLC and/or a local snap7 server (sim_farm), full read_plc_tags cycles of
+the GUI at 100/1k/10k tags, save_tag_values on a large file and
+load_station_tags on large stations, and optionally the request sequence
+of a recorded field session (--replay, see session_recording). Every benchmark reports min/median/
+mean per call; the results are written as JSON so two runs can be
+compared, e.g. before and after a change:
+
+    python benchmarks/run_benchmarks.py --output before.json
+    python benchmarks/run_benchmarks.py --compare before.json
+
+Usage: python benchmarks/run_benchmarks.py [--quick] [--only read_tag] [--backend memory|server|both]
+                                           [--output results.json] [--compare baseline.json] [--threshold 0.1]
+                                           [--replay session.s7rec] [--replay-timing fast|original]
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from memory_backend import MemoryBackend
+from plc_controller import PLCController
+from session_recording import OP_READ, ReplayBackend
+from snap7_connection import PLCConnection
+from value_format import format_value, format_values
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+DEFAULT_SERVER_PORT = 10290
+SCAN_SIZES = (100, 1000, 10000)
+
+ADDRESSES = ['M0.0', 'MB4', 'DB1.DBD0', 'DB1.DBX2.1', 'I0.1', 'QW64', '%Q64.0', 'DB12.DBW100', 'MD200', 'DB3.DBX7.7']
+FORMATS = [('DEC', 'Int', 12345), ('Hex', 'DInt', 0x1F2E3D4C), ('Bin', 'Byte', 0b10110010),
+           ('BCD', 'Int', 0x1234), ('DEC', 'Bool', True), ('Octal', 'Int', 511), ('Character', 'Byte', 65)]
+TYPES = ['Bool', 'Byte', 'Int', 'DInt']
+
+
+class Runner:
+    """Times callables and collects the results"""
+
+    def __init__(self, min_rounds=5, min_time_s=0.5, only=None):
+        self.min_rounds = min_rounds
+        self.min_time_s = min_time_s
+        self.only = only
+        self.results = {}
+
+    def wanted(self, name):
+        return not self.only or any(part in name for part in self.only)
+
+    def bench(self, name, func, calls=1, setup=None, **params):
+        """
+        Run func until min_rounds and min_time_s are both reached
+        Args:
+            calls: operations done by one func() call, times are reported per operation
+            setup: callable run before every round, not timed
+        """
+        if not self.wanted(name):
+            return None
+        if setup is not None:
+            setup()
+        func()  # Warm-up (imports, caches, first-call allocations)
+        rounds = []
+        started = time.perf_counter()
+        while len(rounds) < self.min_rounds or time.perf_counter() - started < self.min_time_s:
+            if setup is not None:
+                setup()
+            before = time.perf_counter()
+            func()
+            rounds.append((time.perf_counter() - before) / calls)
+            if len(rounds) >= 10000:
+                break
+        result = {
+            'params': params,
+            'rounds': len(rounds),
+            'calls_per_round': calls,
+            'min_s': min(rounds),
+            'median_s': statistics.median(rounds),
+            'mean_s': statistics.fmean(rounds),
+            'stdev_s': statistics.stdev(rounds) if len(rounds) > 1 else 0.0,
+            'ops_per_s': 1.0 / statistics.median(rounds) if statistics.median(rounds) > 0 else None,
+        }
+        self.results[name] = result
+        print(f"  {name:<40} {format_duration(result['median_s']):>12} median  "
+              f"{format_duration(result['min_s']):>12} min  ({len(rounds)} rounds)")
+        return result
+
+
+def format_duration(seconds):
+    if seconds < 1e-6:
+        return f'{seconds * 1e9:.0f} ns'
+    if seconds < 1e-3:
+        return f'{seconds * 1e6:.2f} us'
+    if seconds < 1.0:
+        return f'{seconds * 1e3:.2f} ms'
+    return f'{seconds:.3f} s'
+
+
+def synthetic_station(tag_count):
+    """{tag_name: tag_data} with the supported types, packed like a real DB/Merker layout"""
+    tags = {}
+    for n in range(tag_count):
+        data_type = TYPES[n % len(TYPES)]
+        if data_type == 'Bool':
+            address = f'M{n // 32}.{n // 4 % 8}'
+        elif data_type == 'Byte':
+            address = f'QB{n // 4}'
+        else:
+            address = f'DB1.DBD{n * 4}'
+        tags[f'tag_{n}'] = {
+            'db': '',
+            'address': address,
+            'type': data_type,
+            'value': str(n % 2 if data_type == 'Bool' else n % 256),
+            'display_format': 'DEC',
+            'sending_format': 'DEC'
+        }
+    return tags
+
+
+def bench_parse_address(runner):
+    print("parse_address")
+    parse = PLCConnection.parse_address
+    uncached = parse.__wrapped__
+    runner.bench('parse_address[cached]', lambda: [parse(a) for a in ADDRESSES], calls=len(ADDRESSES))
+    runner.bench('parse_address[uncached]', lambda: [uncached(a) for a in ADDRESSES], calls=len(ADDRESSES))
+
+
+def bench_format_value(runner):
+    print("format_value")
+    runner.bench('format_value', lambda: [format_value(v, f, t) for f, t, v in FORMATS], calls=len(FORMATS))
+    values = list(range(-5000, 5000))
+    for display_format in ('DEC', 'Hex', 'Bin', 'BCD'):
+        runner.bench(f'format_values[{display_format},10k]', lambda: format_values(values, display_format, 'Int'),
+                     calls=len(values), display_format=display_format)
+        runner.bench(f'format_value_loop[{display_format},10k]',
+                     lambda: [format_value(value, display_format, 'Int') for value in values],
+                     calls=len(values), display_format=display_format)
+
+
+def make_controller(work_dir, backend, port):
+    """PLCController connected to the in-memory PLC or to a local snap7 server"""
+    config = os.path.join(work_dir, f'plc_config_{backend}.json')
+    with open(config, 'w') as f:
+        json.dump({'simulator_ip': f'127.0.0.1:{port}'}, f)
+    controller = PLCController(config, MemoryBackend() if backend == 'memory' else None)
+    success, message = controller.connect_plcsim()
+    if not success:
+        raise RuntimeError(message)
+    return controller
+
+
+def bench_tag_io(runner, controller, backend):
+    print(f"read_tag/send_tag ({backend})")
+    for data_type, address in (('Bool', 'M10.3'), ('Byte', 'MB20'), ('DInt', 'DB1.DBD40')):
+        parsed = PLCConnection.parse_address(address)
+        runner.bench(f'read_tag[{backend},{data_type}]', lambda: controller.read_tag(parsed, data_type),
+                     backend=backend, data_type=data_type)
+        runner.bench(f'send_tag[{backend},{data_type}]', lambda: controller.send_tag(address, 1, data_type),
+                     backend=backend, data_type=data_type)
+
+
+def bench_replay(runner, path, timing):
+    """The recorded requests in their original order through PLCConnection and a ReplayBackend"""
+    backend = ReplayBackend(path, timing)
+    connection = PLCConnection(backend)
+    connection.connect('127.0.0.1')
+    records = backend.records
+    print(f"replay ({len(records)} recorded requests, {timing} timing)")
+
+    def replay():
+        backend.rewind()
+        for record in records:
+            try:
+                if record.op == OP_READ:
+                    connection.read_area(record.area, record.db, record.start, record.size)
+                else:
+                    connection.write_area(record.area, record.db, record.start, record.payload or bytes(record.size))
+            except RuntimeError:
+                pass  # Recorded error
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    runner.bench(f'replay[{name},{timing}]', replay, calls=len(records), requests=len(records), timing=timing)
+
+
+def start_server(port):
+    from sim_farm import SimulatedPLC
+    plc = SimulatedPLC(port)
+    plc.start()
+    return plc
+
+
+def quiet(func):
+    """func with its print() output (GUI debug prints) discarded"""
+    def run():
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            func()
+    return run
+
+
+def bench_gui(runner, work_dir, sizes, backend, port, storage=True):
+    """
+    read_plc_tags, load_station_tags and save_tag_values of the real GUI (offscreen)
+    storage: False to skip the backend independent load/save benchmarks
+    """
+    try:
+        from PyQt5.QtWidgets import QApplication
+    except ImportError:
+        print("GUI benchmarks skipped (PyQt5 not installed)")
+        return
+    app = QApplication.instance() or QApplication(sys.argv)
+
+    station = 'PLCSim Station'
+    for size in sizes:
+        names = [f'read_plc_tags[{backend},{size}]']
+        if storage:
+            names += [f'load_station_tags[{size}]', f'save_tag_values[{size}]']
+        if not any(runner.wanted(name) for name in names):
+            continue
+        gui_dir = os.path.join(work_dir, f'gui_{backend}_{size}')
+        os.makedirs(gui_dir)
+        # A few neighbour stations make save_tag_values write a realistically large file
+        tag_values = {station: synthetic_station(size)}
+        for i in range(1, 10):
+            tag_values[f'Module{i:02d}_192.168.0.{i * 10}'] = synthetic_station(size)
+        with open(os.path.join(gui_dir, 'tag_values.json'), 'w') as f:
+            json.dump(tag_values, f, indent=4)
+        config = {'simulator_ip': f'127.0.0.1:{port}'}
+        if backend == 'memory':
+            config['plc_backend'] = 'memory'
+        with open(os.path.join(gui_dir, 'plc_config.json'), 'w') as f:
+            json.dump(config, f)
+
+        cwd = os.getcwd()
+        os.chdir(gui_dir)
+        try:
+            import tia_gui
+            gui = tia_gui.TIAPortalGUI()
+            quiet(lambda: gui.station_combo.setCurrentIndex(gui.station_combo.findText(station)))()
+            success, message = gui.plc_controller.connect_plcsim()
+            if not success:
+                raise RuntimeError(message)
+            print(f"GUI ({backend}, {size} tags, {gui.tag_table.rowCount()} rows)")
+
+            runner.bench(f'read_plc_tags[{backend},{size}]', quiet(gui.read_plc_tags), backend=backend, tags=size)
+            if storage:
+                runner.bench(f'load_station_tags[{size}]', quiet(lambda: gui.load_station_tags(station)), tags=size)
+                for name in tag_values:
+                    gui.ensure_station_loaded(name)
+                runner.bench(f'save_tag_values[{size}]', quiet(gui.save_tag_values), tags=size,
+                             stations=len(tag_values), file_mb=round(os.path.getsize('tag_values.json') / 1e6, 2))
+
+            gui.plc_controller.disconnect_plcsim()
+            gui.save_timer.stop()
+            gui.plc_read_timer.stop()
+            if gui.historian:
+                gui.historian.close()
+            gui.deleteLater()
+            app.processEvents()
+        finally:
+            os.chdir(cwd)
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    """
+    Print the median change against a previous results file
+    Returns: names slower than the baseline by more than threshold
+    """
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline_path} (revision {baseline['meta'].get('revision')})")
+    regressions = []
+    for name, result in results.items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            print(f"  {name:<40} new")
+            continue
+        change = result['median_s'] / previous['median_s'] - 1.0
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        elif change < -threshold:
+            flag = '  faster'
+        print(f"  {name:<40} {format_duration(previous['median_s']):>12} -> "
+              f"{format_duration(result['median_s']):>12}  {change * 100:+6.1f}%{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--only', nargs='+', help='run benchmarks whose name contains one of these')
+    parser.add_argument('--backend', choices=('memory', 'server', 'both'), default='memory',
+                        help='PLC behind read_tag/send_tag/read_plc_tags (server: local snap7 server)')
+    parser.add_argument('--port', type=int, default=DEFAULT_SERVER_PORT, help='port of the local snap7 server')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SCAN_SIZES), help='tags per station for the GUI')
+    parser.add_argument('--quick', action='store_true', help='fewer rounds, for a smoke run')
+    parser.add_argument('--output', help='results JSON (default benchmarks/results/<time>.json)')
+    parser.add_argument('--compare', help='previous results JSON to compare with')
+    parser.add_argument('--threshold', type=float, default=0.10, help='median slowdown reported as regression')
+    parser.add_argument('--replay', nargs='+', default=[], help='recorded sessions to replay (PLCConnection.start_recording)')
+    parser.add_argument('--replay-timing', choices=('fast', 'original'), default='fast',
+                        help='replay as fast as possible or with the recorded request durations')
+    args = parser.parse_args()
+
+    runner = Runner(min_rounds=3 if args.quick else 5, min_time_s=0.1 if args.quick else 0.5, only=args.only)
+    backends = ['memory', 'server'] if args.backend == 'both' else [args.backend]
+    work_dir = tempfile.mkdtemp(prefix='bench_')
+
+    bench_parse_address(runner)
+    bench_format_value(runner)
+
+    server = None
+    try:
+        if 'server' in backends:
+            server = start_server(args.port)
+        for backend in backends:
+            controller = make_controller(work_dir, backend, args.port)
+            bench_tag_io(runner, controller, backend)
+            controller.disconnect_plcsim()
+            bench_gui(runner, work_dir, args.sizes, backend, args.port, storage=backend == backends[0])
+    finally:
+        if server is not None:
+            server.stop()
+    for path in args.replay:
+        bench_replay(runner, path, args.replay_timing)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, time.strftime('%Y%m%d_%H%M%S') + '.json')
+    data = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'backends': backends,
+            'quick': args.quick,
+        },
+        'results': runner.results,
+    }
+    with open(output, 'w') as f:
+        json.dump(data, f, indent=4)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        regressions = compare(runner.results, args.compare, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) slower by more than {args.threshold * 100:.0f}%")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,218 @@
+
+import ast
+import math
+import re
+from graphlib import CycleError, TopologicalSorter
+
+from tag_search import normalize_address
+
+# A tag whose address starts with '=' is calculated: "=DB1.DBD0 * 0.1 + DB1.DBD4"
+EXPRESSION_PREFIX = '='
+
+# PLC addresses inside an expression, replaced by input names before parsing
+_ADDRESS_PATTERN = re.compile(r'%?\b(?:DB\d+\.DB[XBWD]\d+(?:\.[0-7])?|[MIQ][BWD]\d+|[MIQ]\d+\.[0-7])\b', re.IGNORECASE)
+
+_ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare, ast.IfExp, ast.Call,
+    ast.Constant, ast.Name, ast.Load,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.BitAnd, ast.BitOr, ast.BitXor, ast.LShift, ast.RShift,
+    ast.USub, ast.UAdd, ast.Not, ast.Invert, ast.And, ast.Or,
+    ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+)
+
+FUNCTIONS = {
+    'abs': abs, 'min': min, 'max': max, 'round': round,
+    'int': int, 'float': float, 'bool': bool,
+    'sqrt': math.sqrt, 'exp': math.exp, 'log': math.log, 'log10': math.log10,
+    'sin': math.sin, 'cos': math.cos, 'floor': math.floor, 'ceil': math.ceil,
+}
+
+MAX_EXPONENT = 64
+# Integer results wider than this are dropped (no PLC type is wider), so one
+# calculated tag cannot feed a huge number into the power of another
+MAX_RESULT_BITS = 64
+
+_MISSING = object()
+
+
+class CalcError(ValueError):
+    pass
+
+
+def is_calculated(tag):
+    return str(tag.get('address', '')).lstrip().startswith(EXPRESSION_PREFIX)
+
+
+class CalcTag:
+    """One compiled expression"""
+
+    __slots__ = ('name', 'source', 'code', 'inputs', 'variables')
+
+    def __init__(self, name, source, code, variables):
+        self.name = name
+        self.source = source
+        self.code = code
+        self.variables = variables  # {python name: input tag name}
+        self.inputs = set(variables.values())
+
+
+def compile_expression(name, expression, station_tags):
+    """
+    Parse and compile one expression
+    Inputs are tag names (valid identifiers) or PLC addresses of tags of
+    the station. Only arithmetic, comparisons, boolean logic, if/else and
+    the FUNCTIONS calls are accepted.
+    Returns: CalcTag
+    Raises: CalcError
+    """
+    source = expression.strip()
+    if source.startswith(EXPRESSION_PREFIX):
+        source = source[1:].strip()
+    if not source:
+        raise CalcError(f"{name}: empty expression")
+
+    by_address = {}
+    for tag_name, tag in station_tags.items():
+        if not is_calculated(tag):
+            address = normalize_address(str(tag.get('address', '')))
+            if address:
+                by_address.setdefault(address, tag_name)
+
+    variables = {}
+
+    def replace_address(match):
+        address = normalize_address(match.group(0))
+        tag_name = by_address.get(address)
+        if tag_name is None:
+            raise CalcError(f"{name}: no tag with address {address}")
+        variable = f'_in{len(variables)}'
+        variables[variable] = tag_name
+        return variable
+
+    text = _ADDRESS_PATTERN.sub(replace_address, source)
+    try:
+        tree = ast.parse(text, mode='eval')
+    except SyntaxError as e:
+        raise CalcError(f"{name}: invalid expression ({e.msg})")
+
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise CalcError(f"{name}: '{type(node).__name__}' is not allowed in expressions")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float, bool)):
+            raise CalcError(f"{name}: only numeric constants are allowed")
+        if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Pow, ast.LShift)):
+            # Huge powers/shifts would stall the polling loop
+            exponent = node.right
+            if not isinstance(exponent, ast.Constant) or abs(exponent.value) > MAX_EXPONENT:
+                raise CalcError(f"{name}: exponents and shifts must be constants up to {MAX_EXPONENT}")
+            if any(isinstance(inner, ast.BinOp) and isinstance(inner.op, (ast.Pow, ast.LShift))
+                   for inner in ast.walk(node.left)):
+                raise CalcError(f"{name}: nested powers and shifts are not allowed")
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.keywords:
+                raise CalcError(f"{name}: unknown function in expression")
+        elif isinstance(node, ast.Name) and node.id not in variables and node.id not in FUNCTIONS:
+            if node.id not in station_tags:
+                raise CalcError(f"{name}: unknown tag {node.id}")
+            variables[node.id] = node.id
+
+    return CalcTag(name, source, compile(tree, f'<calc:{name}>', 'eval'), variables)
+
+
+class CalculatedTags:
+    """
+    Calculated tags of one station
+
+    compile() parses every expression once into a code object and orders
+    the tags so that inputs come before the tags using them. evaluate()
+    re-runs an expression only when one of its inputs changed in the scan.
+    """
+
+    def __init__(self):
+        self.calcs = []     # CalcTag in dependency order
+        self.errors = []
+        self.values = {}    # Last value of every input and calculated tag
+        self.eval_count = 0
+
+    def __len__(self):
+        return len(self.calcs)
+
+    def compile(self, station_tags):
+        """
+        Compile all '=' tags of a station, invalid ones are listed in self.errors
+        Returns: number of calculated tags
+        """
+        self.errors = []
+        self.values = {}
+        compiled = {}
+        for tag_name, tag in station_tags.items():
+            if is_calculated(tag):
+                try:
+                    compiled[tag_name] = compile_expression(tag_name, tag.get('address', ''), station_tags)
+                except CalcError as e:
+                    self.errors.append(str(e))
+
+        # Tags on a dependency cycle are dropped, the rest is ordered inputs first
+        while True:
+            sorter = TopologicalSorter({name: calc.inputs & compiled.keys() for name, calc in compiled.items()})
+            try:
+                order = list(sorter.static_order())
+                break
+            except CycleError as e:
+                cycle = e.args[1]
+                self.errors.append(f"Circular calculated tags: {' -> '.join(cycle)}")
+                for name in cycle:
+                    compiled.pop(name, None)
+        # Tags using an invalid calculated tag can never get a value
+        invalid = {name for name, tag in station_tags.items() if is_calculated(tag)} - compiled.keys()
+        self.calcs = []
+        for name in order:
+            calc = compiled.get(name)
+            if calc is None:
+                continue
+            if calc.inputs & invalid:
+                self.errors.append(f"{name}: uses invalid calculated tag {', '.join(sorted(calc.inputs & invalid))}")
+                invalid.add(name)
+            else:
+                self.calcs.append(calc)
+        return len(self.calcs)
+
+    def evaluate(self, scan_values):
+        """
+        Update the calculated tags from one scan
+        Args:
+            scan_values: {tag_name: value} read in this scan
+        Returns: {calc tag name: value} of every calculated tag with a value
+        """
+        values = self.values
+        changed = set()
+        for tag_name, value in scan_values.items():
+            if values.get(tag_name, _MISSING) != value:
+                values[tag_name] = value
+                changed.add(tag_name)
+
+        results = {}
+        for calc in self.calcs:
+            if calc.name not in values or not calc.inputs.isdisjoint(changed):
+                arguments = {}
+                for variable, tag_name in calc.variables.items():
+                    value = values.get(tag_name)
+                    if value is None:
+                        break
+                    arguments[variable] = value
+                else:
+                    self.eval_count += 1
+                    try:
+                        result = eval(calc.code, {'__builtins__': {}}, {**FUNCTIONS, **arguments})
+                    except (ArithmeticError, ValueError, TypeError):
+                        result = None
+                    if isinstance(result, int) and result.bit_length() > MAX_RESULT_BITS:
+                        result = None
+                    if values.get(calc.name, _MISSING) != result:
+                        values[calc.name] = result
+                        changed.add(calc.name)
+            value = values.get(calc.name)
+            if value is not None:
+                results[calc.name] = value
+        return results
@@ -0,0 +1,224 @@
+
+import json
+
+from PyQt5.QtCore import QTimer, pyqtSignal
+from PyQt5.QtGui import QFont
+from PyQt5.QtWidgets import (QDialog, QFileDialog, QHBoxLayout, QInputDialog, QLabel, QMessageBox, QPushButton,
+                             QTableWidget, QTableWidgetItem, QVBoxLayout)
+
+from sampling_profiler import SamplingProfiler
+from trace_spans import TRACER
+
+REFRESH_MS = 1000
+DEFAULT_PROFILE_S = 10
+
+COLUMNS = ['Station', 'Operation', 'Count', 'Errors', 'Bytes', 'Mean', 'p50', 'p90', 'p99', 'Max', 'Overruns']
+
+
+def format_ns(value):
+    """Duration in ns as text with a readable unit"""
+    if value is None:
+        return '-'
+    if value < 1000:
+        return f'{value:.0f} ns'
+    if value < 1e6:
+        return f'{value / 1e3:.1f} µs'
+    if value < 1e9:
+        return f'{value / 1e6:.2f} ms'
+    return f'{value / 1e9:.2f} s'
+
+
+def format_bytes(value):
+    for unit in ('B', 'kB', 'MB'):
+        if value < 1000:
+            return f'{value:.0f} {unit}' if unit == 'B' else f'{value:.1f} {unit}'
+        value /= 1000.0
+    return f'{value:.1f} GB'
+
+
+class DiagnosticsPanel(QDialog):
+    """
+    Live view of S7Metrics: requests, errors, bytes and latency percentiles
+    per station and operation, and the polling cycle times with overruns.
+    The Trace button records spans into TRACER and saves them as a
+    Chrome trace when stopped, Profile samples all threads for a few
+    seconds and saves collapsed stacks for a flame graph, Record logs
+    every request of the connection for a replay (session_recording).
+    """
+    tracing_changed = pyqtSignal(bool)
+
+    def __init__(self, metrics, parent=None, trace_capacity=None, connection=None):
+        super().__init__(parent)
+        self.metrics = metrics
+        self.connection = connection
+        self.trace_capacity = trace_capacity
+        self.setWindowTitle('S7 Diagnostics')
+        self.resize(900, 320)
+
+        layout = QVBoxLayout(self)
+        self.summary_label = QLabel()
+        self.summary_label.setFont(QFont('Arial', 9))
+        layout.addWidget(self.summary_label)
+
+        self.table = QTableWidget(0, len(COLUMNS))
+        self.table.setHorizontalHeaderLabels(COLUMNS)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(self.table)
+
+        buttons = QHBoxLayout()
+        self.trace_btn = QPushButton('● Start Trace')
+        self.trace_btn.setToolTip('Record GUI, scan and S7 spans for chrome://tracing or Perfetto')
+        self.trace_btn.clicked.connect(self.toggle_trace)
+        buttons.addWidget(self.trace_btn)
+        self.profile_btn = QPushButton('🔥 Profile...')
+        self.profile_btn.setToolTip('Sample all threads for N seconds and save a flame graph input')
+        self.profile_btn.clicked.connect(self.start_profile)
+        buttons.addWidget(self.profile_btn)
+        self.profiler = None
+        self.record_btn = QPushButton('⏺ Record...')
+        self.record_btn.setToolTip('Log every PLC request and response to a file for ReplayBackend')
+        self.record_btn.clicked.connect(self.toggle_recording)
+        self.record_btn.setEnabled(connection is not None)
+        buttons.addWidget(self.record_btn)
+        buttons.addStretch()
+        save_btn = QPushButton('Save JSON...')
+        save_btn.clicked.connect(self.save_snapshot)
+        buttons.addWidget(save_btn)
+        reset_btn = QPushButton('Reset')
+        reset_btn.clicked.connect(self.reset)
+        buttons.addWidget(reset_btn)
+        close_btn = QPushButton('Close')
+        close_btn.clicked.connect(self.close)
+        buttons.addWidget(close_btn)
+        layout.addLayout(buttons)
+
+        # Refreshed only while the panel is open
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(REFRESH_MS)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event):
+        self.refresh()
+        self.refresh_timer.start()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.refresh_timer.stop()
+        super().hideEvent(event)
+
+    def refresh(self):
+        snapshot = self.metrics.snapshot()
+        rows = []
+        for op in snapshot['operations']:
+            rows.append([op['station'], op['operation'], op['count'], op['errors'], format_bytes(op['bytes']),
+                         format_ns(op['mean_ns']), format_ns(op['p50_ns']), format_ns(op['p90_ns']),
+                         format_ns(op['p99_ns']), format_ns(op['max_ns']), ''])
+        for cycle in snapshot['cycles']:
+            interval = f" (every {cycle['interval_s'] * 1000:.0f} ms)" if cycle['interval_s'] else ''
+            rows.append([cycle['station'], 'cycle' + interval, cycle['count'], '', '',
+                         format_ns(cycle['mean_ns']), format_ns(cycle['p50_ns']), format_ns(cycle['p90_ns']),
+                         format_ns(cycle['p99_ns']), format_ns(cycle['max_ns']), cycle['overruns']])
+
+        self.table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                item = self.table.item(row, column)
+                text = '-' if value is None else str(value)
+                if item is None:
+                    self.table.setItem(row, column, QTableWidgetItem(text))
+                elif item.text() != text:
+                    item.setText(text)
+
+        requests = sum(op['count'] for op in snapshot['operations'])
+        errors = sum(op['errors'] for op in snapshot['operations'])
+        uptime = snapshot['uptime_s']
+        rate = requests / uptime if uptime > 0 else 0.0
+        self.summary_label.setText(f"{requests} requests ({rate:.1f}/s), {errors} errors "
+                                   f"in {uptime:.0f} s since the last reset")
+
+    def toggle_trace(self):
+        if not TRACER.enabled:
+            TRACER.start(self.trace_capacity)
+            self.trace_btn.setText('■ Stop Trace')
+            self.tracing_changed.emit(True)
+            return
+
+        TRACER.stop()
+        self.trace_btn.setText('● Start Trace')
+        self.tracing_changed.emit(False)
+        path, _ = QFileDialog.getSaveFileName(self, 'Save Trace', 'trace.json', 'Chrome Trace (*.json)')
+        if not path:
+            return
+        try:
+            count = TRACER.dump(path)
+        except IOError as e:
+            QMessageBox.critical(self, 'Trace', f'Could not save the trace:\n{e}')
+            return
+        dropped = ' (oldest spans dropped, buffer full)' if len(TRACER.events) == TRACER.events.maxlen else ''
+        QMessageBox.information(self, 'Trace', f'{count} spans saved to {path}{dropped}\n'
+                                               'Open it in chrome://tracing or ui.perfetto.dev')
+
+    def start_profile(self):
+        seconds, ok = QInputDialog.getInt(self, 'Profile', 'Sample all threads for (seconds):',
+                                          DEFAULT_PROFILE_S, 1, 600)
+        if not ok:
+            return
+        self.profiler = SamplingProfiler()
+        self.profiler.start(seconds)
+        self.profile_btn.setEnabled(False)
+        self.profile_btn.setText(f'🔥 Profiling {seconds} s...')
+        # The GUI keeps running (and is sampled) meanwhile
+        QTimer.singleShot(seconds * 1000 + 100, self.finish_profile)
+
+    def finish_profile(self):
+        profiler = self.profiler
+        profiler.stop()
+        self.profile_btn.setEnabled(True)
+        self.profile_btn.setText('🔥 Profile...')
+        path, _ = QFileDialog.getSaveFileName(self, 'Save Profile', 'profile.folded',
+                                              'Collapsed stacks (*.folded *.txt)')
+        if not path:
+            return
+        try:
+            stacks = profiler.write_collapsed(path)
+        except IOError as e:
+            QMessageBox.critical(self, 'Profile', f'Could not save the profile:\n{e}')
+            return
+        QMessageBox.information(self, 'Profile', f'{profiler.samples} samples, {stacks} distinct stacks '
+                                                 f'saved to {path}\nOpen it in speedscope.app or run flamegraph.pl')
+
+    def toggle_recording(self):
+        if self.connection.recorder is None:
+            path, _ = QFileDialog.getSaveFileName(self, 'Record Session', 'session.s7rec',
+                                                  'PLC session recording (*.s7rec)')
+            if not path:
+                return
+            try:
+                self.connection.start_recording(path)
+            except IOError as e:
+                QMessageBox.critical(self, 'Record', f'Could not create the recording:\n{e}')
+                return
+            self.record_btn.setText('■ Stop Recording')
+            return
+
+        path = self.connection.recorder.path
+        count = self.connection.stop_recording()
+        self.record_btn.setText('⏺ Record...')
+        QMessageBox.information(self, 'Record', f'{count} requests recorded to {path}\n'
+                                                'Replay with "plc_backend": "replay" and "replay_file" in the config')
+
+    def reset(self):
+        self.metrics.reset()
+        self.refresh()
+
+    def save_snapshot(self):
+        path, _ = QFileDialog.getSaveFileName(self, 'Save Diagnostics', 's7_diagnostics.json', 'JSON (*.json)')
+        if not path:
+            return
+        try:
+            with open(path, 'w') as f:
+                json.dump(self.metrics.snapshot(), f, indent=4)
+        except IOError:
+            pass
@@ -0,0 +1,404 @@
+
+import math
+import threading
+import time
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+DEFAULT_RETENTION_S = 3600
+DEFAULT_SAMPLE_INTERVAL_S = 1.0
+
+# Default (bucket seconds, buckets kept): 1 s for an hour, 1 min for two days, 1 h for 90 days,
+# about 380 KB per tag once full (see Historian rollup_tiers)
+ROLLUP_TIERS = ((1.0, 3600), (60.0, 2880), (3600.0, 2160))
+ROLLUP_INITIAL_BUCKETS = 64
+# Tiers with buckets of at least this size are also kept by the disk store
+PERSISTED_ROLLUP_MIN_S = 60.0
+
+if NUMPY_AVAILABLE:
+    ROLLUP_DTYPE = np.dtype([('t', '<f8'), ('count', '<u4'), ('min', '<f8'), ('max', '<f8'),
+                             ('sum', '<f8'), ('last', '<f8')])
+
+
+def to_sample(value):
+    """Native tag value -> float sample, None if it cannot be recorded"""
+    if isinstance(value, bool):
+        return 1.0 if value else 0.0
+    if isinstance(value, (int, float)):
+        return float(value)
+    return None
+
+
+class RingBuffer:
+    """Preallocated (timestamp, value) ring buffer of one tag"""
+
+    __slots__ = ('times', 'values', 'capacity', 'head', 'count')
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.head = 0   # Next write position
+        self.count = 0
+
+    def append(self, timestamp, value):
+        self.times[self.head] = timestamp
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def _segments(self):
+        """Slices of the buffer in time order"""
+        if self.count < self.capacity:
+            return [(0, self.count)]
+        return [(self.head, self.capacity), (0, self.head)]
+
+    def range(self, start=None, end=None):
+        """
+        Samples with start <= t <= end
+        Returns: (times, values) arrays (copies)
+        """
+        times = []
+        values = []
+        for lo, hi in self._segments():
+            segment = self.times[lo:hi]
+            i = lo + (np.searchsorted(segment, start, 'left') if start is not None else 0)
+            j = lo + (np.searchsorted(segment, end, 'right') if end is not None else hi - lo)
+            if i < j:
+                times.append(self.times[i:j])
+                values.append(self.values[i:j])
+        if not times:
+            return np.empty(0), np.empty(0)
+        return np.concatenate(times), np.concatenate(values)
+
+    def first_time(self):
+        """Oldest timestamp held or None"""
+        if not self.count:
+            return None
+        return float(self.times[self.head if self.count == self.capacity else 0])
+
+    def last(self):
+        """Newest (timestamp, value) or None"""
+        if not self.count:
+            return None
+        i = (self.head - 1) % self.capacity
+        return float(self.times[i]), float(self.values[i])
+
+
+class RollupBuffer:
+    """
+    count/min/max/sum/last per fixed time bucket of one tag
+    The open bucket is updated with every sample and moved into the ring
+    when a sample of a later bucket arrives. The ring starts small and
+    doubles up to capacity, so short sessions stay cheap.
+    """
+
+    __slots__ = ('size', 'capacity', 'buckets', 'head', 'count', 'current')
+
+    def __init__(self, size, capacity):
+        self.size = size
+        self.capacity = capacity
+        self.buckets = np.zeros(min(capacity, ROLLUP_INITIAL_BUCKETS), dtype=ROLLUP_DTYPE)
+        self.head = 0
+        self.count = 0
+        self.current = None  # [start, count, min, max, sum, last]
+
+    def add(self, timestamp, value):
+        """Add a sample, returns the bucket it closed ([start, count, min, max, sum, last]) or None"""
+        start = math.floor(timestamp / self.size) * self.size
+        current = self.current
+        if current is not None and start <= current[0]:
+            current[1] += 1
+            if value < current[2]:
+                current[2] = value
+            if value > current[3]:
+                current[3] = value
+            current[4] += value
+            current[5] = value
+            return None
+        if current is not None:
+            self._push(current)
+        self.current = [start, 1, value, value, value, value]
+        return current
+
+    def close(self):
+        """Close the open bucket (e.g. on shutdown), returns it or None"""
+        current = self.current
+        if current is not None:
+            self._push(current)
+            self.current = None
+        return current
+
+    def _push(self, bucket):
+        length = len(self.buckets)
+        if self.count == length and length < self.capacity:
+            # Grow, oldest first
+            grown = np.zeros(min(length * 2, self.capacity), dtype=ROLLUP_DTYPE)
+            grown[:length] = np.concatenate((self.buckets[self.head:], self.buckets[:self.head]))
+            self.buckets = grown
+            self.head = length
+            length = len(grown)
+        self.buckets[self.head] = tuple(bucket)
+        self.head = (self.head + 1) % length
+        if self.count < length:
+            self.count += 1
+
+    def first_time(self):
+        if self.count:
+            return float(self.buckets['t'][self.head if self.count == len(self.buckets) else 0])
+        return self.current[0] if self.current else None
+
+    def range(self, start=None, end=None):
+        """Buckets starting between start and end, the open one included"""
+        length = len(self.buckets)
+        if self.count < length:
+            ordered = self.buckets[:self.count]
+        else:
+            ordered = np.concatenate((self.buckets[self.head:], self.buckets[:self.head]))
+        if self.current is not None:
+            ordered = np.concatenate((ordered, np.array([tuple(self.current)], dtype=ROLLUP_DTYPE)))
+        times = ordered['t']
+        # A bucket overlapping start is still part of the range
+        i = np.searchsorted(times, start - self.size, 'right') if start is not None else 0
+        j = np.searchsorted(times, end, 'right') if end is not None else len(ordered)
+        return ordered[i:j].copy()
+
+
+def raw_to_rollup(times, values):
+    """Raw samples as one-sample buckets, same layout as RollupBuffer.range"""
+    buckets = np.zeros(len(times), dtype=ROLLUP_DTYPE)
+    buckets['t'] = times
+    buckets['count'] = 1
+    for field in ('min', 'max', 'sum', 'last'):
+        buckets[field] = values
+    return buckets
+
+
+def aggregate_rollup(buckets, size):
+    """Merge time ordered buckets (e.g. from raw_to_rollup) into buckets of size seconds"""
+    if not len(buckets):
+        return buckets
+    starts = np.floor(buckets['t'] / size) * size
+    first = np.concatenate(([0], np.flatnonzero(np.diff(starts)) + 1))
+    merged = np.zeros(len(first), dtype=ROLLUP_DTYPE)
+    merged['t'] = starts[first]
+    merged['count'] = np.add.reduceat(buckets['count'], first)
+    merged['min'] = np.minimum.reduceat(buckets['min'], first)
+    merged['max'] = np.maximum.reduceat(buckets['max'], first)
+    merged['sum'] = np.add.reduceat(buckets['sum'], first)
+    merged['last'] = buckets['last'][np.append(first[1:], len(buckets)) - 1]
+    return merged
+
+
+class Historian:
+    """
+    In-process history of polled tag values
+
+    Every (station, tag) gets a ring buffer sized for the retention time at
+    the polling rate, allocated on the first sample. Memory stays fixed no
+    matter how long the program runs. With a HistorianStore every sample is
+    also written to disk, and queries reaching further back than the ring
+    buffer are answered from there.
+    """
+
+    def __init__(self, retention_s=DEFAULT_RETENTION_S, sample_interval_s=DEFAULT_SAMPLE_INTERVAL_S, store=None,
+                 rollup_tiers=None):
+        """
+        Args:
+            store: HistorianStore for the on-disk history, None for memory only
+            rollup_tiers: [(bucket seconds, buckets kept), ...] finest first, default ROLLUP_TIERS
+        """
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("NumPy is required for the historian")
+        self.retention_s = retention_s
+        self.sample_interval_s = sample_interval_s
+        self.capacity = max(16, int(retention_s / sample_interval_s * 1.25) + 1)
+        self.buffers = {}  # (station, tag_name) -> RingBuffer
+        self.rollup_tiers = sorted((float(size), int(count)) for size, count in (rollup_tiers or ROLLUP_TIERS))
+        self.rollups = {}  # (station, tag_name) -> [RollupBuffer per rollup tier]
+        self.lock = threading.Lock()
+        self.store = store
+
+    def record(self, station, tag_name, value, timestamp=None):
+        """Store one sample, non-numeric values are ignored"""
+        sample = to_sample(value)
+        if sample is None:
+            return
+        if timestamp is None:
+            timestamp = time.time()
+        key = (station, tag_name)
+        with self.lock:
+            buffer = self.buffers.get(key)
+            if buffer is None:
+                buffer = self.buffers[key] = RingBuffer(self.capacity)
+                self.rollups[key] = [RollupBuffer(size, count) for size, count in self.rollup_tiers]
+            buffer.append(timestamp, sample)
+            for rollup in self.rollups[key]:
+                closed = rollup.add(timestamp, sample)
+                if closed is not None and self.store is not None and rollup.size >= PERSISTED_ROLLUP_MIN_S:
+                    self.store.append_rollup(station, tag_name, rollup.size, closed)
+
+    def record_scan(self, station, values, timestamp=None):
+        """
+        Store one scan of a station
+        Args:
+            values: {tag_name: value}
+            timestamp: Scan time (time.time()), now if None
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        samples = {}
+        for tag_name, value in values.items():
+            sample = to_sample(value)
+            if sample is not None:
+                samples[tag_name] = sample
+                self.record(station, tag_name, sample, timestamp)
+        if self.store is not None and samples:
+            self.store.append(station, samples, timestamp)
+
+    def query(self, station, tag_name, start=None, end=None):
+        """
+        Samples of one tag between start and end (time.time() seconds)
+        Returns: (times, values) NumPy arrays, empty if nothing is recorded
+        """
+        with self.lock:
+            buffer = self.buffers.get((station, tag_name))
+            oldest = buffer.first_time() if buffer is not None else None
+            if self.store is None or (oldest is not None and start is not None and start >= oldest):
+                if buffer is None:
+                    return np.empty(0), np.empty(0)
+                return buffer.range(start, end)
+        # Older than the ring buffer, read from disk
+        return self.store.query(station, tag_name, start, end)
+
+    def _rollup_tier(self, station, tag_name, start, tiers):
+        """RollupBuffer of the tiers[-1] tier, or a coarser one if that dropped start (None without samples)"""
+        rollups = self.rollups.get((station, tag_name))
+        if not rollups:
+            return None
+        candidates = rollups[tiers - 1:]
+        chosen = candidates[0]
+        for coarser in candidates[1:]:
+            # Only move on when the tier already dropped buckets from before start
+            first = chosen.first_time()
+            if start is None or first is None or first <= start or chosen.count < chosen.capacity:
+                break
+            chosen = coarser
+        return chosen
+
+    def rollup_size(self, station, tag_name, start=None, resolution_s=0.0):
+        """Bucket seconds query_rollup uses for this start and resolution (0 for raw samples)"""
+        sizes = [size for size, _ in self.rollup_tiers if size <= resolution_s]
+        if not sizes:
+            return 0.0
+        with self.lock:
+            chosen = self._rollup_tier(station, tag_name, start, len(sizes))
+        return chosen.size if chosen is not None else sizes[-1]
+
+    def query_rollup(self, station, tag_name, start=None, end=None, resolution_s=0.0):
+        """
+        Aggregated samples for a trend of the given resolution
+        Uses the coarsest tier whose bucket is not wider than resolution_s,
+        raw samples (as one-sample buckets) below the finest tier. If that
+        tier has already dropped the buckets from start on, the next coarser
+        tier is used. Buckets older than the chosen tier (e.g. from before a
+        restart) come from the disk store: the persisted buckets of the
+        1 min/1 h tiers, raw samples only for the gap up to the first bucket
+        in memory (which may be partial after a restart).
+        Returns: (bucket seconds or 0 for raw, ROLLUP_DTYPE array with t, count, min, max, sum, last)
+        """
+        sizes = [size for size, _ in self.rollup_tiers if size <= resolution_s]
+        if not sizes:
+            return 0.0, raw_to_rollup(*self.query(station, tag_name, start, end))
+        with self.lock:
+            chosen = self._rollup_tier(station, tag_name, start, len(sizes))
+            if chosen is not None:
+                size = chosen.size
+                buckets = chosen.range(start, end)
+                first = chosen.first_time()
+                first_open = not chosen.count
+            else:
+                size = sizes[-1]
+                buckets = np.zeros(0, dtype=ROLLUP_DTYPE)
+                first = None
+        if self.store is None or (first is not None and start is not None and first <= start):
+            return size, buckets
+        # Missing older part from the disk store. A bucket a restart fell into is
+        # stored in two parts (see close), merged by aggregate_rollup.
+        stored = np.zeros(0, dtype=ROLLUP_DTYPE)
+        if size >= PERSISTED_ROLLUP_MIN_S:
+            stored = aggregate_rollup(self.store.query_rollup(station, tag_name, size, start, end), size)
+        if first is not None:
+            at_first = stored['t'] == first
+            if np.any(at_first):
+                # A closed first bucket is stored complete, an open one only holds
+                # the samples since the restart and is merged with its stored part
+                head = stored[at_first]
+                if first_open:
+                    head = aggregate_rollup(np.concatenate((head, buckets[:1])), size)
+                return size, np.concatenate((stored[stored['t'] < first], head, buckets[1:]))
+            stored = stored[stored['t'] < first]
+        # Raw samples for the gap after the last stored bucket (e.g. after a crash). The
+        # oldest bucket in memory may only hold the samples since then, so it is rebuilt.
+        gap_start = float(stored['t'][-1]) + size if len(stored) else start
+        cutoff = first + size if first is not None else None
+        times, values = self.store.query(station, tag_name, gap_start, end if cutoff is None else cutoff)
+        if cutoff is not None:
+            keep = times < cutoff
+            times, values = times[keep], values[keep]
+            buckets = buckets[buckets['t'] >= cutoff]
+        gap = aggregate_rollup(raw_to_rollup(times, values), size)
+        return size, np.concatenate((stored, gap, buckets))
+
+    def last_seconds(self, station, tag_name, seconds):
+        """Samples of the last N seconds"""
+        return self.query(station, tag_name, start=time.time() - seconds)
+
+    def first_time(self, station, tag_name):
+        """Oldest timestamp available for a tag (disk store included) or None"""
+        if self.store is not None:
+            first = self.store.first_time()
+            if first is not None:
+                return first
+        with self.lock:
+            buffer = self.buffers.get((station, tag_name))
+            return buffer.first_time() if buffer is not None else None
+
+    def latest(self, station, tag_name):
+        """Newest (timestamp, value) of a tag or None"""
+        with self.lock:
+            buffer = self.buffers.get((station, tag_name))
+            return buffer.last() if buffer else None
+
+    def tags(self, station=None):
+        """Recorded (station, tag_name) keys"""
+        with self.lock:
+            return [key for key in self.buffers if station is None or key[0] == station]
+
+    def memory_bytes(self):
+        """Bytes held by all ring buffers"""
+        with self.lock:
+            return (sum(b.times.nbytes + b.values.nbytes for b in self.buffers.values()) +
+                    sum(r.buckets.nbytes for tiers in self.rollups.values() for r in tiers))
+
+    def close(self):
+        """
+        Write pending samples and the open rollup buckets to the disk store
+        The open buckets are continued by the next run and merged on query;
+        without close (e.g. a crash) the rollup files miss the samples of the
+        buckets that were open, the raw samples still have them.
+        """
+        if self.store is not None:
+            with self.lock:
+                for (station, tag_name), rollups in self.rollups.items():
+                    for rollup in rollups:
+                        if rollup.size >= PERSISTED_ROLLUP_MIN_S:
+                            bucket = rollup.close()
+                            if bucket is not None:
+                                self.store.append_rollup(station, tag_name, rollup.size, bucket)
+            self.store.close()
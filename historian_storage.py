@@ -0,0 +1,391 @@
+
+import json
+import mmap
+import os
+import threading
+import time
+
+import numpy as np
+
+from history_codec import TICKS_PER_SECOND, decode_block, encode_block
+from tag_storage import atomic_write_json
+
+# One sample on disk: time.time() seconds, series id, value
+RECORD_DTYPE = np.dtype([('t', '<f8'), ('id', '<u4'), ('v', '<f8')])
+
+# Sparse time index: one (time, record number) entry every INDEX_STRIDE records
+INDEX_DTYPE = np.dtype([('t', '<f8'), ('n', '<u8')])
+INDEX_STRIDE = 1024
+
+DEFAULT_SEGMENT_BYTES = 64 * 1024 * 1024
+DEFAULT_BATCH_RECORDS = 4096
+DEFAULT_FLUSH_INTERVAL_S = 5.0
+# Compressed blocks get better with more samples per tag, so they are written less often
+DEFAULT_BLOCK_INTERVAL_S = 60.0
+
+SEGMENT_SUFFIX = '.seg'
+INDEX_SUFFIX = '.idx'
+COMPRESSED_SUFFIX = '.gseg'
+
+# One entry per compressed block: series id, time range, file offset
+BLOCK_INDEX_DTYPE = np.dtype([('id', '<u4'), ('t_first', '<f8'), ('t_last', '<f8'), ('offset', '<u8')])
+
+# One closed rollup bucket (same layout as historian.ROLLUP_DTYPE), in one
+# time ordered file per tier and series: rollup_60s/<series id>.rlp
+ROLLUP_RECORD_DTYPE = np.dtype([('t', '<f8'), ('count', '<u4'), ('min', '<f8'), ('max', '<f8'),
+                                ('sum', '<f8'), ('last', '<f8')])
+ROLLUP_SUFFIX = '.rlp'
+
+
+def _segment_start(path):
+    """'seg_001700000000000.seg' -> 1700000000.0"""
+    return float(os.path.splitext(os.path.basename(path))[0].split('_', 1)[1]) / 1000.0
+
+
+class Segment:
+    """One append-only segment file plus its sparse time index"""
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+        self.start_time = _segment_start(path)
+        self.record_count = os.path.getsize(path) // RECORD_DTYPE.itemsize if os.path.exists(path) else 0
+        self.end_time = self._read_last_time()
+
+    def _read_last_time(self):
+        if not self.record_count:
+            return self.start_time
+        with open(self.path, 'rb') as f:
+            f.seek((self.record_count - 1) * RECORD_DTYPE.itemsize)
+            return float(np.frombuffer(f.read(RECORD_DTYPE.itemsize), dtype=RECORD_DTYPE)['t'][0])
+
+    def size_bytes(self):
+        return self.record_count * RECORD_DTYPE.itemsize
+
+    def append(self, pending):
+        """Append {series_id: (times, values)} as time-ordered records"""
+        records = np.zeros(sum(len(times) for times, _ in pending.values()), dtype=RECORD_DTYPE)
+        i = 0
+        for series_id, (times, values) in pending.items():
+            records['t'][i:i + len(times)] = times
+            records['id'][i:i + len(times)] = series_id
+            records['v'][i:i + len(times)] = values
+            i += len(times)
+        records = records[np.argsort(records['t'], kind='stable')]
+
+        first = self.record_count
+        with open(self.path, 'ab') as f:
+            f.write(records.tobytes())
+
+        positions = np.arange(first, first + len(records))
+        marks = positions % INDEX_STRIDE == 0
+        if marks.any():
+            entries = np.zeros(int(marks.sum()), dtype=INDEX_DTYPE)
+            entries['t'] = records['t'][marks]
+            entries['n'] = positions[marks]
+            with open(self.index_path, 'ab') as f:
+                f.write(entries.tobytes())
+
+        self.record_count += len(records)
+        self.end_time = float(records['t'][-1])
+
+    def read_index(self):
+        if not os.path.exists(self.index_path):
+            return np.zeros(0, dtype=INDEX_DTYPE)
+        return np.fromfile(self.index_path, dtype=INDEX_DTYPE)
+
+    def query(self, series_id, start, end):
+        """
+        Samples of one series with start <= t <= end
+        Only the index strides that can contain the range are mapped and scanned.
+        Returns: (times, values) arrays
+        """
+        if not self.record_count:
+            return np.empty(0), np.empty(0)
+
+        index = self.read_index()
+        lo = 0
+        hi = self.record_count
+        if len(index):
+            if start is not None:
+                # Last stride starting strictly before start (equal times may span strides)
+                i = np.searchsorted(index['t'], start, 'left') - 1
+                lo = int(index['n'][i]) if i >= 0 else 0
+            if end is not None:
+                j = np.searchsorted(index['t'], end, 'right')
+                hi = int(index['n'][j]) if j < len(index) else self.record_count
+
+        with open(self.path, 'rb') as f:
+            with mmap.mmap(f.fileno(), self.record_count * RECORD_DTYPE.itemsize, access=mmap.ACCESS_READ) as mm:
+                records = np.frombuffer(mm, dtype=RECORD_DTYPE, count=hi - lo, offset=lo * RECORD_DTYPE.itemsize)
+                mask = records['id'] == series_id
+                if start is not None:
+                    mask &= records['t'] >= start
+                if end is not None:
+                    mask &= records['t'] <= end
+                times = records['t'][mask].copy()
+                values = records['v'][mask].copy()
+                del records
+        return times, values
+
+
+class CompressedSegment:
+    """
+    Append-only segment of compressed per-tag blocks (see history_codec)
+    The block index keeps the time range of every block, a query only
+    decodes the blocks of its series that overlap the range.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path[:-len(COMPRESSED_SUFFIX)] + INDEX_SUFFIX
+        self.start_time = _segment_start(path)
+        self.file_size = os.path.getsize(path) if os.path.exists(path) else 0
+        index = self.read_index()
+        self.end_time = float(index['t_last'].max()) if len(index) else self.start_time
+
+    def size_bytes(self):
+        return self.file_size
+
+    def append(self, pending):
+        """Write one block per series of {series_id: (times, values)}"""
+        blocks = []
+        entries = np.zeros(len(pending), dtype=BLOCK_INDEX_DTYPE)
+        offset = self.file_size
+        for i, (series_id, (times, values)) in enumerate(pending.items()):
+            block = encode_block(series_id, times, values)
+            entries[i] = (series_id, times[0], times[-1], offset)
+            offset += len(block)
+            blocks.append(block)
+        with open(self.path, 'ab') as f:
+            f.write(b''.join(blocks))
+        with open(self.index_path, 'ab') as f:
+            f.write(entries.tobytes())
+        self.file_size = offset
+        self.end_time = max(self.end_time, float(entries['t_last'].max()))
+
+    def read_index(self):
+        if not os.path.exists(self.index_path):
+            return np.zeros(0, dtype=BLOCK_INDEX_DTYPE)
+        return np.fromfile(self.index_path, dtype=BLOCK_INDEX_DTYPE)
+
+    def query(self, series_id, start, end):
+        """
+        Samples of one series with start <= t <= end
+        Returns: (times, values) arrays
+        """
+        index = self.read_index()
+        mask = index['id'] == series_id
+        # Block times are rounded to the stored resolution
+        tolerance = 1.0 / TICKS_PER_SECOND
+        if start is not None:
+            mask &= index['t_last'] >= start - tolerance
+        if end is not None:
+            mask &= index['t_first'] <= end + tolerance
+        if not mask.any():
+            return np.empty(0), np.empty(0)
+
+        times = []
+        values = []
+        with open(self.path, 'rb') as f:
+            with mmap.mmap(f.fileno(), self.file_size, access=mmap.ACCESS_READ) as mm:
+                for offset in index['offset'][mask].tolist():
+                    _, t, v = decode_block(mm, offset)
+                    times.append(t)
+                    values.append(v)
+        times = np.concatenate(times)
+        values = np.concatenate(values)
+        keep = np.ones(len(times), dtype=bool)
+        if start is not None:
+            keep &= times >= start
+        if end is not None:
+            keep &= times <= end
+        return times[keep], values[keep]
+
+
+class HistorianStore:
+    """
+    On-disk history made of append-only segment files
+
+    Samples are buffered per tag and written in batches. New segments store
+    compressed per-tag blocks (delta-of-delta times, XOR floats, run-length
+    bools); with compress=False they hold fixed-width records read back
+    through mmap and NumPy views. Both kinds can be mixed in one directory.
+    A new segment starts when the current one reaches segment_bytes.
+    Closed rollup buckets handed over by the Historian are appended to one
+    small file per tier and tag with the same batches, so long trends do
+    not have to read the raw samples back.
+    """
+
+    def __init__(self, directory, segment_bytes=DEFAULT_SEGMENT_BYTES,
+                 batch_records=DEFAULT_BATCH_RECORDS, flush_interval_s=None, compress=True):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.batch_records = batch_records
+        self.compress = compress
+        if flush_interval_s is None:
+            flush_interval_s = DEFAULT_BLOCK_INTERVAL_S if compress else DEFAULT_FLUSH_INTERVAL_S
+        self.flush_interval_s = flush_interval_s
+        self.lock = threading.RLock()
+        self._pending = {}  # series_id -> ([times], [values])
+        self._pending_count = 0
+        self._pending_rollups = {}  # (bucket seconds, series_id) -> [bucket tuple, ...]
+        self._last_flush = time.time()
+
+        os.makedirs(directory, exist_ok=True)
+        self.series_file = os.path.join(directory, 'series.json')
+        self.series = {}  # (station, tag_name) -> id
+        if os.path.exists(self.series_file):
+            with open(self.series_file, 'r') as f:
+                for station, tag_name, series_id in json.load(f):
+                    self.series[(station, tag_name)] = series_id
+
+        self.segments = []
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(SEGMENT_SUFFIX):
+                self.segments.append(Segment(os.path.join(directory, name)))
+            elif name.endswith(COMPRESSED_SUFFIX):
+                self.segments.append(CompressedSegment(os.path.join(directory, name)))
+
+    def series_id(self, station, tag_name, create=True):
+        key = (station, tag_name)
+        series_id = self.series.get(key)
+        if series_id is None and create:
+            series_id = self.series[key] = len(self.series)
+            atomic_write_json(self.series_file, [[s, t, i] for (s, t), i in self.series.items()])
+        return series_id
+
+    def append(self, station, values, timestamp):
+        """
+        Queue one scan ({tag_name: float}), written when the batch is full
+        or flush_interval_s has passed
+        """
+        with self.lock:
+            for tag_name, value in values.items():
+                times, samples = self._pending.setdefault(self.series_id(station, tag_name), ([], []))
+                times.append(timestamp)
+                samples.append(value)
+            self._pending_count += len(values)
+            if self._pending_count >= self.batch_records or time.time() - self._last_flush >= self.flush_interval_s:
+                self.flush()
+
+    def append_rollup(self, station, tag_name, size, bucket):
+        """Queue one closed rollup bucket (t, count, min, max, sum, last) of a tier of size seconds"""
+        with self.lock:
+            self._pending_rollups.setdefault((size, self.series_id(station, tag_name)), []).append(tuple(bucket))
+
+    def rollup_path(self, size, series_id):
+        return os.path.join(self.directory, f'rollup_{size:g}s', f'{series_id}{ROLLUP_SUFFIX}')
+
+    def _flush_rollups(self):
+        pending = self._pending_rollups
+        self._pending_rollups = {}
+        for (size, series_id), buckets in pending.items():
+            path = self.rollup_path(size, series_id)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'ab') as f:
+                f.write(np.array(buckets, dtype=ROLLUP_RECORD_DTYPE).tobytes())
+
+    def query_rollup(self, station, tag_name, size, start=None, end=None):
+        """
+        Stored closed buckets of one tag and tier starting between start - size and end
+        Returns: ROLLUP_RECORD_DTYPE array, time ordered (a bucket a restart fell into comes in two parts)
+        """
+        with self.lock:
+            series_id = self.series_id(station, tag_name, create=False)
+            if series_id is None:
+                return np.zeros(0, dtype=ROLLUP_RECORD_DTYPE)
+            parts = []
+            path = self.rollup_path(size, series_id)
+            count = os.path.getsize(path) // ROLLUP_RECORD_DTYPE.itemsize if os.path.exists(path) else 0
+            if count:
+                parts.append(np.memmap(path, dtype=ROLLUP_RECORD_DTYPE, mode='r', shape=(count,)))
+            pending = self._pending_rollups.get((size, series_id))
+            if pending:
+                parts.append(np.array(pending, dtype=ROLLUP_RECORD_DTYPE))
+            result = []
+            for buckets in parts:
+                # Binary search, only the pages of the range are read
+                times = buckets['t']
+                i = np.searchsorted(times, start - size, 'right') if start is not None else 0
+                j = np.searchsorted(times, end, 'right') if end is not None else len(buckets)
+                result.append(np.array(buckets[i:j]))
+        if not result:
+            return np.zeros(0, dtype=ROLLUP_RECORD_DTYPE)
+        return np.concatenate(result)
+
+    def flush(self):
+        """Write queued samples to the current segment (and queued rollup buckets)"""
+        with self.lock:
+            self._last_flush = time.time()
+            if self._pending_rollups:
+                self._flush_rollups()
+            if not self._pending:
+                return
+            pending = self._pending
+            self._pending = {}
+            self._pending_count = 0
+
+            segment_class = CompressedSegment if self.compress else Segment
+            segment = self.segments[-1] if self.segments else None
+            if segment is None or not isinstance(segment, segment_class) or segment.size_bytes() >= self.segment_bytes:
+                first = min(times[0] for times, _ in pending.values())
+                suffix = COMPRESSED_SUFFIX if self.compress else SEGMENT_SUFFIX
+                name = f'seg_{int(first * 1000):015d}{suffix}'
+                segment = segment_class(os.path.join(self.directory, name))
+                self.segments.append(segment)
+            segment.append(pending)
+
+    def close(self):
+        self.flush()
+
+    @property
+    def pending_count(self):
+        """Samples waiting for the next flush"""
+        return self._pending_count
+
+    def first_time(self):
+        """Start of the oldest segment or pending sample, None if empty"""
+        with self.lock:
+            if self.segments:
+                return self.segments[0].start_time
+            firsts = [times[0] for times, _ in self._pending.values()]
+            return min(firsts) if firsts else None
+
+    def query(self, station, tag_name, start=None, end=None):
+        """
+        Samples of one tag between start and end (time.time() seconds)
+        Segments outside the range are skipped by their start/end time,
+        samples not written yet are included.
+        Returns: (times, values) arrays
+        """
+        with self.lock:
+            series_id = self.series_id(station, tag_name, create=False)
+            if series_id is None:
+                return np.empty(0), np.empty(0)
+            times = []
+            values = []
+            for segment in self.segments:
+                if end is not None and segment.start_time > end:
+                    continue
+                if start is not None and segment.end_time < start:
+                    continue
+                t, v = segment.query(series_id, start, end)
+                if len(t):
+                    times.append(t)
+                    values.append(v)
+
+            pending = self._pending.get(series_id)
+            if pending:
+                t = np.array(pending[0])
+                v = np.array(pending[1])
+                keep = np.ones(len(t), dtype=bool)
+                if start is not None:
+                    keep &= t >= start
+                if end is not None:
+                    keep &= t <= end
+                times.append(t[keep])
+                values.append(v[keep])
+        if not times:
+            return np.empty(0), np.empty(0)
+        return np.concatenate(times), np.concatenate(values)
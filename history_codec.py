@@ -0,0 +1,281 @@
+
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+# Timestamps are stored as integer milliseconds
+TICKS_PER_SECOND = 1000
+
+KIND_FLOAT = 0  # XOR-encoded doubles
+KIND_BOOL = 1   # Run lengths of 0.0/1.0 values
+
+# series id, sample count, kind, first/last time (ticks), time stream bytes, value stream bytes
+BLOCK_HEADER = struct.Struct('<IIBqqII')
+BlockHeader = namedtuple('BlockHeader', 'series_id count kind t_first t_last time_bytes value_bytes')
+
+# Delta-of-delta buckets: (prefix, prefix bits, value bits), the last one is the fallback
+_DOD_BUCKETS = ((0b10, 2, 7), (0b110, 3, 9), (0b1110, 4, 12), (0b1111, 4, 64))
+
+_MASK64 = (1 << 64) - 1
+
+
+class BitWriter:
+    """Append-only bit stream, most significant bit first"""
+
+    __slots__ = ('buffer', 'acc', 'nbits')
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.acc = 0
+        self.nbits = 0
+
+    def write(self, value, nbits):
+        self.acc = (self.acc << nbits) | (value & ((1 << nbits) - 1))
+        self.nbits += nbits
+        if self.nbits >= 64:
+            whole = self.nbits >> 3
+            rest = self.nbits & 7
+            self.buffer += (self.acc >> rest).to_bytes(whole, 'big')
+            self.acc &= (1 << rest) - 1
+            self.nbits = rest
+
+    def getvalue(self):
+        """Written bits, zero padded to a whole byte"""
+        data = bytearray(self.buffer)
+        if self.nbits:
+            whole = (self.nbits + 7) >> 3
+            data += (self.acc << (whole * 8 - self.nbits)).to_bytes(whole, 'big')
+        return bytes(data)
+
+
+class BitReader:
+    """Reads a BitWriter stream"""
+
+    __slots__ = ('data', 'pos')
+
+    def __init__(self, data):
+        # Padding so reads near the end never come up short
+        self.data = bytes(data) + bytes(9)
+        self.pos = 0
+
+    def read(self, nbits):
+        first = self.pos >> 3
+        offset = self.pos & 7
+        size = (offset + nbits + 7) >> 3
+        chunk = int.from_bytes(self.data[first:first + size], 'big')
+        self.pos += nbits
+        return (chunk >> (size * 8 - offset - nbits)) & ((1 << nbits) - 1)
+
+
+def _signed(value, nbits):
+    return value - (1 << nbits) if value >> (nbits - 1) else value
+
+
+def encode_times(ticks):
+    """Delta-of-delta encoding of integer timestamps"""
+    writer = BitWriter()
+    writer.write(ticks[0], 64)
+    prev = ticks[0]
+    prev_delta = 0
+    for t in ticks[1:]:
+        delta = t - prev
+        dod = delta - prev_delta
+        prev = t
+        prev_delta = delta
+        if dod == 0:
+            writer.write(0, 1)
+            continue
+        for prefix, prefix_bits, value_bits in _DOD_BUCKETS:
+            limit = 1 << (value_bits - 1)
+            if -limit <= dod < limit or value_bits == 64:
+                writer.write(prefix, prefix_bits)
+                writer.write(dod, value_bits)
+                break
+    return writer.getvalue()
+
+
+def iter_times(data, count):
+    """Decode encode_times output, one tick value at a time"""
+    if not count:
+        return
+    reader = BitReader(data)
+    read = reader.read
+    t = _signed(read(64), 64)
+    yield t
+    delta = 0
+    for _ in range(count - 1):
+        if read(1):
+            if not read(1):
+                delta += _signed(read(7), 7)
+            elif not read(1):
+                delta += _signed(read(9), 9)
+            elif not read(1):
+                delta += _signed(read(12), 12)
+            else:
+                delta += _signed(read(64), 64)
+        t += delta
+        yield t
+
+
+def encode_floats(values):
+    """XOR encoding of doubles against the previous value"""
+    bits = np.asarray(values, dtype='<f8').view('<u8').tolist()
+    writer = BitWriter()
+    write = writer.write
+    prev = bits[0]
+    write(prev, 64)
+    lead = -1
+    trail = 0
+    for x in bits[1:]:
+        xor = x ^ prev
+        prev = x
+        if not xor:
+            write(0, 1)
+            continue
+        new_lead = min(64 - xor.bit_length(), 31)
+        new_trail = (xor & -xor).bit_length() - 1
+        if lead >= 0 and new_lead >= lead and new_trail >= trail:
+            # Meaningful bits fit in the previous window
+            write(0b10, 2)
+            write(xor >> trail, 64 - lead - trail)
+        else:
+            lead = new_lead
+            trail = new_trail
+            significant = 64 - lead - trail
+            write(0b11, 2)
+            write(lead, 5)
+            write(significant - 1, 6)
+            write(xor >> trail, significant)
+    return writer.getvalue()
+
+
+def iter_floats(data, count):
+    """Decode encode_floats output, one float at a time"""
+    if not count:
+        return
+    reader = BitReader(data)
+    read = reader.read
+    unpack = struct.Struct('<d').unpack
+    pack = struct.Struct('<Q').pack
+    prev = read(64)
+    yield unpack(pack(prev))[0]
+    lead = 0
+    trail = 0
+    for _ in range(count - 1):
+        if read(1):
+            if read(1):
+                lead = read(5)
+                trail = 64 - lead - (read(6) + 1)
+            prev ^= read(64 - lead - trail) << trail
+        yield unpack(pack(prev))[0]
+
+
+def _write_run(writer, run):
+    if run <= 16:
+        writer.write(0, 1)
+        writer.write(run - 1, 4)
+    elif run <= 272:
+        writer.write(0b10, 2)
+        writer.write(run - 17, 8)
+    else:
+        writer.write(0b11, 2)
+        writer.write(run, 32)
+
+
+def encode_bools(values):
+    """First value, then the lengths of the runs of equal values"""
+    writer = BitWriter()
+    current = bool(values[0])
+    writer.write(int(current), 1)
+    run = 0
+    for value in values:
+        if bool(value) == current:
+            run += 1
+        else:
+            _write_run(writer, run)
+            current = not current
+            run = 1
+    _write_run(writer, run)
+    return writer.getvalue()
+
+
+def iter_bools(data, count):
+    """Decode encode_bools output as 0.0/1.0 floats"""
+    reader = BitReader(data)
+    read = reader.read
+    value = float(read(1))
+    left = count
+    while left > 0:
+        if not read(1):
+            run = read(4) + 1
+        elif not read(1):
+            run = read(8) + 17
+        else:
+            run = read(32)
+        for _ in range(min(run, left)):
+            yield value
+        left -= run
+        value = 1.0 - value
+
+
+def is_bool_series(values):
+    values = np.asarray(values)
+    return bool(np.all((values == 0.0) | (values == 1.0)))
+
+
+def to_ticks(times):
+    return np.rint(np.asarray(times, dtype=np.float64) * TICKS_PER_SECOND).astype(np.int64).tolist()
+
+
+def encode_block(series_id, times, values):
+    """
+    Compress the samples of one series
+    Args:
+        times: time.time() seconds, ascending (stored at millisecond resolution)
+        values: floats, 0.0/1.0 only series are stored as run lengths
+    Returns: header + payload bytes
+    """
+    ticks = to_ticks(times)
+    kind = KIND_BOOL if is_bool_series(values) else KIND_FLOAT
+    time_data = encode_times(ticks)
+    value_data = encode_bools(values) if kind == KIND_BOOL else encode_floats(values)
+    header = BLOCK_HEADER.pack(series_id, len(ticks), kind, ticks[0], ticks[-1], len(time_data), len(value_data))
+    return header + time_data + value_data
+
+
+def read_header(buffer, offset=0):
+    return BlockHeader(*BLOCK_HEADER.unpack_from(buffer, offset))
+
+
+def block_size(header):
+    return BLOCK_HEADER.size + header.time_bytes + header.value_bytes
+
+
+def iter_block(buffer, offset=0):
+    """
+    Stream the samples of one block
+    Yields: (time.time() seconds, value)
+    """
+    header = read_header(buffer, offset)
+    start = offset + BLOCK_HEADER.size
+    time_data = buffer[start:start + header.time_bytes]
+    value_data = buffer[start + header.time_bytes:start + header.time_bytes + header.value_bytes]
+    decode = iter_bools if header.kind == KIND_BOOL else iter_floats
+    for ticks, value in zip(iter_times(time_data, header.count), decode(value_data, header.count)):
+        yield ticks / TICKS_PER_SECOND, value
+
+
+def decode_block(buffer, offset=0):
+    """
+    Decode a whole block
+    Returns: (header, times array, values array)
+    """
+    header = read_header(buffer, offset)
+    start = offset + BLOCK_HEADER.size
+    time_data = buffer[start:start + header.time_bytes]
+    value_data = buffer[start + header.time_bytes:start + header.time_bytes + header.value_bytes]
+    decode = iter_bools if header.kind == KIND_BOOL else iter_floats
+    times = np.fromiter(iter_times(time_data, header.count), dtype=np.int64, count=header.count) / TICKS_PER_SECOND
+    values = np.fromiter(decode(value_data, header.count), dtype=np.float64, count=header.count)
+    return header, times, values
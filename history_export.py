@@ -0,0 +1,191 @@
+
+import csv
+import os
+from datetime import datetime
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# Time slice read from the historian per step, bounds the memory of an export
+DEFAULT_CHUNK_S = 600
+
+HISTORY_COLUMNS = ['timestamp', 'time', 'station', 'tag', 'value']
+SNAPSHOT_COLUMNS = ['station', 'tag', 'address', 'type', 'value', 'plc_value', 'plc_time']
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def export_format(path):
+    """'csv' or 'parquet' from the file extension"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.parquet', '.pq'):
+        if not PYARROW_AVAILABLE:
+            raise ValueError("Parquet export needs pyarrow (pip install pyarrow)")
+        return 'parquet'
+    raise ValueError(f"Unsupported export file type: {extension or path}")
+
+
+def iso_time(timestamp):
+    return datetime.fromtimestamp(timestamp).isoformat(timespec='milliseconds')
+
+
+class CsvChunkWriter:
+    """Writes column chunks as CSV rows"""
+
+    def __init__(self, path, columns):
+        self.columns = columns
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write(self, chunk):
+        """chunk: {column: list or array}, all of equal length"""
+        self.writer.writerows(zip(*(_as_list(chunk[name]) for name in self.columns)))
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetChunkWriter:
+    """Writes column chunks as Parquet row groups"""
+
+    def __init__(self, path, columns):
+        self.columns = columns
+        self.path = path
+        self.writer = None
+
+    def write(self, chunk):
+        table = pa.table({name: chunk[name] for name in self.columns})
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+WRITERS = {'csv': CsvChunkWriter, 'parquet': ParquetChunkWriter}
+
+
+def _as_list(column):
+    return column.tolist() if hasattr(column, 'tolist') else column
+
+
+def iter_history_chunks(historian, series, start, end, chunk_s=DEFAULT_CHUNK_S):
+    """
+    Historian samples of many tags, one time slice at a time
+    Args:
+        series: [(station, tag_name), ...]
+        start, end: time.time() seconds
+    Yields: (fraction done, {column: values}) sorted by time within a slice
+    """
+    slices = max(1, int(np.ceil((end - start) / chunk_s)))
+    for i in range(slices):
+        slice_start = start + i * chunk_s
+        # Slices are [start, end) except the last one, so no sample is written twice
+        slice_end = min(slice_start + chunk_s, end)
+        times = []
+        values = []
+        stations = []
+        tags = []
+        for station, tag_name in series:
+            t, v = historian.query(station, tag_name, slice_start, slice_end)
+            if i < slices - 1:
+                keep = t < slice_end
+                t = t[keep]
+                v = v[keep]
+            if len(t):
+                times.append(t)
+                values.append(v)
+                stations.extend([station] * len(t))
+                tags.extend([tag_name] * len(t))
+        if times:
+            times = np.concatenate(times)
+            values = np.concatenate(values)
+            order = np.argsort(times, kind='stable')
+            times = times[order]
+            chunk = {
+                'timestamp': times,
+                'time': [iso_time(t) for t in times.tolist()],
+                'station': [stations[j] for j in order.tolist()],
+                'tag': [tags[j] for j in order.tolist()],
+                'value': values[order],
+            }
+            yield (i + 1) / slices, chunk
+        else:
+            yield (i + 1) / slices, None
+
+
+def _write(path, columns, chunks, progress=None, cancel=None):
+    """
+    Stream chunks into a file, a partial file is removed on error or cancel
+    Returns: rows written
+    """
+    writer = WRITERS[export_format(path)](path, columns)
+    rows = 0
+    try:
+        for fraction, chunk in chunks:
+            if cancel is not None and cancel():
+                raise ExportCancelled()
+            if chunk is not None:
+                writer.write(chunk)
+                rows += len(chunk[columns[0]])
+            if progress is not None:
+                progress(fraction, rows)
+    except BaseException:
+        writer.close()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        raise
+    writer.close()
+    return rows
+
+
+def export_history(path, historian, series, start, end, progress=None, cancel=None, chunk_s=DEFAULT_CHUNK_S):
+    """
+    Export historian samples to CSV or Parquet (by extension)
+    Memory use depends on chunk_s, not on the length of the range.
+    Args:
+        progress: callable(fraction, rows) after every slice
+        cancel: callable() -> True to stop, raises ExportCancelled
+    Returns: rows written
+    """
+    chunks = iter_history_chunks(historian, series, start, end, chunk_s)
+    return _write(path, HISTORY_COLUMNS, chunks, progress, cancel)
+
+
+def snapshot_rows(station, station_tags, historian=None):
+    """Current state of a station: {column: values} of every tag"""
+    chunk = {name: [] for name in SNAPSHOT_COLUMNS}
+    for tag_name, tag in station_tags.items():
+        latest = historian.latest(station, tag_name) if historian else None
+        chunk['station'].append(station)
+        chunk['tag'].append(tag_name)
+        chunk['address'].append(tag.get('address', ''))
+        chunk['type'].append(tag.get('type', ''))
+        value = tag.get('value')
+        chunk['value'].append('' if value is None else str(value))
+        chunk['plc_value'].append(latest[1] if latest else None)
+        chunk['plc_time'].append(iso_time(latest[0]) if latest else '')
+    return chunk
+
+
+def export_snapshot(path, station, station_tags, historian=None):
+    """
+    Export the tags of a station with their last polled values
+    Returns: rows written
+    """
+    return _write(path, SNAPSHOT_COLUMNS, [(1.0, snapshot_rows(station, station_tags, historian))])
@@ -0,0 +1,94 @@
+
+import random
+import threading
+import time
+
+from snap7_connection import Areas
+
+DEFAULT_AREA_SIZE = 65536
+
+
+class MemoryBackend:
+    """
+    PLC simulated in memory, a PLCConnection backend
+
+    Every area (MK, PE, PA, CT, TM) and every DB is a bytearray created on
+    first use, or only the DBs listed in dbs if given (like a real PLC,
+    other DBs then fail). Each request can wait latency_s +- jitter_s; the
+    jitter comes from a seeded generator, so runs are reproducible. With
+    the defaults requests return immediately.
+    """
+
+    def __init__(self, latency_s=0.0, jitter_s=0.0, seed=0, area_size=DEFAULT_AREA_SIZE, dbs=None):
+        self.latency_s = latency_s
+        self.jitter_s = jitter_s
+        self.random = random.Random(seed)
+        self.area_size = area_size
+        self.areas = {}  # (area, db) -> bytearray
+        if dbs is not None:
+            for db_num in dbs:
+                self.areas[(int(Areas.DB), db_num)] = bytearray(area_size)
+        self.fixed_dbs = dbs is not None
+        self.connected = False
+        self.address = None
+        self.read_count = 0
+        self.write_count = 0
+        self.lock = threading.Lock()
+
+    def connect(self, ip_address, rack=0, slot=1, port=102):
+        self.address = (ip_address, rack, slot, port)
+        self.connected = True
+
+    def disconnect(self):
+        self.connected = False
+
+    def get_connected(self):
+        return self.connected
+
+    def _wait(self):
+        if self.latency_s or self.jitter_s:
+            delay = self.latency_s + self.random.uniform(-self.jitter_s, self.jitter_s)
+            if delay > 0:
+                time.sleep(delay)
+
+    def area(self, area, db_num=0):
+        """bytearray of an area (db_num only counts for DB)"""
+        area = int(area)
+        key = (area, db_num if area == Areas.DB else 0)
+        data = self.areas.get(key)
+        if data is None:
+            if area == Areas.DB and self.fixed_dbs:
+                raise RuntimeError(f"CPU : Address out of range (DB{db_num} does not exist)")
+            data = self.areas[key] = bytearray(self.area_size)
+        return data
+
+    def _check(self, area, db_num, start, size):
+        if not self.connected:
+            raise RuntimeError("TCP : Not connected")
+        data = self.area(area, db_num)
+        if start < 0 or start + size > len(data):
+            raise RuntimeError("CPU : Address out of range")
+        return data
+
+    def read_area(self, area, db_num, start, size):
+        self._wait()
+        with self.lock:
+            data = self._check(area, db_num, start, size)
+            self.read_count += 1
+            return bytearray(data[start:start + size])
+
+    def write_area(self, area, db_num, start, data):
+        self._wait()
+        with self.lock:
+            target = self._check(area, db_num, start, len(data))
+            target[start:start + len(data)] = data
+            self.write_count += 1
+
+    # Direct access for simulations and tests, no latency and no counters
+    def get_bytes(self, area, db_num, start, size):
+        with self.lock:
+            return bytes(self.area(area, db_num)[start:start + size])
+
+    def set_bytes(self, area, db_num, start, data):
+        with self.lock:
+            self.area(area, db_num)[start:start + len(data)] = data
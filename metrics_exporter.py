@@ -0,0 +1,229 @@
+
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_INTERVAL_S = 15.0
+QUANTILES = (('0.5', 'p50_ns'), ('0.9', 'p90_ns'), ('0.99', 'p99_ns'), ('0.999', 'p999_ns'))
+
+OPENMETRICS_CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in labels.items()) + '}'
+
+
+def format_number(value):
+    if value is None:
+        return 'NaN'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+class MetricWriter:
+    """Builds the text exposition, one metric family at a time"""
+
+    def __init__(self, openmetrics=True):
+        self.openmetrics = openmetrics
+        self.lines = []
+
+    def family(self, name, metric_type, help_text):
+        self.lines.append(f'# HELP {name} {help_text}')
+        self.lines.append(f'# TYPE {name} {metric_type}')
+
+    def sample(self, name, labels, value):
+        self.lines.append(f'{name}{format_labels(labels)} {format_number(value)}')
+
+    def counter(self, name, help_text, samples):
+        """samples: [(labels, value)], the family is named without the _total suffix in OpenMetrics"""
+        self.family(name if self.openmetrics else name + '_total', 'counter', help_text)
+        for labels, value in samples:
+            self.sample(name + '_total', labels, value)
+
+    def gauge(self, name, help_text, samples):
+        self.family(name, 'gauge', help_text)
+        for labels, value in samples:
+            self.sample(name, labels, value)
+
+    def summary(self, name, help_text, samples):
+        """samples: [(labels, summary dict of LatencyHistogram in ns)], exported in seconds"""
+        self.family(name, 'summary', help_text)
+        for labels, summary in samples:
+            for quantile, key in QUANTILES:
+                value = summary[key]
+                self.sample(name, dict(labels, quantile=quantile), None if value is None else value / 1e9)
+            self.sample(name + '_sum', labels, (summary['mean_ns'] or 0.0) * summary['count'] / 1e9)
+            self.sample(name + '_count', labels, summary['count'])
+
+    def text(self):
+        if self.openmetrics:
+            self.lines.append('# EOF')
+        return '\n'.join(self.lines) + '\n'
+
+
+def render_metrics(snapshot, gauges=None, openmetrics=True):
+    """
+    S7Metrics.snapshot() (plus extra gauges) as OpenMetrics or Prometheus text
+    Args:
+        gauges: {name: (help, [(labels, value), ...])}
+        openmetrics: False for the classic Prometheus text format (0.0.4)
+    """
+    writer = MetricWriter(openmetrics)
+    operations = snapshot['operations']
+    writer.summary('plc_request_duration_seconds', 'S7 request latency per station and operation.',
+                   [({'station': op['station'], 'operation': op['operation']}, op) for op in operations])
+    writer.counter('plc_request_errors', 'Failed S7 requests.',
+                   [({'station': op['station'], 'operation': op['operation']}, op['errors']) for op in operations])
+    writer.counter('plc_request_bytes', 'Bytes read or written by S7 requests.',
+                   [({'station': op['station'], 'operation': op['operation']}, op['bytes']) for op in operations])
+
+    cycles = snapshot['cycles']
+    writer.summary('plc_scan_cycle_seconds', 'Duration of a full polling cycle.',
+                   [({'station': cycle['station']}, cycle) for cycle in cycles])
+    writer.counter('plc_scan_overruns', 'Polling cycles that took longer than the polling interval.',
+                   [({'station': cycle['station']}, cycle['overruns']) for cycle in cycles])
+    writer.gauge('plc_scan_interval_seconds', 'Configured polling interval.',
+                 [({'station': cycle['station']}, cycle['interval_s']) for cycle in cycles if cycle['interval_s']])
+
+    connects = snapshot.get('connects', [])
+    writer.counter('plc_connects', 'Successful connects (more than one means reconnects).',
+                   [({'station': entry['station']}, entry['connects']) for entry in connects])
+    writer.counter('plc_connect_failures', 'Failed connect attempts.',
+                   [({'station': entry['station']}, entry['failures']) for entry in connects])
+
+    for name, (help_text, samples) in sorted((gauges or {}).items()):
+        writer.gauge(name, help_text, samples)
+    writer.gauge('plc_exporter_uptime_seconds', 'Seconds since the counters were started or reset.',
+                 [({}, snapshot['uptime_s'])])
+    return writer.text()
+
+
+def atomic_write_text(path, text, mode=0o644):
+    """
+    Write text to a temp file next to path, then rename it over path (node_exporter never sees half a file)
+    mode: permissions of the file, mkstemp creates it 0600 and node_exporter usually runs as another user
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp_', suffix='.prom', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class MetricsExporter:
+    """
+    Publishes S7Metrics as a textfile and/or on a local HTTP port
+
+    The textfile is rewritten atomically every interval_s from a background
+    thread (for the node_exporter textfile collector). The HTTP server
+    renders on every scrape and answers in OpenMetrics when the scraper
+    asks for it, else in the Prometheus text format. Extra gauges (tag
+    counts, queue depths, ...) are handed over with set_gauges().
+    """
+
+    def __init__(self, metrics, path=None, http_port=None, interval_s=DEFAULT_INTERVAL_S,
+                 host='127.0.0.1', openmetrics=True):
+        """
+        Args:
+            metrics: S7Metrics
+            path: textfile to write, None for none
+            http_port: port to serve /metrics on, None for none (0 picks a free port)
+            openmetrics: format of the textfile, False for the Prometheus text format
+        """
+        self.metrics = metrics
+        self.path = path
+        self.http_port = http_port
+        self.host = host
+        self.interval_s = interval_s
+        self.openmetrics = openmetrics
+        self.gauges = {}
+        self.write_errors = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.server = None
+        self.server_thread = None
+
+    def set_gauges(self, gauges):
+        """Replace the extra gauges, {name: (help, [(labels, value), ...])}"""
+        self.gauges = gauges
+
+    def render(self, openmetrics=None):
+        return render_metrics(self.metrics.snapshot(), self.gauges,
+                              self.openmetrics if openmetrics is None else openmetrics)
+
+    def write(self):
+        """Write the textfile now, returns False on an I/O error"""
+        try:
+            atomic_write_text(self.path, self.render())
+            return True
+        except OSError:
+            self.write_errors += 1
+            return False
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval_s):
+            self.write()
+
+    def start(self):
+        self.stop_event.clear()
+        if self.path:
+            self.write()
+            self.thread = threading.Thread(target=self._run, name='metrics-textfile', daemon=True)
+            self.thread.start()
+        if self.http_port is not None:
+            self.server = ThreadingHTTPServer((self.host, self.http_port), self._handler())
+            self.server.daemon_threads = True
+            self.http_port = self.server.server_address[1]
+            self.server_thread = threading.Thread(target=self.server.serve_forever, name='metrics-http', daemon=True)
+            self.server_thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+            self.write()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def _handler(self):
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                openmetrics = 'application/openmetrics-text' in self.headers.get('Accept', '')
+                body = exporter.render(openmetrics).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # No access log on stderr for every scrape
+
+        return Handler
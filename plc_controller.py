@@ -7,12 +7,32 @@ from snap7_connection import PLCConnection, SNAP7_AVAILABLE
 class PLCController:
     """PLC connection and tag management"""
     
-    def __init__(self, config_file='plc_config.json'):
+    def __init__(self, config_file='plc_config.json', backend=None):
+        """
+        Args:
+            config_file: JSON settings file
+            backend: PLCConnection backend, None for snap7 (or "plc_backend": "memory" / "replay" in the config)
+        """
         self.config_file = config_file
         self.config = {}
-        self.plc = PLCConnection()
         self.connected = False
+        self.station_tags = {}  # station -> {tag_name: Tag}, shared with the GUI
+        self.backend_error = None  # Why the configured backend could not be used (snap7 instead)
         self.load_config()
+        if backend is None and self.config.get('plc_backend') == 'memory':
+            from memory_backend import MemoryBackend
+            backend = MemoryBackend(self.config.get('memory_latency_s', 0.0), self.config.get('memory_jitter_s', 0.0))
+        elif backend is None and self.config.get('plc_backend') == 'replay':
+            # Serve a recorded session (PLCConnection.start_recording) instead of a PLC
+            from session_recording import ReplayBackend
+            try:
+                backend = ReplayBackend(self.config['replay_file'], self.config.get('replay_timing', 'original'),
+                                        self.config.get('replay_speed', 1.0))
+            except KeyError:
+                self.backend_error = "Replay backend needs 'replay_file' in the config, using snap7"
+            except (IOError, ValueError) as e:
+                self.backend_error = f"Cannot replay {self.config['replay_file']}: {e}, using snap7"
+        self.plc = PLCConnection(backend)
     
     def load_config(self):
         """Load settings from config file"""
@@ -52,14 +72,15 @@ class PLCController:
     
     def connect_plcsim(self):
         """Connect to PLCSim Station"""
-        if not SNAP7_AVAILABLE:
+        if not SNAP7_AVAILABLE and not self.is_simulated():
             return False, "Snap7 not installed"
         
         ip = self.get_simulator_ip()
         rack = self.config.get('rack', 0)
         slot = self.config.get('slot', 1)
         
-        if self.plc.connect(ip, rack, slot):
+        # simulator_ip may carry the port ("127.0.0.1:10201"), 'port' in the config overrides it
+        if self.plc.connect(ip, rack, slot, self.config.get('port')):
             self.connected = True
             return True, f"Connected to {ip}"
         else:
@@ -73,6 +94,33 @@ class PLCController:
             return True, "Disconnected"
         return False, "Disconnect failed"
     
+    def start_metrics_exporter(self):
+        """
+        Publish the S7 metrics as configured:
+            "metrics_textfile": "/var/lib/node_exporter/textfile/plc.prom",
+            "metrics_http_port": 9810, "metrics_interval_s": 15,
+            "metrics_format": "openmetrics" (or "prometheus")
+        Returns: started MetricsExporter, or None if neither output is configured
+        """
+        path = self.config.get('metrics_textfile')
+        port = self.config.get('metrics_http_port')
+        if not path and port is None:
+            return None
+        from metrics_exporter import MetricsExporter, DEFAULT_INTERVAL_S
+        exporter = MetricsExporter(self.plc.metrics, path, port, self.config.get('metrics_interval_s', DEFAULT_INTERVAL_S),
+                                   openmetrics=self.config.get('metrics_format', 'openmetrics') != 'prometheus')
+        try:
+            exporter.start()
+        except OSError:
+            # Port in use or textfile directory missing, keep running without export
+            exporter.stop()
+            return None
+        return exporter
+    
+    def is_simulated(self):
+        """True if a non-snap7 backend (e.g. the in-memory PLC) is used"""
+        return self.plc.backend is not None
+    
     def is_connected(self):
         """Check connection status"""
         return self.connected and self.plc.is_connected()
@@ -84,7 +132,7 @@ class PLCController:
         Args:
             address: PLC address (e.g. "Q64.0", "M0.0", "I0.1")
             value: Value to send
-            data_type: Data type ('Bool', 'Byte', 'Int', 'DInt')
+            data_type: Data type ('Bool', 'Byte', 'Int', 'DInt' or a DataType)
         
         Returns:
             (success: bool, message: str)
@@ -92,6 +140,8 @@ class PLCController:
         if not self.is_connected():
             return False, "Not connected to PLC"
         
+        data_type = getattr(data_type, 'value', data_type)
+        
         try:
             if data_type == 'Bool':
                 bool_val = bool(value)
@@ -130,8 +180,8 @@ class PLCController:
         Tag'den değer oku
         
         Args:
-            address: PLC adresi
-            data_type: Veri tipi
+            address: PLC adresi (veya parse edilmiş adres tuple'ı)
+            data_type: Veri tipi (str veya DataType)
         
         Returns:
             (success: bool, value: any, message: str)
@@ -139,6 +189,8 @@ class PLCController:
         if not self.is_connected():
             return False, None, "Not connected to PLC"
         
+        data_type = getattr(data_type, 'value', data_type)
+        
         try:
             if data_type == 'Bool':
                 value = self.plc.read_bool(address)
@@ -167,6 +219,51 @@ class PLCController:
         except Exception as e:
             return False, None, f"Error: {str(e)}"
     
+    def register_station_tags(self, station, tags):
+        """
+        Make a station's tags available to read_by_name
+        The dict is kept by reference, later edits are seen immediately.
+        """
+        self.station_tags[station] = tags
+    
+    def read_by_name(self, station, tag_name):
+        """
+        Read a tag by its symbolic name (one dict lookup, no address parsing)
+        The value is read from the currently connected PLC.
+        
+        Returns:
+            (success: bool, value: any, message: str)
+        """
+        tag = self.station_tags.get(station, {}).get(tag_name)
+        if tag is None:
+            return False, None, f"Unknown tag: {station}/{tag_name}"
+        return self.read_tag(tag.location or tag.address, tag.data_type)
+    
+    def read_ranges(self, ranges):
+        """
+        Read tags grouped into merged address ranges, one request per range
+        
+        Args:
+            ranges: [(area, db, start, size, [(tag_name, location, data_type), ...]), ...]
+                    as returned by AddressIndex.read_ranges()
+        
+        Returns:
+            {tag_name: value} (value is None if its range could not be read)
+        """
+        values = {}
+        if not self.is_connected():
+            return values
+        
+        for area, db_num, start, size, members in ranges:
+            data = self.plc.read_block(area, db_num, start, size)
+            for tag_name, location, data_type in members:
+                if data is None:
+                    values[tag_name] = None
+                else:
+                    values[tag_name] = self.plc.decode_value(data, location[2] - start, location[3], data_type)
+        
+        return values
+    
     def send_multiple_tags(self, tags):
         """
         Birden fazla tag'e değer gönder
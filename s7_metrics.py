@@ -0,0 +1,224 @@
+
+import time
+
+# Log-linear buckets like HdrHistogram: 16 sub-buckets per power of two,
+# so every bucket is at most 1/16 (6.25%) wide relative to its value
+SUB_BUCKET_BITS = 4
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+_LINEAR_LIMIT = 2 * SUB_BUCKETS
+# Largest tracked value is 2**40 ns (~18 minutes), larger ones go into the last bucket
+MAX_VALUE_BITS = 40
+BUCKET_COUNT = (MAX_VALUE_BITS - SUB_BUCKET_BITS) * SUB_BUCKETS + _LINEAR_LIMIT
+
+READ = 'read'
+WRITE = 'write'
+
+
+def bucket_index(value):
+    """Bucket of a non-negative integer value"""
+    if value < _LINEAR_LIMIT:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return min((shift << SUB_BUCKET_BITS) + (value >> shift), BUCKET_COUNT - 1)
+
+
+def bucket_bounds(index):
+    """[low, high) value range of a bucket"""
+    if index < _LINEAR_LIMIT:
+        return index, index + 1
+    shift = (index >> SUB_BUCKET_BITS) - 1
+    low = (index - (shift << SUB_BUCKET_BITS)) << shift
+    return low, low + (1 << shift)
+
+
+class LatencyHistogram:
+    """
+    Fixed-size log-linear histogram of durations in nanoseconds
+
+    record() is one bit_length() and one list increment, cheap enough for
+    every PLC request. Percentiles and the minimum are resolved to the
+    bucket (within 6.25%).
+    """
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value_ns):
+        # bucket_index() inlined, this runs for every request
+        if value_ns >= _LINEAR_LIMIT:
+            shift = value_ns.bit_length() - SUB_BUCKET_BITS - 1
+            index = (shift << SUB_BUCKET_BITS) + (value_ns >> shift)
+            if index >= BUCKET_COUNT:
+                index = BUCKET_COUNT - 1
+            self.counts[index] += 1
+        else:
+            self.counts[value_ns if value_ns > 0 else 0] += 1
+        self.count += 1
+        self.total += value_ns
+        if value_ns > self.max:
+            self.max = value_ns
+
+    @property
+    def min(self):
+        """Lower end of the lowest used bucket, None if empty"""
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count:
+                return bucket_bounds(index)[0]
+        return None
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def percentile(self, p):
+        """Value (ns) below which p percent of the samples are, None if empty"""
+        if not self.count:
+            return None
+        rank = max(1, int(round(p / 100.0 * self.count)))
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                # Upper end of the bucket, but never above the largest sample
+                return min(bucket_bounds(index)[1] - 1, self.max)
+        return self.max
+
+    def merge(self, other):
+        for index, bucket_count in enumerate(other.counts):
+            if bucket_count:
+                self.counts[index] += bucket_count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def summary(self):
+        """{count, mean/min/max/p50/p90/p99/p999 in ns}"""
+        return {
+            'count': self.count,
+            'mean_ns': self.mean(),
+            'min_ns': self.min,
+            'p50_ns': self.percentile(50),
+            'p90_ns': self.percentile(90),
+            'p99_ns': self.percentile(99),
+            'p999_ns': self.percentile(99.9),
+            'max_ns': self.max if self.count else None,
+        }
+
+
+class OpStats:
+    """Requests, errors, bytes and latency of one operation on one station"""
+
+    __slots__ = ('latency', 'errors', 'bytes')
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.errors = 0
+        self.bytes = 0
+
+    @property
+    def count(self):
+        return self.latency.count
+
+    def record(self, elapsed_ns, size):
+        # PLCConnection inlines this in read_area/write_area
+        self.latency.record(elapsed_ns)
+        self.bytes += size
+
+    def record_error(self, elapsed_ns):
+        self.latency.record(elapsed_ns)
+        self.errors += 1
+
+
+class CycleStats:
+    """Duration of the polling cycles of one station and how often they overran the interval"""
+
+    __slots__ = ('duration', 'overruns', 'last_s', 'interval_s')
+
+    def __init__(self):
+        self.duration = LatencyHistogram()
+        self.overruns = 0
+        self.last_s = None
+        self.interval_s = None
+
+    @property
+    def count(self):
+        return self.duration.count
+
+    def record(self, duration_s, interval_s):
+        self.duration.record(int(duration_s * 1e9))
+        self.last_s = duration_s
+        self.interval_s = interval_s
+        if interval_s and duration_s > interval_s:
+            self.overruns += 1
+
+
+class S7Metrics:
+    """
+    Counters and latency histograms of the S7 traffic, per station
+
+    PLCConnection records every read_area/write_area, the GUI records its
+    polling cycles. All counters live for the whole session until reset().
+    """
+
+    def __init__(self):
+        self.ops = {}       # (station, operation) -> OpStats
+        self.cycles = {}    # station -> CycleStats
+        self.connects = {}  # station -> [successful connects, failed connects]
+        self.started = time.time()
+
+    def op(self, station, operation):
+        """OpStats of an operation, created on first use (keep it to skip the lookup per request)"""
+        key = (station, operation)
+        stats = self.ops.get(key)
+        if stats is None:
+            stats = self.ops[key] = OpStats()
+        return stats
+
+    def cycle(self, station):
+        stats = self.cycles.get(station)
+        if stats is None:
+            stats = self.cycles[station] = CycleStats()
+        return stats
+
+    def record_cycle(self, station, duration_s, interval_s=None):
+        self.cycle(station).record(duration_s, interval_s)
+
+    def record_connect(self, station, success):
+        counts = self.connects.setdefault(station, [0, 0])
+        counts[0 if success else 1] += 1
+
+    def reset(self):
+        """Clear all counters, OpStats held by PLCConnection keep working"""
+        for stats in self.ops.values():
+            stats.__init__()
+        for stats in self.cycles.values():
+            stats.__init__()
+        self.connects = {}
+        self.started = time.time()
+
+    def snapshot(self):
+        """
+        Plain dict of all counters (for the diagnostics panel or JSON)
+        Safe to call from another thread than the one recording.
+        Returns: {'uptime_s', 'operations': [...], 'cycles': [...], 'connects': [...]}
+        """
+        operations = []
+        for (station, operation), stats in sorted(list(self.ops.items()), key=lambda item: (str(item[0][0]), item[0][1])):
+            if not stats.count:
+                continue
+            operations.append(dict(station=station, operation=operation, errors=stats.errors,
+                                   bytes=stats.bytes, **stats.latency.summary()))
+        cycles = []
+        for station, stats in sorted(list(self.cycles.items()), key=lambda item: str(item[0])):
+            if not stats.count:
+                continue
+            cycles.append(dict(station=station, overruns=stats.overruns, last_s=stats.last_s,
+                               interval_s=stats.interval_s, **stats.duration.summary()))
+        connects = [{'station': station, 'connects': counts[0], 'failures': counts[1]}
+                    for station, counts in sorted(list(self.connects.items()), key=lambda item: str(item[0]))]
+        return {'uptime_s': time.time() - self.started, 'operations': operations, 'cycles': cycles,
+                'connects': connects}
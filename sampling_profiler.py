@@ -0,0 +1,109 @@
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+DEFAULT_INTERVAL_S = 0.005
+MAX_DEPTH = 256
+
+
+def frame_label(code):
+    """Flame graph frame name of a code object: function (file:first line)"""
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler over all threads of the running process
+
+    A timer thread takes sys._current_frames() every interval_s and counts
+    the stack of every other thread, so nothing is instrumented and the
+    profiled code runs unchanged. Stacks are counted as tuples of code
+    objects and only turned into text for the output, in the collapsed
+    format of flamegraph.pl / speedscope / inferno:
+        MainThread;main (tia_gui.py:2210);read_plc_tags (tia_gui.py:1084) 42
+    """
+
+    def __init__(self, interval_s=DEFAULT_INTERVAL_S):
+        self.interval_s = interval_s
+        self.stacks = Counter()  # (thread name, (code, ...)) -> samples
+        self.samples = 0
+        self.started = None
+        self.elapsed_s = 0.0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, duration_s=None):
+        """Start sampling in the background, for duration_s seconds or until stop()"""
+        if self.running:
+            raise RuntimeError("Profiler is already running")
+        self.stacks = Counter()
+        self.samples = 0
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, args=(duration_s,), name='sampling-profiler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop sampling and wait for the sampler thread"""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def wait(self, timeout=None):
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def _run(self, duration_s):
+        own_id = threading.get_ident()
+        self.started = time.perf_counter()
+        deadline = None if duration_s is None else self.started + duration_s
+        stacks = self.stacks
+        while not self.stop_event.is_set():
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                codes = []
+                while frame is not None and len(codes) < MAX_DEPTH:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                codes.reverse()
+                stacks[(names.get(thread_id, f'thread-{thread_id}'), tuple(codes))] += 1
+            self.samples += 1
+            now = time.perf_counter()
+            if deadline is not None and now >= deadline:
+                break
+            self.stop_event.wait(self.interval_s)
+        self.elapsed_s = time.perf_counter() - self.started
+
+    def collapsed(self):
+        """Collapsed stack lines ("thread;outer;...;inner count"), most frequent first"""
+        labels = {}
+        lines = []
+        for (thread_name, codes), count in self.stacks.most_common():
+            frames = [thread_name]
+            for code in codes:
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = frame_label(code).replace(';', ':')
+                frames.append(label)
+            lines.append(f"{';'.join(frames)} {count}")
+        return lines
+
+    def write_collapsed(self, path):
+        """
+        Write the collapsed stacks for flamegraph.pl, speedscope or inferno
+        Returns: number of distinct stacks written
+        """
+        lines = self.collapsed()
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines))
+            if lines:
+                f.write('\n')
+        return len(lines)
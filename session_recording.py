@@ -0,0 +1,205 @@
+
+import struct
+import sys
+import time
+from collections import deque, namedtuple
+
+MAGIC = b'S7REC\x00\x01\x00'
+# magic, wall clock time of the first request (time.time())
+FILE_HEADER = struct.Struct('<8sd')
+# flags (operation + error bit), area, db, start, size, ns since recording start, duration ns, payload bytes
+RECORD_HEADER = struct.Struct('<BBIIIqqI')
+Record = namedtuple('Record', 'op area db start size t_ns duration_ns error payload')
+
+OP_READ = 0
+OP_WRITE = 1
+_ERROR_FLAG = 0x80
+
+TIMING_MODES = ('original', 'fast')
+
+
+class SessionRecorder:
+    """
+    Writes every PLC request of a session to a compact binary file
+
+    One 34 byte header per request (operation, area, db, offset, size,
+    start time and duration) followed by the payload: the bytes read, the
+    bytes written, or the error text of a failed request. PLCConnection
+    calls record() under its lock, so requests are in their real order.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'wb')
+        self.file.write(FILE_HEADER.pack(MAGIC, time.time()))
+        self.origin_ns = None
+        self.count = 0
+
+    def record(self, op, area, db_num, start, size, payload, started_ns, duration_ns, error=None):
+        if self.origin_ns is None:
+            self.origin_ns = started_ns
+        flags = op | _ERROR_FLAG if error is not None else op
+        if error is not None:
+            payload = str(error).encode('utf-8')
+        self.file.write(RECORD_HEADER.pack(flags, int(area), db_num, start, size,
+                                           started_ns - self.origin_ns, duration_ns, len(payload)))
+        self.file.write(payload)
+        self.count += 1
+
+    def close(self):
+        """Returns: number of requests recorded"""
+        if not self.file.closed:
+            self.file.close()
+        return self.count
+
+
+def read_session(path):
+    """
+    Read a recording
+    Returns: (wall clock start, [Record, ...])
+    Raises: ValueError if the file is not a recording
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < FILE_HEADER.size:
+        raise ValueError(f"{path} is not a PLC session recording")
+    magic, wall_start = FILE_HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a PLC session recording")
+    records = []
+    offset = FILE_HEADER.size
+    while offset + RECORD_HEADER.size <= len(data):
+        flags, area, db_num, start, size, t_ns, duration_ns, length = RECORD_HEADER.unpack_from(data, offset)
+        offset += RECORD_HEADER.size
+        payload = bytes(data[offset:offset + length])
+        offset += length
+        if len(payload) < length:
+            break  # Truncated last record (recording not closed)
+        error = payload.decode('utf-8', 'replace') if flags & _ERROR_FLAG else None
+        records.append(Record(flags & ~_ERROR_FLAG, area, db_num, start, size, t_ns, duration_ns, error,
+                              b'' if error is not None else payload))
+    return wall_start, records
+
+
+def summarize(records):
+    """Request counts, bytes and latency of a recording"""
+    reads = [r for r in records if r.op == OP_READ]
+    writes = [r for r in records if r.op == OP_WRITE]
+    durations = sorted(r.duration_ns for r in records)
+    span_s = (records[-1].t_ns - records[0].t_ns) / 1e9 if records else 0.0
+    return {
+        'requests': len(records),
+        'reads': len(reads),
+        'writes': len(writes),
+        'errors': sum(1 for r in records if r.error is not None),
+        'bytes_read': sum(len(r.payload) for r in reads),
+        'bytes_written': sum(len(r.payload) for r in writes),
+        'duration_s': span_s,
+        'latency_p50_ms': durations[len(durations) // 2] / 1e6 if durations else None,
+        'latency_max_ms': durations[-1] / 1e6 if durations else None,
+    }
+
+
+class ReplayBackend:
+    """
+    PLCConnection backend serving a recorded session
+
+    Every read is answered with the next recorded response of the same
+    (area, db, start, size) request; requests that were never recorded
+    are served from a memory image that starts with every recorded read
+    and write applied in order, and follows the replayed reads and the
+    new writes. Recorded errors are raised again. With timing
+    'original' each response waits the recorded request duration
+    (scaled by speed), with 'fast' it returns immediately.
+    """
+
+    def __init__(self, path, timing='original', speed=1.0, loop=True):
+        if timing not in TIMING_MODES:
+            raise ValueError(f"Unknown replay timing: {timing}")
+        self.path = path
+        self.timing = timing
+        self.speed = speed
+        self.loop = loop
+        self.wall_start, self.records = read_session(path)
+        self.connected = False
+        self.read_count = 0
+        self.write_count = 0
+        self.unmatched_reads = 0
+        self.rewind()
+
+    def rewind(self):
+        """Start the replay over from the first request"""
+        self.queues = {}  # (area, db, start, size) -> deque of read Records
+        for record in self.records:
+            if record.op == OP_READ:
+                self.queues.setdefault((record.area, record.db, record.start, record.size), deque()).append(record)
+        self.served = {key: [] for key in self.queues}  # For loop=True
+        self.image = {}  # (area, db) -> bytearray
+        for record in self.records:
+            if record.error is None and record.payload:
+                self._area(record.area, record.db, record.start + len(record.payload))[
+                    record.start:record.start + len(record.payload)] = record.payload
+
+    def connect(self, ip_address, rack=0, slot=1, port=102):
+        self.connected = True
+
+    def disconnect(self):
+        self.connected = False
+
+    def get_connected(self):
+        return self.connected
+
+    def _area(self, area, db_num, end):
+        data = self.image.setdefault((area, db_num), bytearray())
+        if len(data) < end:
+            data.extend(bytes(end - len(data)))
+        return data
+
+    def _wait(self, record):
+        if self.timing == 'original' and record is not None and self.speed > 0:
+            time.sleep(record.duration_ns / 1e9 / self.speed)
+
+    def read_area(self, area, db_num, start, size):
+        if not self.connected:
+            raise RuntimeError("TCP : Not connected")
+        area = int(area)
+        key = (area, db_num, start, size)
+        queue = self.queues.get(key)
+        record = None
+        if queue:
+            record = queue.popleft()
+            self.served[key].append(record)
+            if not queue and self.loop:
+                queue.extend(self.served[key])
+                self.served[key] = []
+        self._wait(record)
+        self.read_count += 1
+        if record is None:
+            self.unmatched_reads += 1
+            data = self._area(area, db_num, start + size)
+            return bytearray(data[start:start + size])
+        if record.error is not None:
+            raise RuntimeError(record.error)
+        self._area(area, db_num, start + size)[start:start + size] = record.payload
+        return bytearray(record.payload)
+
+    def write_area(self, area, db_num, start, data):
+        if not self.connected:
+            raise RuntimeError("TCP : Not connected")
+        self._area(int(area), db_num, start + len(data))[start:start + len(data)] = data
+        self.write_count += 1
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: python session_recording.py <recording>")
+        return 1
+    wall_start, records = read_session(sys.argv[1])
+    print(f"Recorded {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(wall_start))}")
+    for key, value in summarize(records).items():
+        print(f"  {key:<16} {value if not isinstance(value, float) else round(value, 3)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
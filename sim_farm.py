@@ -0,0 +1,318 @@
+"""
+Local simulator farm for load testing
+
+Starts N snap7 servers on 127.0.0.1 (one TCP port each) with registered
+DB, M, I and Q areas and keeps changing tag values with scripted
+generators (ramps, toggles, noise). Every server is a real S7 endpoint,
+so the GUI and PLCController talk to it over TCP exactly as to a PLC:
+connect to "127.0.0.1:<port>" or set 'port' in plc_config.json.
+
+Usage: python sim_farm.py [--count 10] [--base-port 10201] [--tags 200]
+                          [--interval 0.1] [--write-tags farm_tags.json]
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+
+from snap7_connection import Areas, PLCConnection, load_snap7, set_bool
+
+DEFAULT_BASE_PORT = 10201
+DEFAULT_AREA_SIZE = 65536
+DEFAULT_DBS = (1,)
+DEFAULT_INTERVAL_S = 0.1
+
+GENERATOR_KINDS = ('ramp', 'toggle', 'noise', 'sine', 'constant')
+
+# Generator used when a tag has no "sim" entry
+DEFAULT_KINDS = {'Bool': 'toggle', 'Byte': 'noise', 'Int': 'ramp', 'DInt': 'ramp'}
+
+# Value range of the types PLCConnection can read (Int/DInt are read unsigned, see read_int)
+TYPE_RANGES = {'Bool': (0, 1), 'Byte': (0, 255), 'Int': (0, 0xFFFFFFFF), 'DInt': (0, 0xFFFFFFFF)}
+# Generator range when a tag sets no low/high
+DEFAULT_RANGES = {'Bool': (0, 1), 'Byte': (0, 255), 'Int': (0, 1000), 'DInt': (0, 1000)}
+
+
+class Generator:
+    """
+    Scripted value of one tag over time
+
+    ramp: low -> high once per period, toggle: low/high every half period,
+    noise: uniform random in [low, high], sine: one period between low
+    and high, constant: always low.
+    """
+
+    def __init__(self, address, data_type='Int', kind=None, period_s=10.0, low=None, high=None, seed=0):
+        if data_type not in TYPE_RANGES:
+            raise ValueError(f"Unsupported data type for simulation: {data_type}")
+        kind = kind or DEFAULT_KINDS[data_type]
+        if kind not in GENERATOR_KINDS:
+            raise ValueError(f"Unknown generator: {kind}")
+        parsed = PLCConnection.parse_address(address)
+        if parsed is None:
+            raise ValueError(f"Invalid address: {address}")
+        type_low, type_high = TYPE_RANGES[data_type]
+        default_low, default_high = DEFAULT_RANGES[data_type]
+        self.address = address
+        self.parsed = parsed
+        self.data_type = data_type
+        self.kind = kind
+        self.period_s = max(float(period_s), 1e-3)
+        self.low = default_low if low is None else max(type_low, low)
+        self.high = default_high if high is None else min(type_high, high)
+        self.random = random.Random(seed)
+
+    def value(self, t):
+        phase = (t / self.period_s) % 1.0
+        if self.kind == 'ramp':
+            value = self.low + (self.high - self.low) * phase
+        elif self.kind == 'toggle':
+            value = self.high if phase >= 0.5 else self.low
+        elif self.kind == 'noise':
+            value = self.random.uniform(self.low, self.high)
+        elif self.kind == 'sine':
+            value = self.low + (self.high - self.low) * (0.5 + 0.5 * math.sin(2 * math.pi * phase))
+        else:
+            value = self.low
+        if self.data_type == 'Bool':
+            return bool(round(value))
+        return int(round(value))
+
+    @classmethod
+    def from_tag(cls, tag, seed=0):
+        """Generator for a tag_values.json entry, settings from its optional "sim" entry"""
+        sim = tag.get('sim') or {}
+        return cls(tag.get('address', ''), tag.get('type', 'Int'), sim.get('kind'), sim.get('period_s', 10.0),
+                   sim.get('low'), sim.get('high'), seed)
+
+
+def encode_value(data, byte_addr, bit_addr, data_type, value):
+    """Store a value in an area buffer the way PLCConnection reads it"""
+    if data_type == 'Bool':
+        if bit_addr is None:
+            data[byte_addr] = 1 if value else 0
+        else:
+            set_bool(data, byte_addr, bit_addr, value)
+    elif data_type == 'Byte':
+        data[byte_addr] = int(value) & 0xFF
+    else:
+        data[byte_addr:byte_addr + 4] = (int(value) & 0xFFFFFFFF).to_bytes(4, byteorder='big')
+
+
+class SimulatedPLC:
+    """One snap7 server with its I, Q, M and DB areas"""
+
+    def __init__(self, port, host='127.0.0.1', area_size=DEFAULT_AREA_SIZE, dbs=DEFAULT_DBS):
+        snap7 = load_snap7()
+        import snap7.server
+        srv_areas = snap7.type.SrvArea
+        self.port = port
+        self.host = host
+        self.server = snap7.server.Server(log=False)
+        self.server.host = host
+        self.srv_area = {Areas.PE: srv_areas.PE, Areas.PA: srv_areas.PA, Areas.MK: srv_areas.MK,
+                         Areas.DB: srv_areas.DB}
+        self.areas = {}  # (area, db) -> bytearray shared with the server
+        for area in (Areas.PE, Areas.PA, Areas.MK):
+            self._register(area, 0, area_size)
+        for db_num in dbs:
+            self._register(Areas.DB, db_num, area_size)
+        self.generators = []
+
+    def _register(self, area, db_num, size):
+        data = bytearray(size)
+        self.server.register_area(self.srv_area[area], db_num, data)
+        self.areas[(area, db_num)] = data
+
+    @property
+    def address(self):
+        return f'{self.host}:{self.port}'
+
+    def start(self):
+        self.server.start(tcp_port=self.port)
+
+    def stop(self):
+        self.server.stop()
+
+    def add_generator(self, generator):
+        area, db_num, byte_addr, _ = generator.parsed
+        key = (area, db_num if area == Areas.DB else 0)
+        if key not in self.areas:
+            raise ValueError(f"{generator.address}: DB{db_num} is not registered on the simulator")
+        if byte_addr + (4 if generator.data_type in ('Int', 'DInt') else 1) > len(self.areas[key]):
+            raise ValueError(f"{generator.address}: address out of range")
+        self.generators.append(generator)
+
+    def update(self, t):
+        """Write the generator values for time t, each area under its server lock"""
+        by_area = {}
+        for generator in self.generators:
+            area, db_num, byte_addr, bit_addr = generator.parsed
+            key = (area, db_num if area == Areas.DB else 0)
+            by_area.setdefault(key, []).append((byte_addr, bit_addr, generator.data_type, generator.value(t)))
+        for (area, db_num), writes in by_area.items():
+            data = self.areas[(area, db_num)]
+            self.server.lock_area(self.srv_area[area], db_num)
+            try:
+                for byte_addr, bit_addr, data_type, value in writes:
+                    encode_value(data, byte_addr, bit_addr, data_type, value)
+            finally:
+                self.server.unlock_area(self.srv_area[area], db_num)
+
+
+def synthetic_tags(tag_count):
+    """
+    Tags in tag_values.json format covering all generator kinds
+    Bools in M, Bytes in Q, Ints/DInts in DB1 (4 bytes each, see write_int).
+    """
+    tags = {}
+    for n in range(tag_count):
+        group = n % 4
+        if group == 0:
+            tag = {'address': f'M{n // 32}.{n // 4 % 8}', 'type': 'Bool', 'sim': {'kind': 'toggle', 'period_s': 1 + n % 5}}
+        elif group == 1:
+            tag = {'address': f'QB{n // 4}', 'type': 'Byte', 'sim': {'kind': 'noise'}}
+        elif group == 2:
+            tag = {'address': f'DB1.DBD{n // 4 * 8}', 'type': 'DInt', 'sim': {'kind': 'ramp', 'period_s': 10, 'high': 10000}}
+        else:
+            tag = {'address': f'DB1.DBD{n // 4 * 8 + 4}', 'type': 'Int', 'sim': {'kind': 'sine', 'period_s': 20, 'high': 1000}}
+        tags[f'sim_{n}'] = dict(db='', value='0', display_format='DEC', sending_format='DEC', **tag)
+    return tags
+
+
+class SimulatorFarm:
+    """
+    N simulated PLCs on consecutive ports, updated by one background thread
+
+    Every PLC gets the same tag layout; generators are seeded per PLC and
+    tag, so runs are reproducible. Use as a context manager or call
+    start()/stop().
+    """
+
+    def __init__(self, count, base_port=DEFAULT_BASE_PORT, tags=None, interval_s=DEFAULT_INTERVAL_S,
+                 host='127.0.0.1', area_size=DEFAULT_AREA_SIZE, dbs=DEFAULT_DBS, seed=0):
+        """
+        Args:
+            count: Number of PLCs
+            tags: {tag_name: tag_data} simulated on every PLC (synthetic_tags() if None)
+            interval_s: Update period of the generators
+        """
+        self.tags = synthetic_tags(100) if tags is None else tags
+        self.interval_s = interval_s
+        self.plcs = []
+        self.errors = []
+        for i in range(count):
+            plc = SimulatedPLC(base_port + i, host, area_size, dbs)
+            for n, (tag_name, tag) in enumerate(self.tags.items()):
+                try:
+                    plc.add_generator(Generator.from_tag(tag, seed=seed + i * 100003 + n))
+                except (ValueError, KeyError) as e:
+                    if i == 0:
+                        self.errors.append(f"{tag_name}: {e}")
+            self.plcs.append(plc)
+        self.update_count = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def station_name(self, i):
+        return f'Farm{i + 1:03d}_{self.plcs[i].address}'
+
+    def stations(self):
+        """{station name: "host:port"}, the station names carry the address like the GUI expects"""
+        return {self.station_name(i): plc.address for i, plc in enumerate(self.plcs)}
+
+    def tag_values(self):
+        """tag_values.json content with one station per PLC"""
+        return {station: json.loads(json.dumps(self.tags)) for station in self.stations()}
+
+    def update(self, t=None):
+        t = time.time() if t is None else t
+        for plc in self.plcs:
+            plc.update(t)
+        self.update_count += 1
+
+    def _run(self):
+        next_time = time.perf_counter()
+        while not self.stop_event.is_set():
+            self.update()
+            next_time += self.interval_s
+            delay = next_time - time.perf_counter()
+            if delay < 0:
+                # Running late, skip the missed updates instead of catching up
+                next_time = time.perf_counter()
+                delay = 0
+            self.stop_event.wait(delay)
+
+    def start(self):
+        started = []
+        try:
+            for plc in self.plcs:
+                plc.start()
+                started.append(plc)
+        except Exception:
+            for plc in started:
+                plc.stop()
+            raise
+        self.update()
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name='sim-farm', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        for plc in self.plcs:
+            plc.stop()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local snap7 PLC simulator farm')
+    parser.add_argument('--count', type=int, default=10, help='number of simulated PLCs')
+    parser.add_argument('--base-port', type=int, default=DEFAULT_BASE_PORT, help='TCP port of the first PLC')
+    parser.add_argument('--tags', type=int, default=200, help='synthetic tags per PLC')
+    parser.add_argument('--tag-file', help='simulate the tags of this station from tag_values.json instead',
+                        metavar='FILE:STATION')
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL_S, help='generator update period (s)')
+    parser.add_argument('--write-tags', help='write a tag_values.json with one station per PLC')
+    args = parser.parse_args()
+
+    tags = None
+    if args.tag_file:
+        path, _, station = args.tag_file.rpartition(':')
+        with open(path, 'r', encoding='utf-8') as f:
+            tags = json.load(f)[station]
+    farm = SimulatorFarm(args.count, args.base_port, tags if tags is not None else synthetic_tags(args.tags),
+                         args.interval)
+    for error in farm.errors:
+        print(f"Skipped {error}")
+
+    if args.write_tags:
+        with open(args.write_tags, 'w', encoding='utf-8') as f:
+            json.dump(farm.tag_values(), f, indent=4)
+        print(f"Wrote {len(farm.plcs)} stations to {args.write_tags}")
+        print("Add the station names to 'snap7_stations' in plc_config.json to poll them from the GUI")
+
+    with farm:
+        for station, address in farm.stations().items():
+            print(f"{station}: {address}")
+        print(f"{len(farm.plcs)} PLCs x {len(farm.plcs[0].generators) if farm.plcs else 0} tags running, Ctrl+C to stop")
+        try:
+            while True:
+                time.sleep(1.0)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
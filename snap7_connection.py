@@ -1,41 +1,145 @@
+import threading
+from enum import IntEnum
+from functools import lru_cache
+from importlib.util import find_spec
+from time import perf_counter_ns
 
-try:
-    import snap7
-    from snap7.type import Areas
-    from snap7.util import get_bool, set_bool
-    SNAP7_AVAILABLE = True
-except ImportError:
-    SNAP7_AVAILABLE = False
+from s7_metrics import READ, WRITE, S7Metrics
+from session_recording import OP_READ, OP_WRITE, SessionRecorder
+from trace_spans import TRACER
 
+# snap7 is imported on the first connect, not at startup
+SNAP7_AVAILABLE = find_spec('snap7') is not None
+_snap7 = None
 
-class PLCConnection:
-    """Manages Snap7 PLC connections"""
+
+def load_snap7():
+    """Import snap7 (client + types) on first use"""
+    global _snap7
+    if _snap7 is None:
+        import snap7
+        import snap7.client
+        import snap7.type
+        _snap7 = snap7
+    return _snap7
+
+
+class Areas(IntEnum):
+    """S7 area codes (same values as snap7.type.Areas)"""
+    PE = 0x81
+    PA = 0x82
+    MK = 0x83
+    DB = 0x84
+    CT = 0x1C
+    TM = 0x1D
+
+
+DEFAULT_PORT = 102
+
+# Bytes read/written by PLCConnection per data type (see read_*/write_*)
+ACCESS_SIZES = {'Bool': 1, 'Byte': 1, 'Int': 4, 'DInt': 4}
+
+# Address prefix -> area for Merker, Input and Output addresses
+BIT_AREAS = {'M': Areas.MK, 'I': Areas.PE, 'Q': Areas.PA}
+
+
+def get_bool(data, byte_index, bit_index):
+    """Read one bit of a byte buffer"""
+    return bool(data[byte_index] >> bit_index & 1)
+
+
+def set_bool(data, byte_index, bit_index, value):
+    """Set one bit of a byte buffer (bytearray or list)"""
+    if value:
+        data[byte_index] |= 1 << bit_index
+    else:
+        data[byte_index] &= ~(1 << bit_index) & 0xFF
+    return data
+
+
+def split_host_port(address, port=None):
+    """'127.0.0.1:10201' -> ('127.0.0.1', 10201), the port argument wins if given"""
+    host, separator, port_text = address.strip().partition(':')
+    if port is None:
+        port = int(port_text) if separator and port_text.isdigit() else DEFAULT_PORT
+    return host, port
+
+
+class Snap7Backend:
+    """
+    snap7 client as a PLCConnection backend
+    
+    A backend provides connect/disconnect/get_connected and raw
+    read_area/write_area with Areas codes, see memory_backend.MemoryBackend
+    for the in-memory one.
+    """
     
     def __init__(self):
+        self.client = None
+    
+    def connect(self, ip_address, rack, slot, port=DEFAULT_PORT):
+        snap7 = load_snap7()
+        self.client = snap7.client.Client()
+        self.client.connect(ip_address, rack, slot, port)
+    
+    def disconnect(self):
+        self.client.disconnect()
+    
+    def get_connected(self):
+        return self.client is not None and self.client.get_connected()
+    
+    def read_area(self, area, db_num, start, size):
+        return self.client.read_area(_snap7.type.Areas(area), db_num, start, size)
+    
+    def write_area(self, area, db_num, start, data):
+        return self.client.write_area(_snap7.type.Areas(area), db_num, start, data)
+
+
+class PLCConnection:
+    """Manages PLC connections (snap7 or another backend)"""
+    
+    def __init__(self, backend=None):
+        """
+        Args:
+            backend: Backend object to use instead of snap7 (e.g. MemoryBackend)
+        """
+        self.backend = backend
         self.plc = None
         self.connected = False
+        # One request at a time, the client is shared by the GUI and capture threads
+        self.lock = threading.RLock()
+        # Request latency/bytes/errors, recorded under the station label (see set_station)
+        self.metrics = S7Metrics()
+        self.set_station(None)
+        # SessionRecorder while recording (see start_recording)
+        self.recorder = None
         
-    def connect(self, ip_address, rack=0, slot=1):
+    def connect(self, ip_address, rack=0, slot=1, port=None):
         """
         Connect to PLC
         Args:
-            ip_address: IP of PLC
+            ip_address: IP of PLC, "ip:port" for a non-standard port (e.g. a local simulator)
             rack: Rack number (usually 0)
             slot: Slot number (usually 1)
+            port: TCP port, overrides the one in ip_address (default 102)
         Returns:
             True if connected, False otherwise
         """
-        if not SNAP7_AVAILABLE:
+        if self.backend is None and not SNAP7_AVAILABLE:
             return False
-            
+        
+        ip_address, port = split_host_port(ip_address, port)
+        if self.station is None or self._station_from_address:
+            self.set_station(f'{ip_address}:{port}')
+            self._station_from_address = True
         try:
-            self.plc = snap7.client.Client()
-            self.plc.connect(ip_address, rack, slot)
+            self.plc = self.backend if self.backend is not None else Snap7Backend()
+            self.plc.connect(ip_address, rack, slot, port)
             self.connected = self.plc.get_connected()
-            return self.connected
         except Exception as e:
             self.connected = False
-            return False
+        self.metrics.record_connect(self.station, self.connected)
+        return self.connected
     
     def disconnect(self):
         """Disconnect from PLC"""
@@ -52,68 +156,140 @@ class PLCConnection:
         """Check connection status"""
         return self.connected
     
-    def parse_address(self, address):
+    @staticmethod
+    @lru_cache(maxsize=65536)
+    def parse_address(address):
         """
         Parse PLC address format
-        Examples: "M0.0", "DB1.DBD0", "I0.1", "Q0.0"
+        Examples: "M0.0", "MB4", "DB1.DBD0", "DB1.DBX2.1", "I0.1", "QW64"
+        TIA Portal notation with a leading '%' ("%I0.1") is accepted too.
         Returns: (area, db_number, byte, bit) or None if invalid
+        Results are cached, every tag address is parsed only once.
         """
         try:
             address = address.strip().upper()
+            if address.startswith('%'):
+                address = address[1:]
             
-            # Format: M0.0 (Merker)
-            if address.startswith('M'):
-                parts = address[1:].split('.')
+            # Format: M0.0 / MB0 (Merker), I0.1 / IW2 (Input), Q0.0 / QD4 (Output)
+            if address[:1] in BIT_AREAS:
+                area = BIT_AREAS[address[0]]
+                rest = address[1:]
+                if rest[:1] in ('B', 'W', 'D'):
+                    return (area, 0, int(rest[1:]), None)
+                parts = rest.split('.')
                 if len(parts) == 2:
                     byte_addr = int(parts[0])
                     bit_addr = int(parts[1])
-                    return (Areas.MK, 0, byte_addr, bit_addr)
-            
-            # Format: I0.1 (Input)
-            elif address.startswith('I'):
-                parts = address[1:].split('.')
-                if len(parts) == 2:
-                    byte_addr = int(parts[0])
-                    bit_addr = int(parts[1])
-                    return (Areas.PE, 0, byte_addr, bit_addr)
-            
-            # Format: Q0.0 (Output)
-            elif address.startswith('Q'):
-                parts = address[1:].split('.')
-                if len(parts) == 2:
-                    byte_addr = int(parts[0])
-                    bit_addr = int(parts[1])
-                    return (Areas.PA, 0, byte_addr, bit_addr)
+                    if 0 <= bit_addr <= 7:
+                        return (area, 0, byte_addr, bit_addr)
             
             # Format: DB1.DBD0 (Data Block)
             elif address.startswith('DB'):
-                parts = address.split('.')
-                if len(parts) == 2:
-                    db_num = int(parts[0][2:])
-                    offset_str = parts[1]
-                    
-                    if offset_str.startswith('DBD'):
-                        offset = int(offset_str[3:])
-                        return (Areas.DB, db_num, offset, None)
-                    elif offset_str.startswith('DBB'):
-                        offset = int(offset_str[3:])
-                        return (Areas.DB, db_num, offset, None)
-                    elif offset_str.startswith('DBX'):
-                        offset_parts = offset_str[3:].split('.')
-                        byte_offset = int(offset_parts[0])
-                        bit_offset = int(offset_parts[1])
+                db_part, _, offset_str = address.partition('.')
+                db_num = int(db_part[2:])
+                
+                if offset_str[:3] in ('DBD', 'DBW', 'DBB'):
+                    offset = int(offset_str[3:])
+                    return (Areas.DB, db_num, offset, None)
+                elif offset_str.startswith('DBX'):
+                    offset_parts = offset_str[3:].split('.')
+                    byte_offset = int(offset_parts[0])
+                    bit_offset = int(offset_parts[1])
+                    if 0 <= bit_offset <= 7:
                         return (Areas.DB, db_num, byte_offset, bit_offset)
             
             return None
         except:
             return None
     
+    def set_station(self, station):
+        """Label the following requests in self.metrics (default: "ip:port" of the connection)"""
+        self.station = station
+        self._station_from_address = False
+        self.read_stats = self.metrics.op(station, READ)
+        self.write_stats = self.metrics.op(station, WRITE)
+    
+    def start_recording(self, path):
+        """
+        Log every following request and response to path (see session_recording)
+        Raises: IOError if the file cannot be created
+        """
+        with self.lock:
+            self.stop_recording()
+            self.recorder = SessionRecorder(path)
+    
+    def stop_recording(self):
+        """
+        Close the recording
+        Returns: number of requests recorded, None if not recording
+        """
+        with self.lock:
+            recorder, self.recorder = self.recorder, None
+            return recorder.close() if recorder is not None else None
+    
+    def read_area(self, area, db_num, start, size):
+        """Raw area read, area is an Areas value"""
+        with self.lock:
+            stats = self.read_stats
+            started = perf_counter_ns()
+            try:
+                data = self.plc.read_area(area, db_num, start, size)
+            except Exception as e:
+                elapsed = perf_counter_ns() - started
+                stats.record_error(elapsed)
+                if self.recorder is not None:
+                    self.recorder.record(OP_READ, area, db_num, start, size, b'', started, elapsed, e)
+                if TRACER.enabled:
+                    TRACER.complete('s7.read_area', started, elapsed, {'db': db_num, 'start': start, 'size': size,
+                                                                       'error': str(e)}, 's7')
+                raise
+            elapsed = perf_counter_ns() - started
+            stats.latency.record(elapsed)
+            stats.bytes += size
+            if self.recorder is not None:
+                self.recorder.record(OP_READ, area, db_num, start, size, bytes(data), started, elapsed)
+            if TRACER.enabled:
+                TRACER.complete('s7.read_area', started, elapsed, {'db': db_num, 'start': start, 'size': size}, 's7')
+            return data
+    
+    def write_area(self, area, db_num, start, data):
+        """Raw area write, area is an Areas value"""
+        with self.lock:
+            stats = self.write_stats
+            started = perf_counter_ns()
+            try:
+                result = self.plc.write_area(area, db_num, start, data)
+            except Exception as e:
+                elapsed = perf_counter_ns() - started
+                stats.record_error(elapsed)
+                if self.recorder is not None:
+                    self.recorder.record(OP_WRITE, area, db_num, start, len(data), b'', started, elapsed, e)
+                if TRACER.enabled:
+                    TRACER.complete('s7.write_area', started, elapsed, {'db': db_num, 'start': start, 'size': len(data),
+                                                                        'error': str(e)}, 's7')
+                raise
+            elapsed = perf_counter_ns() - started
+            stats.latency.record(elapsed)
+            stats.bytes += len(data)
+            if self.recorder is not None:
+                self.recorder.record(OP_WRITE, area, db_num, start, len(data), bytes(data), started, elapsed)
+            if TRACER.enabled:
+                TRACER.complete('s7.write_area', started, elapsed, {'db': db_num, 'start': start, 'size': len(data)}, 's7')
+            return result
+    
+    def resolve_address(self, address):
+        """Accept an address string or an already parsed (area, db, byte, bit) tuple"""
+        if isinstance(address, tuple):
+            return address
+        return self.parse_address(address)
+    
     def read_bool(self, address):
         """Read boolean value from address"""
         if not self.connected:
             return None
         
-        parsed = self.parse_address(address)
+        parsed = self.resolve_address(address)
         if not parsed:
             return None
         
@@ -121,10 +297,10 @@ class PLCConnection:
             area, db_num, byte_addr, bit_addr = parsed
             
             if bit_addr is not None:
-                data = self.plc.read_area(area, db_num, byte_addr, 1)
+                data = self.read_area(area, db_num, byte_addr, 1)
                 return get_bool(data, 0, bit_addr)
             else:
-                data = self.plc.read_area(area, db_num, byte_addr, 1)
+                data = self.read_area(area, db_num, byte_addr, 1)
                 return data[0] != 0
         except Exception as e:
             return None
@@ -134,7 +310,7 @@ class PLCConnection:
         if not self.connected:
             return False
         
-        parsed = self.parse_address(address)
+        parsed = self.resolve_address(address)
         if not parsed:
             return False
         
@@ -142,13 +318,15 @@ class PLCConnection:
             area, db_num, byte_addr, bit_addr = parsed
             
             if bit_addr is not None:
-                data = self.plc.read_area(area, db_num, byte_addr, 1)
-                data_list = list(data)
-                set_bool(data_list, 0, bit_addr, value)
-                self.plc.write_area(area, db_num, byte_addr, bytes(data_list))
+                # Read-modify-write of the byte must not interleave with other writes
+                with self.lock:
+                    data = self.read_area(area, db_num, byte_addr, 1)
+                    data_list = list(data)
+                    set_bool(data_list, 0, bit_addr, value)
+                    self.write_area(area, db_num, byte_addr, bytes(data_list))
             else:
                 byte_val = 1 if value else 0
-                self.plc.write_area(area, db_num, byte_addr, bytes([byte_val]))
+                self.write_area(area, db_num, byte_addr, bytes([byte_val]))
             
             return True
         except Exception as e:
@@ -159,13 +337,13 @@ class PLCConnection:
         if not self.connected:
             return None
         
-        parsed = self.parse_address(address)
+        parsed = self.resolve_address(address)
         if not parsed:
             return None
         
         try:
             area, db_num, byte_addr, _ = parsed
-            data = self.plc.read_area(area, db_num, byte_addr, 1)
+            data = self.read_area(area, db_num, byte_addr, 1)
             return int(data[0])
         except Exception as e:
             return None
@@ -175,14 +353,14 @@ class PLCConnection:
         if not self.connected:
             return False
         
-        parsed = self.parse_address(address)
+        parsed = self.resolve_address(address)
         if not parsed:
             return False
         
         try:
             area, db_num, byte_addr, _ = parsed
             byte_val = int(value) & 0xFF
-            self.plc.write_area(area, db_num, byte_addr, bytes([byte_val]))
+            self.write_area(area, db_num, byte_addr, bytes([byte_val]))
             return True
         except Exception as e:
             return False
@@ -192,13 +370,13 @@ class PLCConnection:
         if not self.connected:
             return None
         
-        parsed = self.parse_address(address)
+        parsed = self.resolve_address(address)
         if not parsed:
             return None
         
         try:
             area, db_num, byte_addr, _ = parsed
-            data = self.plc.read_area(area, db_num, byte_addr, 4)
+            data = self.read_area(area, db_num, byte_addr, 4)
             return int.from_bytes(data[:4], byteorder='big')
         except Exception as e:
             return None
@@ -208,14 +386,47 @@ class PLCConnection:
         if not self.connected:
             return False
         
-        parsed = self.parse_address(address)
+        parsed = self.resolve_address(address)
         if not parsed:
             return False
         
         try:
             area, db_num, byte_addr, _ = parsed
             data = int(value).to_bytes(4, byteorder='big')
-            self.plc.write_area(area, db_num, byte_addr, data)
+            self.write_area(area, db_num, byte_addr, data)
             return True
         except Exception as e:
             return False
+    
+    def read_block(self, area, db_num, start, size):
+        """
+        Read a contiguous byte range in one request
+        Returns: bytearray or None on error
+        """
+        if not self.connected:
+            return None
+        
+        try:
+            return self.read_area(area, db_num, start, size)
+        except Exception as e:
+            return None
+    
+    @staticmethod
+    def decode_value(data, offset, bit_addr, data_type):
+        """
+        Decode a value from a block read, same result as read_bool/read_byte/read_int
+        Args:
+            data: Bytes of the block
+            offset: Byte offset of the tag inside data
+            bit_addr: Bit number or None
+            data_type: 'Bool', 'Byte', 'Int' or 'DInt'
+        """
+        if data_type == 'Bool':
+            if bit_addr is not None:
+                return get_bool(data, offset, bit_addr)
+            return data[offset] != 0
+        elif data_type == 'Byte':
+            return int(data[offset])
+        elif data_type in ['Int', 'DInt']:
+            return int.from_bytes(data[offset:offset + 4], byteorder='big')
+        return None
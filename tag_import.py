@@ -0,0 +1,162 @@
+
+import csv
+import os
+import xml.etree.ElementTree as ET
+
+from snap7_connection import PLCConnection
+from tag_model import Tag, data_type_from_name
+
+# Keep at most this many skipped rows for the report, the rest is only counted
+MAX_REPORTED_ERRORS = 100
+
+# CSV header names (lower case) used by TIA Portal tag table exports
+CSV_NAME_COLUMNS = ('name',)
+CSV_TYPE_COLUMNS = ('data type', 'datatype', 'data_type', 'type')
+CSV_ADDRESS_COLUMNS = ('logical address', 'address', 'logicaladdress')
+CSV_COMMENT_COLUMNS = ('comment',)
+
+
+def _local_name(tag):
+    """Element name without the XML namespace"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def iter_xml_tags(path):
+    """
+    Stream tags from a TIA Portal Openness tag table export (SW.Tags.PlcTag)
+    Every finished PlcTag element is removed from its parent right away, so
+    memory stays bounded regardless of the file size.
+    Yields: (name, address, data_type, comment)
+    """
+    stack = []
+    for event, elem in ET.iterparse(path, events=('start', 'end')):
+        if event == 'start':
+            stack.append(elem)
+            continue
+
+        stack.pop()
+        if _local_name(elem.tag) != 'SW.Tags.PlcTag':
+            continue
+
+        name = address = data_type = comment = ''
+        for child in elem.iter():
+            child_name = _local_name(child.tag)
+            if child_name == 'Name' and not name:
+                name = (child.text or '').strip()
+            elif child_name == 'LogicalAddress':
+                address = (child.text or '').strip()
+            elif child_name == 'DataTypeName':
+                data_type = (child.text or '').strip()
+            elif child_name == 'Text' and not comment:
+                # First MultilingualTextItem of the Comment
+                comment = (child.text or '').strip()
+
+        yield name, address, data_type, comment
+
+        elem.clear()
+        if stack:
+            stack[-1].remove(elem)
+
+
+def _find_column(header, names):
+    for i, column in enumerate(header):
+        if column.strip().lower() in names:
+            return i
+    return None
+
+
+def iter_csv_tags(path):
+    """
+    Stream tags from a CSV tag table (Name, Data Type, Logical Address, Comment)
+    The delimiter (',' ';' or tab) is detected from the header line.
+    Yields: (name, address, data_type, comment)
+    """
+    with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+        sample = f.readline()
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+
+        reader = csv.reader(f, dialect)
+        header = next(reader, None)
+        if not header:
+            return
+
+        name_col = _find_column(header, CSV_NAME_COLUMNS)
+        address_col = _find_column(header, CSV_ADDRESS_COLUMNS)
+        type_col = _find_column(header, CSV_TYPE_COLUMNS)
+        comment_col = _find_column(header, CSV_COMMENT_COLUMNS)
+        if name_col is None or address_col is None:
+            raise ValueError("CSV needs 'Name' and 'Logical Address' columns")
+
+        def cell(row, col):
+            return row[col].strip() if col is not None and col < len(row) else ''
+
+        for row in reader:
+            if not row:
+                continue
+            yield cell(row, name_col), cell(row, address_col), cell(row, type_col), cell(row, comment_col)
+
+
+def iter_tag_table(path):
+    """Stream tags of an exported tag table, the format is chosen by extension"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.xml':
+        return iter_xml_tags(path)
+    if extension in ('.csv', '.txt'):
+        return iter_csv_tags(path)
+    raise ValueError(f"Unsupported tag table format: {extension}")
+
+
+def import_tag_table(path, station_tags):
+    """
+    Import an exported tag table into the tags of one station
+    Existing tags with the same name get the new address and type, their
+    value and formats are kept. Nothing is changed if reading the file
+    fails part-way (the tags are merged after the whole file was read).
+
+    Args:
+        path: .xml or .csv export
+        station_tags: {tag_name: Tag} of the station, updated in place
+
+    Returns:
+        (imported: int, skipped: int, errors: [(name, address, reason)])
+    """
+    imported = 0
+    skipped = 0
+    errors = []
+    staged = {}  # name -> new Tag or updated copy of the existing one
+
+    for name, address, data_type, comment in iter_tag_table(path):
+        reason = None
+        if not name:
+            reason = 'empty name'
+        elif not address:
+            reason = 'no absolute address'
+        elif PLCConnection.parse_address(address) is None:
+            reason = 'invalid address'
+
+        if reason:
+            skipped += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append((name, address, reason))
+            continue
+
+        tag = staged.get(name)
+        if tag is None and name in station_tags:
+            existing = station_tags[name]
+            tag = staged[name] = Tag.from_dict(existing.to_dict() if isinstance(existing, Tag) else existing)
+        if tag is None:
+            tag = staged[name] = Tag(address=address, data_type=data_type_from_name(data_type or 'Bool'))
+        else:
+            tag.set_address(address)
+            if data_type:
+                tag.data_type = data_type_from_name(data_type)
+        if comment:
+            tag['comment'] = comment
+        imported += 1
+
+    station_tags.update(staged)
+    return imported, skipped, errors
@@ -0,0 +1,273 @@
+
+from enum import Enum
+
+from snap7_connection import PLCConnection
+
+
+class DataType(Enum):
+    """TIA Portal data types"""
+    BOOL = 'Bool'
+    BYTE = 'Byte'
+    CHAR = 'Char'
+    INT = 'Int'
+    UINT = 'UInt'
+    DINT = 'DInt'
+    UDINT = 'UDInt'
+    WORD = 'Word'
+    DWORD = 'DWord'
+    REAL = 'Real'
+    LREAL = 'LReal'
+    SINT = 'SInt'
+    USINT = 'USInt'
+    DATE = 'Date'
+    TIME = 'Time'
+    TIME_OF_DAY = 'Time Of Day'
+    S5TIME = 'S5Time'
+    TIMER = 'Timer'
+    COUNTER = 'Counter'
+    WCHAR = 'WChar'
+
+    @property
+    def bits(self):
+        """Storage size in bits"""
+        return TYPE_BITS[self]
+
+    @property
+    def is_float(self):
+        return self in (DataType.REAL, DataType.LREAL)
+
+
+TYPE_BITS = {
+    DataType.BOOL: 1,
+    DataType.BYTE: 8, DataType.CHAR: 8, DataType.SINT: 8, DataType.USINT: 8,
+    DataType.INT: 16, DataType.UINT: 16, DataType.WORD: 16, DataType.WCHAR: 16,
+    DataType.DATE: 16, DataType.S5TIME: 16, DataType.TIMER: 16, DataType.COUNTER: 16,
+    DataType.DINT: 32, DataType.UDINT: 32, DataType.DWORD: 32, DataType.REAL: 32,
+    DataType.TIME: 32, DataType.TIME_OF_DAY: 32,
+    DataType.LREAL: 64,
+}
+
+
+class DisplayFormat(Enum):
+    """Display / sending formats of the tag table"""
+    DEC_J = 'DEC/J'
+    DEC = 'DEC'
+    HEX = 'Hex'
+    BCD = 'BCD'
+    OCTAL = 'Octal'
+    BIN = 'Bin'
+    CHARACTER = 'Character'
+    UNICODE_CHARACTER = 'Unicode character'
+    DEC_SEQUENCE = 'DEC_sequence'
+    TIME_OF_DAY = 'TIME_OF_DAY'
+    TIME = 'Time'
+
+
+# Case-insensitive lookups, the JSON file contains 'bool', 'real', ...
+_DATA_TYPES = {member.value.lower(): member for member in DataType}
+_DISPLAY_FORMATS = {member.value.lower(): member for member in DisplayFormat}
+
+
+def data_type_from_name(name):
+    """DataType for a type name, the name itself if it is unknown"""
+    return _DATA_TYPES.get(str(name).strip().lower(), name)
+
+
+def display_format_from_name(name):
+    """DisplayFormat for a format name, the name itself if it is unknown"""
+    return _DISPLAY_FORMATS.get(str(name).strip().lower(), name)
+
+
+def enum_name(value):
+    """Text of an enum member (or the raw text of an unknown name)"""
+    return value.value if isinstance(value, Enum) else value
+
+
+def parse_value(text):
+    """
+    Convert a stored value string to a native value
+    '-' -> None, 'ON'/'OFF' -> bool, '0x1F'/'0b101'/'12' -> int, '1.5' -> float
+    Anything else (e.g. a character) is kept as text.
+    """
+    if text is None or isinstance(text, (bool, int, float)):
+        return text
+    text = str(text).strip()
+    if text == '' or text == '-':
+        return None
+    upper = text.upper()
+    if upper in ('ON', 'TRUE'):
+        return True
+    if upper in ('OFF', 'FALSE'):
+        return False
+    try:
+        if upper.startswith(('0X', '0B', '0O')):
+            return int(text, 0)
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def value_to_text(value):
+    """Inverse of parse_value, used for the JSON file and the table"""
+    if value is None:
+        return '-'
+    if isinstance(value, bool):
+        return 'ON' if value else 'OFF'
+    return str(value)
+
+
+class Tag:
+    """
+    One tag of a station
+
+    The address is compiled once with parse_address and values are kept as
+    native Python values. Item access (tag['value'], tag.get('address'))
+    reads and writes the same strings as the tag_values.json schema, so
+    code written against the old dicts keeps working. The value text it
+    was parsed from is kept until the value changes, so unchanged tags
+    are saved back exactly as they were stored ('0x1F', 'TRUE', '1e3').
+    """
+
+    __slots__ = ('address', 'location', 'db', 'data_type', '_value', 'text',
+                 'display_format', 'sending_format', 'extra')
+
+    FIELDS = ('address', 'db', 'type', 'value', 'display_format', 'sending_format')
+
+    def __init__(self, address='', data_type=DataType.REAL, value=None, db='',
+                 display_format=DisplayFormat.DEC, sending_format=DisplayFormat.DEC, extra=None):
+        self.db = db
+        self.data_type = data_type
+        self.value = value
+        self.display_format = display_format
+        self.sending_format = sending_format
+        self.extra = extra
+        self.set_address(address)
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value = value
+        self.text = None
+
+    def set_text(self, text):
+        """Set the value from its stored/entered text, the text is written back unchanged"""
+        self._value = parse_value(text)
+        self.text = text if isinstance(text, str) else None
+
+    @property
+    def value_text(self):
+        """Value as stored in tag_values.json"""
+        return self.text if self.text is not None else value_to_text(self._value)
+
+    def set_address(self, address):
+        """Store and compile an address"""
+        self.address = str(address)
+        self.location = PLCConnection.parse_address(self.address) if self.address.strip() else None
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a Tag from a tag_values.json entry"""
+        extra = {k: v for k, v in data.items() if k not in cls.FIELDS}
+        tag = cls(
+            address=str(data.get('address', '')),
+            data_type=data_type_from_name(data.get('type', 'real')),
+            db=str(data.get('db', '')),
+            display_format=display_format_from_name(data.get('display_format', 'DEC')),
+            sending_format=display_format_from_name(data.get('sending_format', 'DEC')),
+            extra=extra or None,
+        )
+        tag.set_text(data.get('value', '-'))
+        return tag
+
+    def to_dict(self):
+        """tag_values.json entry for this tag"""
+        data = {
+            'address': self.address,
+            'db': self.db,
+            'type': enum_name(self.data_type),
+            'value': self.value_text,
+            'display_format': enum_name(self.display_format),
+            'sending_format': enum_name(self.sending_format),
+        }
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    @property
+    def type_name(self):
+        return enum_name(self.data_type)
+
+    # dict compatible access with the JSON strings
+
+    def __getitem__(self, key):
+        if key == 'address':
+            return self.address
+        if key == 'db':
+            return self.db
+        if key == 'type':
+            return enum_name(self.data_type)
+        if key == 'value':
+            return self.value_text
+        if key == 'display_format':
+            return enum_name(self.display_format)
+        if key == 'sending_format':
+            return enum_name(self.sending_format)
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key == 'address':
+            self.set_address(value)
+        elif key == 'db':
+            self.db = str(value)
+        elif key == 'type':
+            self.data_type = data_type_from_name(value)
+        elif key == 'value':
+            self.set_text(value)
+        elif key == 'display_format':
+            self.display_format = display_format_from_name(value)
+        elif key == 'sending_format':
+            self.sending_format = display_format_from_name(value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __contains__(self, key):
+        return key in self.FIELDS or bool(self.extra and key in self.extra)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __eq__(self, other):
+        if isinstance(other, Tag):
+            return self.to_dict() == other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Tag({self.address!r}, {self.type_name}, {self.value!r})"
+
+
+def tags_from_dict(station_tags):
+    """{tag_name: dict} -> {tag_name: Tag}"""
+    return {name: Tag.from_dict(data) for name, data in station_tags.items() if isinstance(data, dict)}
+
+
+def tags_to_dict(station_tags):
+    """{tag_name: Tag or dict} -> {tag_name: dict}"""
+    return {name: tag.to_dict() if isinstance(tag, Tag) else tag for name, tag in station_tags.items()}
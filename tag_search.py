@@ -0,0 +1,109 @@
+
+import re
+from bisect import bisect_left, insort
+
+# Name parts after these separators are searchable too ('motor' finds 'conveyor_motor')
+_WORD_SEPARATORS = re.compile(r'[_.\-\s]+')
+
+
+def normalize_name(name):
+    return name.strip().lower()
+
+
+def normalize_address(address):
+    """'%db1.dbx0.0 ' -> 'DB1.DBX0.0'"""
+    return address.strip().upper().lstrip('%').replace(' ', '')
+
+
+def name_keys(name):
+    """Search keys of a tag name: the full name and every word start inside it"""
+    lower = normalize_name(name)
+    keys = {lower}
+    for match in _WORD_SEPARATORS.finditer(lower):
+        rest = lower[match.end():]
+        if rest:
+            keys.add(rest)
+    return keys
+
+
+def _prefix_range(entries, prefix):
+    lo = bisect_left(entries, (prefix,))
+    hi = bisect_left(entries, (prefix + '\uffff',))
+    return entries[lo:hi]
+
+
+class TagSearchIndex:
+    """
+    Sorted-array index over tag names and normalized addresses of one station
+
+    Lookups are a bisect for the prefix range, O(log n + matches). Edits
+    insert or delete single entries, the index is rebuilt only when a
+    station is loaded.
+    """
+
+    def __init__(self):
+        self._names = []      # sorted [(name key, tag_name)]
+        self._addresses = []  # sorted [(normalized address, tag_name)]
+        self._keys = {}       # tag_name -> (name keys, normalized address)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def rebuild(self, station_tags):
+        self._keys.clear()
+        self._names = []
+        self._addresses = []
+        for tag_name, tag in station_tags.items():
+            keys = name_keys(tag_name)
+            address = normalize_address(tag.get('address', ''))
+            self._keys[tag_name] = (keys, address)
+            self._names.extend((key, tag_name) for key in keys)
+            if address:
+                self._addresses.append((address, tag_name))
+        self._names.sort()
+        self._addresses.sort()
+
+    def add(self, tag_name, tag):
+        self.remove(tag_name)
+        keys = name_keys(tag_name)
+        address = normalize_address(tag.get('address', ''))
+        self._keys[tag_name] = (keys, address)
+        for key in keys:
+            insort(self._names, (key, tag_name))
+        if address:
+            insort(self._addresses, (address, tag_name))
+
+    update = add
+
+    def remove(self, tag_name):
+        entry = self._keys.pop(tag_name, None)
+        if entry is None:
+            return
+        keys, address = entry
+        for key in keys:
+            self._delete(self._names, (key, tag_name))
+        if address:
+            self._delete(self._addresses, (address, tag_name))
+
+    def rename(self, old_name, new_name, tag):
+        self.remove(old_name)
+        self.add(new_name, tag)
+
+    @staticmethod
+    def _delete(entries, entry):
+        i = bisect_left(entries, entry)
+        if i < len(entries) and entries[i] == entry:
+            del entries[i]
+
+    def search(self, query):
+        """
+        Tags whose name (or a word in it) or address starts with query
+        Returns: set of tag names, None for an empty query (no filter)
+        """
+        if not query or not query.strip():
+            return None
+        matches = {tag_name for _, tag_name in _prefix_range(self._names, normalize_name(query))}
+        address = normalize_address(query)
+        if address:
+            matches.update(tag_name for _, tag_name in _prefix_range(self._addresses, address))
+        return matches
@@ -0,0 +1,373 @@
+
+import json
+import os
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+from urllib.parse import quote, unquote
+
+from tag_model import Tag
+
+
+def clean_station_tags(tags):
+    """Return only tags that have both a name and an address, as JSON dicts"""
+    cleaned = {}
+    for tag_name, tag_data in tags.items():
+        if isinstance(tag_data, Tag):
+            tag_data = tag_data.to_dict()
+        # Skip tags with empty names or empty addresses
+        if tag_name and tag_name.strip() != '':
+            if isinstance(tag_data, dict):
+                address = tag_data.get('address', '')
+                if address and address.strip() != '':
+                    cleaned[tag_name] = tag_data
+    return cleaned
+
+
+def atomic_write_json(path, data):
+    """
+    Write JSON next to path in a temp file, then rename it over path
+    A crash during the write leaves the previous file untouched.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp_', suffix='.json', dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class TagStorage:
+    """
+    Persistence for tag values with dirty-station tracking
+
+    Single file mode keeps the whole file in tag_values_file. Shard mode
+    writes one file per station into shard_dir, so a flush only rewrites
+    the stations that changed and a station can be read without the others.
+    """
+
+    def __init__(self, tag_values_file='tag_values.json', shard_dir=None):
+        self.tag_values_file = tag_values_file
+        self.shard_dir = shard_dir
+        self.dirty_stations = set()
+        self._saved = {}  # Last read/written (cleaned) tags per station
+        self._loaded = False  # True once every station is in _saved
+
+    def shard_path(self, station):
+        """File of one station in shard mode"""
+        return os.path.join(self.shard_dir, quote(station, safe='') + '.json')
+
+    def _has_shards(self):
+        return bool(self.shard_dir) and os.path.isdir(self.shard_dir)
+
+    def load(self):
+        """
+        Load all stations
+        Returns: {station: {tag_name: tag_data}}
+        """
+        if self._has_shards():
+            tag_values = self._load_shards()
+        else:
+            tag_values = self._load_file()
+            if self.shard_dir:
+                # First run in shard mode: every station needs its own file
+                self.dirty_stations.update(tag_values.keys())
+
+        self._saved = {station: dict(tags) for station, tags in tag_values.items()}
+        self._loaded = True
+        return tag_values
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+
+    def station_names(self):
+        """
+        Names of all stored stations
+        In shard mode only the directory is listed, no tag is parsed. A
+        single file is parsed once and kept for load_station.
+        """
+        if not self._loaded and self._has_shards():
+            return [unquote(file_name[:-len('.json')]) for file_name in self._shard_files()]
+        self._ensure_loaded()
+        return list(self._saved.keys())
+
+    def load_station(self, station):
+        """Tags of one station (shard mode reads only that station's file)"""
+        if station not in self._saved and not self._loaded:
+            if self._has_shards():
+                tags = self._read_json(self.shard_path(station))
+                if tags is not None:
+                    self._saved[station] = tags
+            else:
+                self._ensure_loaded()
+        return dict(self._saved.get(station, {}))
+
+    def _read_json(self, path):
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, IOError):
+            return None
+        return data if isinstance(data, dict) else None
+
+    def _load_file(self):
+        return self._read_json(self.tag_values_file) or {}
+
+    def _shard_files(self):
+        return [file_name for file_name in sorted(os.listdir(self.shard_dir))
+                if file_name.endswith('.json') and not file_name.startswith('.')]
+
+    def _load_shards(self):
+        tag_values = {}
+        for file_name in self._shard_files():
+            tags = self._read_json(os.path.join(self.shard_dir, file_name))
+            if tags is not None:
+                tag_values[unquote(file_name[:-len('.json')])] = tags
+        return tag_values
+
+    def mark_dirty(self, station):
+        """Remember that a station has unsaved changes"""
+        if station:
+            self.dirty_stations.add(station)
+
+    def has_dirty(self):
+        return bool(self.dirty_stations)
+
+    def flush(self, tag_values):
+        """Write only the dirty stations"""
+        if self.dirty_stations:
+            self.save(tag_values, list(self.dirty_stations))
+
+    def save(self, tag_values, stations=None):
+        """
+        Save stations to disk
+        Args:
+            tag_values: {station: {tag_name: tag_data}}, may hold only the loaded stations
+            stations: Stations to write, None means all of tag_values
+        Raises:
+            IOError if the file could not be written (stations stay dirty)
+        """
+        if stations is None:
+            stations = list(tag_values.keys())
+
+        if not self.shard_dir:
+            # The single file is rewritten as a whole, stations never loaded must survive
+            self._ensure_loaded()
+
+        for station in stations:
+            if station in tag_values:
+                self._saved[station] = clean_station_tags(tag_values[station])
+
+        if self.shard_dir:
+            os.makedirs(self.shard_dir, exist_ok=True)
+            for station in stations:
+                if station in self._saved:
+                    atomic_write_json(self.shard_path(station), self._saved[station])
+        else:
+            atomic_write_json(self.tag_values_file, self._saved)
+
+        self.dirty_stations.difference_update(stations)
+
+
+# Columns stored in their own SQLite column, everything else goes to 'extra'
+TAG_COLUMNS = ['address', 'db', 'type', 'value', 'display_format', 'sending_format']
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS stations (
+    name TEXT PRIMARY KEY,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tags (
+    station TEXT NOT NULL,
+    name TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    address TEXT NOT NULL,
+    db TEXT NOT NULL DEFAULT '',
+    type TEXT NOT NULL DEFAULT '',
+    value TEXT NOT NULL DEFAULT '-',
+    display_format TEXT NOT NULL DEFAULT 'DEC',
+    sending_format TEXT NOT NULL DEFAULT 'DEC',
+    extra TEXT,
+    PRIMARY KEY (station, name)
+);
+CREATE INDEX IF NOT EXISTS idx_tags_station ON tags (station, position);
+CREATE INDEX IF NOT EXISTS idx_tags_name ON tags (name);
+CREATE INDEX IF NOT EXISTS idx_tags_address ON tags (address);
+"""
+
+
+class SqliteTagStorage:
+    """
+    SQLite tag database with the same interface as TagStorage
+
+    Stations are loaded lazily: load() only returns the stations already
+    loaded, load_station() reads one station through the station index.
+    """
+
+    def __init__(self, db_file='tag_values.db', migrate_from=None):
+        self.db_file = db_file
+        self.dirty_stations = set()
+        is_new = not os.path.exists(db_file)
+
+        self.conn = sqlite3.connect(db_file)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SQLITE_SCHEMA)
+
+        if is_new and migrate_from and os.path.exists(migrate_from):
+            migrate_json_to_sqlite(migrate_from, self)
+
+    def close(self):
+        self.conn.close()
+
+    @contextmanager
+    def batch(self):
+        """
+        Run several edits in one transaction
+        Everything is rolled back if the block raises.
+        """
+        with self.conn:
+            yield self.conn
+
+    def load(self):
+        """Stations are loaded on demand, see load_station()"""
+        return {}
+
+    def station_names(self):
+        """Names of all stored stations"""
+        rows = self.conn.execute('SELECT name FROM stations ORDER BY position')
+        return [row[0] for row in rows]
+
+    def load_station(self, station):
+        """
+        Load tags of one station
+        Returns: {tag_name: tag_data}
+        """
+        rows = self.conn.execute(
+            'SELECT name, address, db, type, value, display_format, sending_format, extra '
+            'FROM tags WHERE station = ? ORDER BY position', (station,))
+        tags = {}
+        for row in rows:
+            tag_data = dict(zip(TAG_COLUMNS, row[1:7]))
+            if row[7]:
+                tag_data.update(json.loads(row[7]))
+            tags[row[0]] = tag_data
+        return tags
+
+    def find_by_name(self, name):
+        """Returns: [(station, tag_name, address), ...] for a tag name"""
+        rows = self.conn.execute(
+            'SELECT station, name, address FROM tags WHERE name = ?', (name,))
+        return rows.fetchall()
+
+    def find_by_address(self, address):
+        """Returns: [(station, tag_name, address), ...] using an address"""
+        rows = self.conn.execute(
+            'SELECT station, name, address FROM tags WHERE address = ?', (address.strip(),))
+        return rows.fetchall()
+
+    def mark_dirty(self, station):
+        """Remember that a station has unsaved changes"""
+        if station:
+            self.dirty_stations.add(station)
+
+    def has_dirty(self):
+        return bool(self.dirty_stations)
+
+    def flush(self, tag_values):
+        """Write only the dirty stations"""
+        if self.dirty_stations:
+            self.save(tag_values, list(self.dirty_stations))
+
+    def save(self, tag_values, stations=None):
+        """
+        Save stations in a single transaction
+        Args:
+            tag_values: {station: {tag_name: tag_data}}
+            stations: Stations to write, None means every loaded station
+        Raises:
+            IOError if the database could not be written (stations stay dirty)
+        """
+        if stations is None:
+            stations = list(tag_values.keys())
+
+        try:
+            with self.batch() as conn:
+                for station in stations:
+                    if station not in tag_values:
+                        # Never loaded, nothing to overwrite
+                        continue
+                    self._write_station(conn, station, clean_station_tags(tag_values[station]))
+        except sqlite3.Error as e:
+            raise IOError(str(e))
+
+        self.dirty_stations.difference_update(stations)
+
+    def _write_station(self, conn, station, tags):
+        conn.execute(
+            'INSERT OR IGNORE INTO stations (name, position) '
+            'VALUES (?, (SELECT COALESCE(MAX(position), -1) + 1 FROM stations))', (station,))
+        conn.execute('DELETE FROM tags WHERE station = ?', (station,))
+        rows = []
+        for position, (tag_name, tag_data) in enumerate(tags.items()):
+            extra = {k: v for k, v in tag_data.items() if k not in TAG_COLUMNS}
+            rows.append((
+                station, tag_name, position,
+                str(tag_data.get('address', '')).strip(),
+                str(tag_data.get('db', '')),
+                str(tag_data.get('type', '')),
+                str(tag_data.get('value', '-')),
+                str(tag_data.get('display_format', 'DEC')),
+                str(tag_data.get('sending_format', 'DEC')),
+                json.dumps(extra) if extra else None,
+            ))
+        conn.executemany(
+            'INSERT INTO tags (station, name, position, address, db, type, value, '
+            'display_format, sending_format, extra) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+
+def migrate_json_to_sqlite(json_file, storage):
+    """
+    Copy every station of a tag_values.json file into a SqliteTagStorage
+    Args:
+        json_file: Path of the JSON file
+        storage: SqliteTagStorage or path of the database file
+    Returns:
+        Number of migrated tags
+    """
+    if not isinstance(storage, SqliteTagStorage):
+        storage = SqliteTagStorage(storage)
+
+    tag_values = TagStorage(json_file).load()
+    storage.save(tag_values)
+    return sum(len(clean_station_tags(tags)) for tags in tag_values.values())
+
+
+def create_tag_storage(config, tag_values_file='tag_values.json'):
+    """
+    Pick the storage backend from plc_config.json
+    'tag_storage': 'json' (default) or 'sqlite'
+    """
+    if config.get('tag_storage') == 'sqlite':
+        return SqliteTagStorage(config.get('tag_database', 'tag_values.db'), migrate_from=tag_values_file)
+    return TagStorage(tag_values_file, config.get('tag_shard_dir'))
+
+
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) == 3:
+        count = migrate_json_to_sqlite(sys.argv[1], sys.argv[2])
+        print(f"Migrated {count} tags from {sys.argv[1]} to {sys.argv[2]}")
+    else:
+        print("Usage: python tag_storage.py tag_values.json tag_values.db")
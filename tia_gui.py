@@ -2,13 +2,25 @@ import sys
 import json
 import os
 import subprocess
+import time
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
-                             QHBoxLayout, QLabel, QPushButton, QFrame, QScrollArea, QCheckBox, QProgressBar, QTableWidget, QTableWidgetItem, QMessageBox, QDialog, QComboBox, QStyledItemDelegate, QTextEdit)
-from PyQt5.QtCore import Qt, QTimer
+                             QHBoxLayout, QLabel, QPushButton, QFrame, QScrollArea, QCheckBox, QProgressBar, QTableWidget, QTableWidgetItem, QMessageBox, QDialog, QComboBox, QStyledItemDelegate, QTextEdit, QLineEdit, QSplitter)
+from PyQt5.QtCore import Qt, QTimer, QThread, QObject, QEvent, pyqtSignal
 from PyQt5.QtGui import QPixmap, QPainter, QColor, QFont
 
 # PLC Controller import (snap7 wrapper)
 from plc_controller import PLCController
+from snap7_connection import split_host_port
+from tag_storage import create_tag_storage
+from tag_model import Tag, parse_value, tags_from_dict
+from tag_import import import_tag_table
+from address_index import AddressIndex
+from tag_search import TagSearchIndex
+from value_format import format_value, format_values
+from historian import Historian, NUMPY_AVAILABLE
+from calc_tags import CalculatedTags, is_calculated
+from diagnostics_panel import DiagnosticsPanel
+from trace_spans import TRACER, span
 
 # Data Types
 TIA_DATA_TYPES = ['Bool', 'Byte', 'Char', 'Int', 'UInt', 'DInt', 'UDInt', 'Word', 
@@ -49,6 +61,63 @@ class DisplayFormatDelegate(QStyledItemDelegate):
     def setModelData(self, editor, model, index):
         model.setData(index, editor.currentText(), Qt.EditRole)
 
+class ExportWorker(QThread):
+    """Runs an export job (callable(progress, cancel) -> rows) outside the GUI thread"""
+    progress = pyqtSignal(int, int)  # percent, rows written
+    done = pyqtSignal(bool, str)
+    
+    def __init__(self, job, parent=None):
+        super().__init__(parent)
+        self.job = job
+        self.cancelled = False
+    
+    def cancel(self):
+        self.cancelled = True
+    
+    def report(self, fraction, rows):
+        self.progress.emit(int(fraction * 100), rows)
+    
+    def run(self):
+        from history_export import ExportCancelled
+        try:
+            with span('export', 'worker'):
+                rows = self.job(self.report, lambda: self.cancelled)
+            self.done.emit(True, f'{rows} rows written')
+        except ExportCancelled:
+            self.done.emit(False, 'Export cancelled')
+        except Exception as e:
+            # Any failure (pyarrow, NumPy, I/O) must still close the progress dialog
+            self.done.emit(False, str(e) or type(e).__name__)
+
+class CaptureWorker(QThread):
+    """Runs a TriggeredCapture outside the GUI thread"""
+    done = pyqtSignal(object)  # Capture or None
+    
+    def __init__(self, capture, timeout_s=None, parent=None):
+        super().__init__(parent)
+        self.capture = capture
+        self.timeout_s = timeout_s
+    
+    def run(self):
+        with span('capture', 'worker', tags=len(self.capture.tag_names)):
+            capture = self.capture.run(self.timeout_s)
+        self.done.emit(capture)
+
+
+class PaintTracer(QObject):
+    """Event filter on a table viewport: runs its paint events inside a trace span"""
+    
+    def __init__(self, table):
+        super().__init__(table)
+        self.table = table
+    
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and TRACER.enabled:
+            with span('tag_table.paint', 'gui'):
+                self.table.viewportEvent(event)
+            return True
+        return False
+
 class TIAPortalGUI(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -69,9 +138,56 @@ class TIAPortalGUI(QMainWindow):
         self.plc_read_timer.setInterval(1000)
         
         self.load_config()
-        self.load_tag_values()
+        # Extra snap7 stations, e.g. the simulator farm ("Farm001_127.0.0.1:10201")
+        self.snap7_stations += [name for name in self.plc_config.get('snap7_stations', []) if name not in self.snap7_stations]
+        
+        # Every polled value goes into fixed-size ring buffers (needs NumPy)
+        self.historian = None
+        if NUMPY_AVAILABLE:
+            # Optional on-disk history behind the ring buffers
+            store = None
+            if self.plc_config.get('history_dir'):
+                from historian_storage import HistorianStore
+                store = HistorianStore(self.plc_config['history_dir'])
+            self.historian = Historian(
+                self.plc_config.get('history_retention_s', 3600),
+                self.plc_read_timer.interval() / 1000.0,
+                store,
+                self.plc_config.get('history_rollup_tiers')
+            )
+        
+        # Edits are collected and written in one go after a quiet period
+        self.tag_storage = create_tag_storage(self.plc_config, self.tag_values_file)
+        self.save_timer = QTimer()
+        self.save_timer.setSingleShot(True)
+        self.save_timer.setInterval(self.plc_config.get('save_debounce_ms', 500))
+        self.save_timer.timeout.connect(self.flush_tag_values)
+        
+        self.stored_stations = []
+        self.address_indexes = {}  # Per-station overlap index, also used for block reads
+        self.search_indexes = {}   # Per-station name/address index for the filter box
+        self.alarm_engines = {}    # Per-station compiled alarm rules, evaluated every scan
+        self.calc_tags = {}        # Per-station calculated tags ('=' addresses)
+        self._row_by_name = {}
+        self._filter_matches = None  # Tag names shown by the filter, None = all
         self.initUI()
         self.apply_theme()
+        if self.plc_controller.backend_error:
+            self.add_log('System', f"⚠ {self.plc_controller.backend_error}")
+        
+        # Optional metrics export (node_exporter textfile and/or local HTTP port)
+        self.metrics_exporter = self.plc_controller.start_metrics_exporter()
+        if self.metrics_exporter:
+            self.metrics_timer = QTimer()
+            self.metrics_timer.setInterval(int(self.metrics_exporter.interval_s * 1000))
+            self.metrics_timer.timeout.connect(self.update_metrics_gauges)
+            self.metrics_timer.start()
+            self.update_metrics_gauges()
+        elif self.plc_controller.config.get('metrics_textfile') or self.plc_controller.config.get('metrics_http_port'):
+            self.add_log('System', "⚠ Metrics export could not be started (port in use?)")
+        
+        # Window first, station metadata right after; tags load on first selection
+        QTimer.singleShot(0, self.load_tag_values)
     
     def apply_theme(self):
         """Modern Industrial Theme with Green Accent"""
@@ -152,6 +268,8 @@ class TIAPortalGUI(QMainWindow):
             'Module09_192.168.0.90',
             'PLCSim Station'
         ])
+        # Configured snap7 stations (e.g. the simulator farm) are selectable too
+        self.add_station_items(self.snap7_stations)
         self.station_combo.currentIndexChanged.connect(self.on_station_changed)
         left_layout.addWidget(self.station_combo)
         
@@ -429,6 +547,98 @@ class TIAPortalGUI(QMainWindow):
         save_tags_btn.clicked.connect(self.save_tag_changes)
         table_toolbar.addWidget(save_tags_btn)
         
+        import_tags_btn = QPushButton('📥 Import Tags')
+        import_tags_btn.setStyleSheet("""
+            QPushButton {
+                background-color: #8e44ad;
+                color: white;
+                border: none;
+                padding: 8px 16px;
+                border-radius: 4px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: #7d3c98;
+            }
+        """)
+        import_tags_btn.clicked.connect(self.import_tags)
+        table_toolbar.addWidget(import_tags_btn)
+        
+        export_btn = QPushButton('📤 Export')
+        export_btn.setStyleSheet("""
+            QPushButton {
+                background-color: #d35400;
+                color: white;
+                border: none;
+                padding: 8px 16px;
+                border-radius: 4px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: #ba4a00;
+            }
+        """)
+        export_btn.clicked.connect(self.export_data)
+        export_btn.setEnabled(NUMPY_AVAILABLE)  # history_export needs NumPy
+        table_toolbar.addWidget(export_btn)
+        
+        self.capture_btn = QPushButton('⚡ Capture')
+        self.capture_btn.setStyleSheet("""
+            QPushButton {
+                background-color: #c0392b;
+                color: white;
+                border: none;
+                padding: 8px 16px;
+                border-radius: 4px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: #a93226;
+            }
+        """)
+        self.capture_btn.setToolTip('Fast capture of the selected tags around a trigger edge')
+        self.capture_btn.clicked.connect(self.toggle_capture)
+        table_toolbar.addWidget(self.capture_btn)
+        self.capture_worker = None
+        
+        self.trend_btn = QPushButton('📈 Trend')
+        self.trend_btn.setStyleSheet("""
+            QPushButton {
+                background-color: #16a085;
+                color: white;
+                border: none;
+                padding: 8px 16px;
+                border-radius: 4px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: #138d75;
+            }
+        """)
+        self.trend_btn.setToolTip('Add/remove the selected tags in the trend chart')
+        self.trend_btn.clicked.connect(self.toggle_trend_tags)
+        self.trend_btn.setEnabled(self.historian is not None)
+        table_toolbar.addWidget(self.trend_btn)
+        
+        diagnostics_btn = QPushButton('🩺 Diagnostics')
+        diagnostics_btn.setStyleSheet("""
+            QPushButton {
+                background-color: #34495e;
+                color: white;
+                border: none;
+                padding: 8px 16px;
+                border-radius: 4px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: #2c3e50;
+            }
+        """)
+        diagnostics_btn.setToolTip('S7 request latency, errors and polling cycle times')
+        diagnostics_btn.clicked.connect(self.show_diagnostics)
+        table_toolbar.addWidget(diagnostics_btn)
+        self.diagnostics_panel = None
+        
         info_btn = QPushButton('ℹ️')
         info_btn.setStyleSheet("""
             QPushButton {
@@ -449,6 +659,24 @@ class TIAPortalGUI(QMainWindow):
         table_toolbar.addWidget(info_btn)
         
         table_toolbar.addStretch()
+        
+        self.tag_filter_edit = QLineEdit()
+        self.tag_filter_edit.setPlaceholderText('🔍 Filter by name or address...')
+        self.tag_filter_edit.setClearButtonEnabled(True)
+        self.tag_filter_edit.setFixedWidth(220)
+        self.tag_filter_edit.setStyleSheet("""
+            QLineEdit {
+                border: 2px solid #e0e0e0;
+                border-radius: 4px;
+                padding: 5px;
+            }
+            QLineEdit:focus {
+                border: 2px solid #27ae60;
+            }
+        """)
+        self.tag_filter_edit.textChanged.connect(self.filter_tag_table)
+        table_toolbar.addWidget(self.tag_filter_edit)
+        
         right_layout.addLayout(table_toolbar)
         
         self.tag_table = QTableWidget()
@@ -494,7 +722,19 @@ class TIAPortalGUI(QMainWindow):
         self.tag_table.setMinimumHeight(200)
         self.tag_table.setMaximumHeight(900)
         
-        right_layout.addWidget(self.tag_table)
+        # Trend chart next to the tag table (needs the historian)
+        self.trend_widget = None
+        if self.historian:
+            from trend_widget import TrendWidget
+            self.trend_widget = TrendWidget(self.historian)
+            table_splitter = QSplitter(Qt.Horizontal)
+            table_splitter.addWidget(self.tag_table)
+            table_splitter.addWidget(self.trend_widget)
+            table_splitter.setStretchFactor(0, 3)
+            table_splitter.setStretchFactor(1, 2)
+            right_layout.addWidget(table_splitter)
+        else:
+            right_layout.addWidget(self.tag_table)
         
         error_log_label = QLabel('Activity Log')
         error_log_label.setFont(QFont('Arial', 11, QFont.Bold))
@@ -529,29 +769,30 @@ class TIAPortalGUI(QMainWindow):
     
     def add_log(self, station, message):
         """Add log message to shared activity log"""
-        from datetime import datetime
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        # Format: [HH:MM:SS] [StationName] message
-        station_name = station.split('_')[0] if '_' in station else station  # Extract module name
-        log_entry = f"[{timestamp}] [{station_name}] {message}"
-        
-        # Append to shared activity log
-        if self.activity_log:
-            self.activity_log += f"\n{log_entry}"
-        else:
-            self.activity_log = log_entry
-        
-        # Keep only last 100 lines
-        lines = self.activity_log.split('\n')
-        if len(lines) > 100:
-            self.activity_log = '\n'.join(lines[-100:])
-        
-        # Always update display (shared log is always shown)
-        self.error_log.setPlainText(self.activity_log)
-        # Auto-scroll to bottom
-        self.error_log.verticalScrollBar().setValue(
-            self.error_log.verticalScrollBar().maximum()
-        )
+        with span('add_log', 'gui'):
+            from datetime import datetime
+            timestamp = datetime.now().strftime("%H:%M:%S")
+            # Format: [HH:MM:SS] [StationName] message
+            station_name = station.split('_')[0] if '_' in station else station  # Extract module name
+            log_entry = f"[{timestamp}] [{station_name}] {message}"
+            
+            # Append to shared activity log
+            if self.activity_log:
+                self.activity_log += f"\n{log_entry}"
+            else:
+                self.activity_log = log_entry
+            
+            # Keep only last 100 lines
+            lines = self.activity_log.split('\n')
+            if len(lines) > 100:
+                self.activity_log = '\n'.join(lines[-100:])
+            
+            # Always update display (shared log is always shown)
+            self.error_log.setPlainText(self.activity_log)
+            # Auto-scroll to bottom
+            self.error_log.verticalScrollBar().setValue(
+                self.error_log.verticalScrollBar().maximum()
+            )
     
     def check_plc_connection(self):
         """Check PLC connection via ping"""
@@ -569,9 +810,18 @@ class TIAPortalGUI(QMainWindow):
         
         self.add_log(self.current_selected_station, f"Checking connection to {ip}...")
         
+        if self.plc_controller.is_simulated():
+            # Nothing to ping, the PLC runs in memory
+            self.plc_switch_enabled = True
+            self.plc_connection_switch.setEnabled(True)
+            self.plc_connection_status_label.setText('✓ Simulated PLC')
+            self.plc_connection_status_label.setStyleSheet("color: #27ae60; font-size: 8pt; font-weight: bold;")
+            self.add_log(self.current_selected_station, "✓ Using the in-memory PLC backend")
+            return
+        
         try:
             result = subprocess.run(
-                ['ping', '-n', '1', '-w', '1000', ip],
+                ['ping', '-n', '1', '-w', '1000', split_host_port(ip)[0]],
                 capture_output=True,
                 text=True,
                 timeout=2
@@ -671,6 +921,8 @@ class TIAPortalGUI(QMainWindow):
             station = self.station_combo.currentText()
             self.load_station_tags(station)
             self.current_selected_station = station
+            # S7 traffic and connects from now on are counted for this station
+            self.plc_controller.plc.set_station(station)
             
             # Show IP edit button only when PLCSim Station is selected
             if station == 'PLCSim Station':
@@ -710,19 +962,19 @@ class TIAPortalGUI(QMainWindow):
                 self.tag_values[station] = {}
             
             if 'canbus_manager' not in self.tag_values[station]:
-                self.tag_values[station]['canbus_manager'] = {
+                self.tag_values[station]['canbus_manager'] = Tag.from_dict({
                     'address': 'M0.0',
                     'db': '',
                     'type': 'bool',
                     'value': 'ON',
                     'display_format': 'DEC',
                     'sending_format': 'DEC'
-                }
+                })
             else:
                 self.tag_values[station]['canbus_manager']['value'] = 'ON'
             
             # Save to JSON
-            self.save_tag_values()
+            self.schedule_save(station)
             
             # Reload tags to show canbus_manager
             self.load_station_tags(station)
@@ -766,7 +1018,7 @@ class TIAPortalGUI(QMainWindow):
             if station and station in self.tag_values:
                 if 'canbus_manager' in self.tag_values[station]:
                     self.tag_values[station]['canbus_manager']['value'] = 'OFF'
-                    self.save_tag_values()
+                    self.schedule_save(station)
             
             # FOURTH: Mark this station as disconnected
             if station:
@@ -837,23 +1089,134 @@ class TIAPortalGUI(QMainWindow):
         if not self.plc_controller.is_connected():
             return
         
+        cycle_started = time.perf_counter_ns()
+        plc = self.plc_controller.plc
+        if plc.station != self.current_selected_station:
+            plc.set_station(self.current_selected_station)
+        
+        station_tags = self.tag_values.get(self.current_selected_station, {})
+        scan_time = time.time()
+        scan_values = {}
+        
+        # Indexed tags are read with one request per merged address range
+        index = self.address_indexes.get(self.current_selected_station)
+        with span('read_ranges', 'scan'):
+            block_values = self.plc_controller.read_ranges(index.read_ranges()) if index else {}
+        
         for row in range(self.tag_table.rowCount()):
-            address_item = self.tag_table.item(row, 1)
-            type_item = self.tag_table.item(row, 2)
             plc_value_item = self.tag_table.item(row, 6)
+            name_item = self.tag_table.item(row, 0)
+            tag_name = name_item.text().strip() if name_item else ''
+            tag = station_tags.get(tag_name)
+            
+            if tag is not None and is_calculated(tag):
+                continue  # Computed after the scan
             
-            if not address_item or not address_item.text().strip():
+            if tag_name in block_values:
+                value = block_values[tag_name]
+                if value is not None:
+                    scan_values[tag_name] = value
+                    if plc_value_item:
+                        self.tag_table.blockSignals(True)
+                        plc_value_item.setText(str(value))
+                        self.tag_table.blockSignals(False)
                 continue
             
-            address = address_item.text().strip()
-            data_type = type_item.text() if type_item else 'Byte'
+            if tag is not None and tag.location:
+                # Address and type are already compiled in the Tag record
+                address = tag.location
+                data_type = tag.data_type
+            else:
+                address_item = self.tag_table.item(row, 1)
+                type_item = self.tag_table.item(row, 2)
+                if not address_item or not address_item.text().strip():
+                    continue
+                address = address_item.text().strip()
+                data_type = type_item.text() if type_item else 'Byte'
             
             success, value, msg = self.plc_controller.read_tag(address, data_type)
             
+            if success and tag_name:
+                scan_values[tag_name] = value
+            
             if success and plc_value_item:
                 self.tag_table.blockSignals(True)
                 plc_value_item.setText(str(value))
                 self.tag_table.blockSignals(False)
+        
+        calcs = self.calc_tags.get(self.current_selected_station)
+        if calcs and scan_values:
+            with span('calc_tags', 'scan'):
+                calc_values = calcs.evaluate(scan_values)
+            self.tag_table.blockSignals(True)
+            for tag_name, value in calc_values.items():
+                row = self._row_by_name.get(tag_name)
+                plc_value_item = self.tag_table.item(row, 6) if row is not None else None
+                if plc_value_item:
+                    plc_value_item.setText(f'{value:g}' if isinstance(value, float) else str(value))
+            self.tag_table.blockSignals(False)
+            scan_values.update(calc_values)
+        
+        engine = self.alarm_engines.get(self.current_selected_station)
+        if engine is not None and scan_values:
+            with span('alarms', 'scan'):
+                engine.evaluate(scan_values, scan_time)
+        
+        if self.historian and scan_values:
+            with span('historian', 'scan'):
+                self.historian.record_scan(self.current_selected_station, scan_values, scan_time)
+                if self.trend_widget and self.trend_widget.series:
+                    self.trend_widget.refresh(scan_time)
+        
+        elapsed = time.perf_counter_ns() - cycle_started
+        plc.metrics.record_cycle(self.current_selected_station, elapsed / 1e9, self.plc_read_timer.interval() / 1000.0)
+        if TRACER.enabled:
+            TRACER.complete('read_plc_tags', cycle_started, elapsed,
+                            {'station': self.current_selected_station, 'values': len(scan_values)}, 'scan')
+    
+    def update_metrics_gauges(self):
+        """Hand the GUI side gauges (tag counts, queue depths) to the metrics exporter"""
+        stations = list(self.tag_values.items())
+        pending = self.historian.store.pending_count if self.historian and self.historian.store else 0
+        self.metrics_exporter.set_gauges({
+            'plc_station_tags': ('Tags of the loaded stations.',
+                                 [({'station': station}, len(tags)) for station, tags in stations]),
+            'plc_calculated_tags': ('Compiled calculated tags per station.',
+                                    [({'station': station}, len(calcs)) for station, calcs in self.calc_tags.items()]),
+            'plc_active_alarms': ('Raised alarms per station.',
+                                  [({'station': station}, len(engine.active_alarms()))
+                                   for station, engine in self.alarm_engines.items()]),
+            'plc_connected': ('1 while the PLC connection is up.',
+                              [({'station': self.plc_controller.plc.station}, self.plc_controller.is_connected())]),
+            'plc_unsaved_stations': ('Stations waiting for the debounced save.',
+                                     [({}, len(self.tag_storage.dirty_stations))]),
+            'plc_historian_pending_samples': ('Samples buffered before the next history flush.', [({}, pending)]),
+        })
+    
+    def on_tracing_changed(self, enabled):
+        """Time the tag table repaints only while tracing"""
+        if enabled:
+            self.paint_tracer = PaintTracer(self.tag_table)
+            self.tag_table.viewport().installEventFilter(self.paint_tracer)
+        elif getattr(self, 'paint_tracer', None) is not None:
+            self.tag_table.viewport().removeEventFilter(self.paint_tracer)
+            self.paint_tracer.deleteLater()
+            self.paint_tracer = None
+    
+    def show_diagnostics(self):
+        """Open (or raise) the S7 diagnostics panel"""
+        if self.diagnostics_panel is None:
+            self.diagnostics_panel = DiagnosticsPanel(self.plc_controller.plc.metrics, self,
+                                                      self.plc_config.get('trace_buffer_events'),
+                                                      self.plc_controller.plc)
+            self.diagnostics_panel.tracing_changed.connect(self.on_tracing_changed)
+        self.diagnostics_panel.show()
+        self.diagnostics_panel.raise_()
+    
+    def on_alarm_event(self, event):
+        """Alarm engine subscriber: alarm transitions go to the activity log"""
+        prefix = '🔔' if event.state == 'RAISED' else '✓'
+        self.add_log(event.station, f"{prefix} {event}")
     
     def update_status_display(self, station):
         """Update PLC and CAN Bus status display for current station"""
@@ -918,11 +1281,16 @@ class TIAPortalGUI(QMainWindow):
             """)
     
     def load_station_tags(self, station):
+        with span('load_station_tags', 'gui', station=station):
+            self._load_station_tags(station)
+    
+    def _load_station_tags(self, station):
         if not station or station == 'Select...':
             return
         
         self.tag_table.setRowCount(0)
         self._old_tag_names.clear()
+        self.ensure_station_loaded(station)
         
         all_tags = {}
         
@@ -931,7 +1299,7 @@ class TIAPortalGUI(QMainWindow):
                 if not tag_name or not tag_name.strip():
                     continue
                     
-                if isinstance(stored_tag, dict):
+                if isinstance(stored_tag, Tag):
                     all_tags[tag_name] = {
                         'address': str(stored_tag.get('address', '')),
                         'db': str(stored_tag.get('db', '')),
@@ -943,6 +1311,16 @@ class TIAPortalGUI(QMainWindow):
         
         self.tag_table.setRowCount(len(all_tags))
         
+        # Value column formatted in one pass per (display format, type)
+        station_tags = self.tag_values.get(station, {})
+        columns = {}
+        for tag_name, tag_data in all_tags.items():
+            columns.setdefault((tag_data['display_format'], station_tags[tag_name].data_type), []).append(tag_name)
+        formatted_values = {}
+        for (display_fmt, data_type), names in columns.items():
+            values = [station_tags[tag_name].value for tag_name in names]
+            formatted_values.update(zip(names, format_values(values, display_fmt, data_type)))
+        
         row = 0
         for tag_name, tag_data in all_tags.items():
             self._old_tag_names[row] = tag_name
@@ -960,8 +1338,7 @@ class TIAPortalGUI(QMainWindow):
             self.tag_table.setItem(row, 2, type_item)
             
             display_fmt = tag_data.get('display_format', 'DEC')
-            formatted_value = self.format_value(tag_data['value'], display_fmt)
-            value_item = QTableWidgetItem(formatted_value)
+            value_item = QTableWidgetItem(formatted_values[tag_name])
             value_item.setFont(QFont('Arial', 9))
             self.tag_table.setItem(row, 3, value_item)
             
@@ -1029,16 +1406,106 @@ class TIAPortalGUI(QMainWindow):
             row += 1
         
         self.tag_table.resizeRowsToContents()
+        
+        self._row_by_name = {tag_name: row for row, tag_name in self._old_tag_names.items()}
+        self.search_indexes.setdefault(station, TagSearchIndex()).rebuild(self.tag_values.get(station, {}))
+        self._filter_matches = None
+        self.filter_tag_table(self.tag_filter_edit.text())
+        
+        self.compile_calc_tags(station)
+        
+        # Alarm rules ('alarms' entries of the tags), recompiled only when they changed
+        if not NUMPY_AVAILABLE:
+            if any(tag.get('alarms') for tag in self.tag_values.get(station, {}).values()):
+                self.add_log(station, "⚠ Alarm rules ignored - NumPy is not installed")
+        else:
+            engine = self.alarm_engines.get(station)
+            if engine is None:
+                from alarm_engine import AlarmEngine
+                engine = self.alarm_engines[station] = AlarmEngine(station)
+                engine.subscribe(self.on_alarm_event)
+            engine.compile(self.tag_values.get(station, {}))
+            for error in engine.errors:
+                self.add_log(station, f"⚠ Alarm rule ignored - {error}")
+        
+        # Index addresses and mark overlapping tags
+        index = self.address_indexes.setdefault(station, AddressIndex())
+        conflicts = index.rebuild(self.tag_values.get(station, {}))
+        if conflicts:
+            for row in range(self.tag_table.rowCount()):
+                self.mark_address_conflicts(row, index.conflicts(self._old_tag_names.get(row)))
+            first, second = conflicts[0]
+            self.add_log(station, f"⚠ {len(conflicts)} overlapping address(es), e.g. '{first}' / '{second}'")
     
-    def load_tag_values(self):
-        if os.path.exists(self.tag_values_file):
-            try:
-                with open(self.tag_values_file, 'r') as f:
-                    self.tag_values = json.load(f)
-            except (json.JSONDecodeError, IOError):
-                self.tag_values = {}
+    def mark_address_conflicts(self, row, others):
+        """Highlight the Address cell of a row that overlaps other tags"""
+        address_item = self.tag_table.item(row, 1)
+        if not address_item:
+            return
+        self.tag_table.blockSignals(True)
+        if others:
+            address_item.setBackground(QColor('#fadbd8'))
+            address_item.setToolTip('Overlaps: ' + ', '.join(others))
         else:
-            self.tag_values = {}
+            address_item.setBackground(QColor('#ffffff'))
+            address_item.setToolTip('')
+        self.tag_table.blockSignals(False)
+    
+    def reindex_tag(self, row, tag_name):
+        """Update the search and address indexes after an edit and report overlaps"""
+        station = self.current_selected_station
+        index = self.address_indexes.setdefault(station, AddressIndex())
+        search_index = self.search_indexes.setdefault(station, TagSearchIndex())
+        tag = self.tag_values[station].get(tag_name)
+        previous = index.conflicts(tag_name)
+        if tag is None:
+            index.remove(tag_name)
+            search_index.remove(tag_name)
+            self.refresh_conflict_marks(index, previous)
+            return
+        search_index.update(tag_name, tag)
+        self._row_by_name[tag_name] = row
+        if is_calculated(tag) or self.calc_tags.get(station):
+            self.compile_calc_tags(station)
+        others = index.update(tag_name, tag)
+        self.mark_address_conflicts(row, others)
+        # Partners it overlaps now, and the ones it no longer overlaps
+        self.refresh_conflict_marks(index, set(previous) | set(others))
+        if others:
+            self.add_log(station, f"⚠ '{tag_name}' ({tag['address']}) overlaps {', '.join(others)}")
+    
+    def refresh_conflict_marks(self, index, tag_names):
+        """Re-highlight the rows of tags whose overlaps may have changed"""
+        for name in tag_names:
+            row = self._row_by_name.get(name)
+            if row is not None:
+                self.mark_address_conflicts(row, index.conflicts(name))
+    
+    def compile_calc_tags(self, station):
+        """(Re)compile the calculated tags of a station and log invalid expressions"""
+        calcs = self.calc_tags.setdefault(station, CalculatedTags())
+        calcs.compile(self.tag_values.get(station, {}))
+        for error in calcs.errors:
+            self.add_log(station, f"⚠ Calculated tag ignored - {error}")
+    
+    def load_tag_values(self):
+        """List the stored stations, tags are read by ensure_station_loaded"""
+        self.stored_stations = self.tag_storage.station_names()
+        self.add_station_items(self.stored_stations)
+    
+    def add_station_items(self, stations):
+        """Append stations missing from the station list"""
+        known = {self.station_combo.itemText(i) for i in range(self.station_combo.count())}
+        for station in stations:
+            if station not in known:
+                self.station_combo.addItem(station)
+                known.add(station)
+    
+    def ensure_station_loaded(self, station):
+        """Fetch a station's tags from storage on first use"""
+        if station not in self.tag_values:
+            self.tag_values[station] = tags_from_dict(self.tag_storage.load_station(station))
+            self.plc_controller.register_station_tags(station, self.tag_values[station])
     
     def load_config(self):
         """Load PLC configuration (Simulator IP, etc.)"""
@@ -1063,29 +1530,32 @@ class TIAPortalGUI(QMainWindow):
             pass
     
     def save_tag_values(self):
+        """Write all stations to disk immediately"""
+        self.save_timer.stop()
         try:
-            # Clean up empty tags before saving
-            cleaned_tags = {}
-            for station, tags in self.tag_values.items():
-                cleaned_tags[station] = {}
-                for tag_name, tag_data in tags.items():
-                    # Skip tags with empty names or empty addresses
-                    if tag_name and tag_name.strip() != '':
-                        if isinstance(tag_data, dict):
-                            address = tag_data.get('address', '')
-                            if address and address.strip() != '':
-                                cleaned_tags[station][tag_name] = tag_data
-            
-            with open(self.tag_values_file, 'w') as f:
-                json.dump(cleaned_tags, f, indent=4)
+            with span('save_tag_values', 'storage'):
+                self.tag_storage.save(self.tag_values)
         except IOError:
             pass
     
+    def schedule_save(self, station):
+        """Mark station as changed and (re)start the debounced save"""
+        self.tag_storage.mark_dirty(station)
+        self.save_timer.start()
+    
+    def flush_tag_values(self):
+        """Write only the stations changed since the last save"""
+        try:
+            with span('flush_tag_values', 'storage', stations=len(self.tag_storage.dirty_stations)):
+                self.tag_storage.flush(self.tag_values)
+        except IOError:
+            # Stations stay dirty, retry with the next edit
+            pass
+    
     def update_tag_value(self, station, tag_name, value):
-        if station not in self.tag_values:
-            self.tag_values[station] = {}
-        self.tag_values[station][tag_name] = value
-        self.save_tag_values()
+        self.ensure_station_loaded(station)
+        self.tag_values[station][tag_name] = Tag.from_dict(value) if isinstance(value, dict) else value
+        self.schedule_save(station)
     
     def on_tag_value_changed(self, item):
         row = self.tag_table.row(item)
@@ -1111,33 +1581,37 @@ class TIAPortalGUI(QMainWindow):
         if col == 0 and old_tag_name and old_tag_name != tag_name:
             if old_tag_name in self.tag_values[self.current_selected_station]:
                 self.tag_values[self.current_selected_station][tag_name] = self.tag_values[self.current_selected_station].pop(old_tag_name)
+                index = self.address_indexes.get(self.current_selected_station)
+                if index:
+                    partners = index.conflicts(old_tag_name)
+                    index.rename(old_tag_name, tag_name, self.tag_values[self.current_selected_station][tag_name])
+                    self.refresh_conflict_marks(index, partners)
+                search_index = self.search_indexes.get(self.current_selected_station)
+                if search_index:
+                    search_index.rename(old_tag_name, tag_name, self.tag_values[self.current_selected_station][tag_name])
+                engine = self.alarm_engines.get(self.current_selected_station)
+                if engine:
+                    engine.rename(old_tag_name, tag_name)
+                if self.calc_tags.get(self.current_selected_station) or \
+                        is_calculated(self.tag_values[self.current_selected_station][tag_name]):
+                    # Expressions using the old name are reported as invalid
+                    self.compile_calc_tags(self.current_selected_station)
             else:
-                self.tag_values[self.current_selected_station][tag_name] = {
-                    'db': '',
-                    'address': '',
-                    'type': 'real',
-                    'value': '-',
-                    'display_format': 'DEC',
-                    'sending_format': 'DEC'
-                }
+                self.tag_values[self.current_selected_station][tag_name] = Tag()
             self._old_tag_names[row] = tag_name
+            self._row_by_name.pop(old_tag_name, None)
+            self._row_by_name[tag_name] = row
             print(f"Tag renamed: '{old_tag_name}' → '{tag_name}' (not saved yet)")
             self.has_unsaved_changes = True
             return
         
         if tag_name not in self.tag_values[self.current_selected_station]:
-            self.tag_values[self.current_selected_station][tag_name] = {
-                'db': '',
-                'address': '',
-                'type': 'real',
-                'value': '-',
-                'display_format': 'DEC',
-                'sending_format': 'DEC'
-            }
+            self.tag_values[self.current_selected_station][tag_name] = Tag()
+            self.reindex_tag(row, tag_name)
             if tag_name:
                 self.add_log(self.current_selected_station, f"Tag '{tag_name}' added")
             self.has_unsaved_changes = True
-            self.save_tag_values()
+            self.schedule_save(self.current_selected_station)
             return
         
         new_value = item.text()
@@ -1154,11 +1628,13 @@ class TIAPortalGUI(QMainWindow):
                 item.setText(self.tag_values[self.current_selected_station][tag_name].get('address', ''))
                 return
             self.tag_values[self.current_selected_station][tag_name]['address'] = new_value
+            self.reindex_tag(row, tag_name)
             # Only log if tag_name is not empty
             if tag_name and tag_name.strip() != '':
                 self.add_log(self.current_selected_station, f"Tag '{tag_name}' address changed to '{new_value}'")
         elif col == 2:
             self.tag_values[self.current_selected_station][tag_name]['type'] = new_value
+            self.reindex_tag(row, tag_name)
         elif col == 3:
             self.tag_values[self.current_selected_station][tag_name]['value'] = new_value
             display_fmt = self.tag_values[self.current_selected_station][tag_name].get('display_format', 'DEC')
@@ -1179,7 +1655,9 @@ class TIAPortalGUI(QMainWindow):
             
             value_item = self.tag_table.item(row, 3)
             if value_item:
-                formatted_value = self.format_value(value_item.text(), new_value)
+                # Format the stored native value, not the text of the previous format
+                stored_tag = self.tag_values[self.current_selected_station][tag_name]
+                formatted_value = self.format_value(stored_tag.value, new_value, stored_tag.data_type)
                 self.tag_table.blockSignals(True)
                 value_item.setText(formatted_value)
                 self.tag_table.blockSignals(False)
@@ -1203,9 +1681,10 @@ class TIAPortalGUI(QMainWindow):
             address = self.tag_values[self.current_selected_station][tag_name].get('address', '').strip()
             if not address:  # Address is empty, remove this incomplete tag
                 del self.tag_values[self.current_selected_station][tag_name]
+                self.reindex_tag(row, tag_name)
         
         self.has_unsaved_changes = True
-        self.save_tag_values()  # Auto-save on every change
+        self.schedule_save(self.current_selected_station)  # Auto-save after a burst of edits
     
     def save_tag_changes(self):
         self.save_tag_values()
@@ -1303,6 +1782,10 @@ class TIAPortalGUI(QMainWindow):
             msg.exec_()
             return
         
+        if address_item.text().strip().startswith('='):
+            QMessageBox.warning(self, 'Calculated Tag', f"'{tag_name}' is calculated from other tags and cannot be forced.")
+            return
+        
         value_item = self.tag_table.item(row, 3)
         if value_item:
             value_to_send = value_item.text()
@@ -1341,11 +1824,16 @@ class TIAPortalGUI(QMainWindow):
                         QMessageBox.critical(self, 'PLC Connection Error', f'Cannot connect to PLC:\n{message}')
                         return
                 
-                try:
-                    int_value = int(value_to_send)
-                except ValueError:
+                # The stored native value, the cell may show it in another display format
+                stored_tag = self.tag_values.get(self.current_selected_station, {}).get(tag_name)
+                if stored_tag is not None and stored_tag.value is not None:
+                    native_value = stored_tag.value
+                else:
+                    native_value = parse_value(value_to_send)
+                if not isinstance(native_value, int):
                     QMessageBox.warning(self, 'Invalid Value', f'Value must be numeric: {value_to_send}')
                     return
+                int_value = int(native_value)
                 
                 success, send_message = self.plc_controller.send_tag(address, int_value, data_type)
                 
@@ -1407,6 +1895,11 @@ class TIAPortalGUI(QMainWindow):
         
         if reply == QMessageBox.Yes:
             self.save_tag_values()
+            if self.historian:
+                self.historian.close()
+            if self.metrics_exporter:
+                self.metrics_exporter.stop()
+            self.plc_controller.plc.stop_recording()
             msg = QMessageBox()
             msg.setIcon(QMessageBox.Information)
             msg.setWindowTitle('Saved')
@@ -1510,6 +2003,227 @@ class TIAPortalGUI(QMainWindow):
         self.has_unsaved_changes = True
         print(f"Added new tag row at index {current_row}")
     
+    def import_tags(self):
+        """Import a TIA Portal tag table export (XML/CSV) into the selected station"""
+        from PyQt5.QtWidgets import QFileDialog
+        
+        station = self.current_selected_station
+        if not station:
+            QMessageBox.warning(self, 'Station Required', 'Please select a station first!')
+            return
+        
+        path, _ = QFileDialog.getOpenFileName(
+            self,
+            'Import TIA Portal Tag Table',
+            '',
+            'TIA Portal tag tables (*.xml *.csv);;All files (*)'
+        )
+        if not path:
+            return
+        
+        self.ensure_station_loaded(station)
+        try:
+            imported, skipped, errors = import_tag_table(path, self.tag_values[station])
+        except (ValueError, IOError, SyntaxError) as e:
+            # ET.ParseError is a SyntaxError
+            self.add_log(station, f"✗ ERROR: Import failed - {str(e)}")
+            QMessageBox.critical(self, 'Import Failed', f'Cannot import {os.path.basename(path)}:\n{str(e)}')
+            return
+        
+        # One save and one table refresh for the whole file
+        self.tag_storage.mark_dirty(station)
+        self.save_timer.stop()
+        self.flush_tag_values()
+        self.load_station_tags(station)
+        
+        self.add_log(station, f"Imported {imported} tags from {os.path.basename(path)} ({skipped} skipped)")
+        details = '\n'.join(f"{name or '?'} ({address or '-'}): {reason}" for name, address, reason in errors[:10])
+        QMessageBox.information(
+            self,
+            'Import Finished',
+            f'Imported {imported} tags, skipped {skipped}.' + (f'\n\n{details}' if details else '')
+        )
+    
+    def export_data(self):
+        """Export a snapshot of the station or a history range to CSV/Parquet in a worker thread"""
+        from PyQt5.QtWidgets import QFileDialog, QInputDialog, QProgressDialog
+        from history_export import PYARROW_AVAILABLE, export_history, export_snapshot
+        
+        station = self.current_selected_station
+        if not station:
+            QMessageBox.warning(self, 'Station Required', 'Please select a station first!')
+            return
+        
+        ranges = {'History: last 10 minutes': 600, 'History: last hour': 3600,
+                  'History: last 24 hours': 86400, 'History: everything recorded': None}
+        choices = ['Snapshot of current values']
+        if self.historian:
+            choices += list(ranges)
+        choice, ok = QInputDialog.getItem(self, 'Export', 'What should be exported?', choices, 0, False)
+        if not ok:
+            return
+        
+        file_filter = 'CSV files (*.csv)' + (';;Parquet files (*.parquet)' if PYARROW_AVAILABLE else '')
+        path, selected_filter = QFileDialog.getSaveFileName(self, 'Export', '', file_filter)
+        if not path:
+            return
+        if not os.path.splitext(path)[1]:
+            path += '.parquet' if selected_filter.startswith('Parquet') else '.csv'
+        
+        self.ensure_station_loaded(station)
+        if choice in ranges:
+            end = time.time()
+            series = self.historian.tags(station)
+            firsts = [t for t in (self.historian.first_time(*key) for key in series) if t is not None]
+            start = end - ranges[choice] if ranges[choice] else min(firsts, default=end)
+            job = lambda progress, cancel: export_history(path, self.historian, series, start, end, progress, cancel)
+        else:
+            station_tags = dict(self.tag_values.get(station, {}))
+            job = lambda progress, cancel: export_snapshot(path, station, station_tags, self.historian)
+        
+        dialog = QProgressDialog(f'Exporting to {os.path.basename(path)}...', 'Cancel', 0, 100, self)
+        dialog.setWindowTitle('Export')
+        dialog.setMinimumDuration(500)
+        worker = ExportWorker(job, self)
+        worker.progress.connect(lambda percent, rows: dialog.setValue(percent))
+        dialog.canceled.connect(worker.cancel)
+        
+        def finished(success, message):
+            dialog.reset()
+            self.export_worker = None
+            if success:
+                self.add_log(station, f"Exported {os.path.basename(path)}: {message}")
+            else:
+                self.add_log(station, f"✗ Export of {os.path.basename(path)} failed: {message}")
+        
+        worker.done.connect(finished)
+        self.export_worker = worker  # Keep a reference while the thread runs
+        worker.start()
+    
+    def toggle_capture(self):
+        """Start a triggered capture of the selected tags, or stop the running one"""
+        from PyQt5.QtWidgets import QFormLayout, QDialogButtonBox, QDoubleSpinBox
+        from trigger_capture import DEFAULT_POLL_RATE_HZ, TRIGGER_MODES, Trigger, TriggeredCapture
+        
+        if self.capture_worker:
+            self.capture_worker.capture.stop()
+            return
+        
+        station = self.current_selected_station
+        if not station or not self.plc_controller.is_connected():
+            QMessageBox.warning(self, 'Capture', 'Connect to a PLC station first!')
+            return
+        
+        station_tags = self.tag_values.get(station, {})
+        selected = []
+        for row in sorted({index.row() for index in self.tag_table.selectedIndexes()}):
+            name_item = self.tag_table.item(row, 0)
+            if name_item and name_item.text().strip() in station_tags:
+                selected.append(name_item.text().strip())
+        if not selected:
+            QMessageBox.warning(self, 'Capture', 'Select the tag rows to capture (including the trigger tag).')
+            return
+        
+        dialog = QDialog(self)
+        dialog.setWindowTitle('Triggered Capture')
+        form = QFormLayout(dialog)
+        trigger_combo = QComboBox()
+        trigger_combo.addItems(selected)
+        mode_combo = QComboBox()
+        mode_combo.addItems(TRIGGER_MODES)
+        threshold_spin = QDoubleSpinBox()
+        threshold_spin.setRange(-1e12, 1e12)
+        pre_spin = QDoubleSpinBox()
+        pre_spin.setRange(0.0, 60.0)
+        pre_spin.setValue(1.0)
+        pre_spin.setSuffix(' s')
+        post_spin = QDoubleSpinBox()
+        post_spin.setRange(0.0, 60.0)
+        post_spin.setValue(1.0)
+        post_spin.setSuffix(' s')
+        form.addRow('Trigger tag', trigger_combo)
+        form.addRow('Condition', mode_combo)
+        form.addRow('Threshold', threshold_spin)
+        form.addRow('Pre-trigger', pre_spin)
+        form.addRow('Post-trigger', post_spin)
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(dialog.accept)
+        buttons.rejected.connect(dialog.reject)
+        form.addRow(buttons)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        
+        try:
+            trigger = Trigger(trigger_combo.currentText(), mode_combo.currentText(), threshold_spin.value())
+            capture = TriggeredCapture(self.plc_controller, station, {name: station_tags[name] for name in selected},
+                                       trigger, pre_spin.value(), post_spin.value(),
+                                       self.plc_config.get('capture_rate_hz', DEFAULT_POLL_RATE_HZ))
+        except ValueError as e:
+            QMessageBox.warning(self, 'Capture', str(e))
+            return
+        
+        # The capture gets the connection to itself, normal polling resumes afterwards
+        self._resume_polling = self.plc_read_timer.isActive()
+        self.plc_read_timer.stop()
+        self.capture_worker = CaptureWorker(capture, parent=self)
+        self.capture_worker.done.connect(self.on_capture_done)
+        self.capture_btn.setText('⏹ Stop Capture')
+        self.add_log(station, f"Capture armed: {trigger.describe()}, {len(capture.tag_names)} tags")
+        self.capture_worker.start()
+    
+    def on_capture_done(self, capture):
+        from trigger_capture import save_capture
+        
+        worker = self.capture_worker
+        worker.wait()
+        self.capture_worker = None
+        self.capture_btn.setText('⚡ Capture')
+        station = worker.capture.station
+        if self._resume_polling and self.plc_controller.is_connected():
+            self.plc_read_timer.start()
+        
+        if capture is None:
+            self.add_log(station, "Capture stopped before the trigger fired")
+            return
+        
+        capture_dir = self.plc_config.get('capture_dir', 'captures')
+        os.makedirs(capture_dir, exist_ok=True)
+        name = f"capture_{station.split('_')[0]}_{time.strftime('%Y%m%d_%H%M%S')}.npz"
+        path = os.path.join(capture_dir, name)
+        try:
+            save_capture(path, capture)
+        except IOError as e:
+            self.add_log(station, f"✗ ERROR: Cannot save capture - {str(e)}")
+            return
+        stats = capture.stats
+        self.add_log(station, f"Capture saved to {path}: {stats['samples']} samples, "
+                              f"{stats.get('rate_hz', 0):.0f} Hz, interval {stats.get('interval_mean_ms', 0):.2f} ms "
+                              f"(std {stats.get('interval_std_ms', 0):.2f}, p99 {stats.get('interval_p99_ms', 0):.2f}, "
+                              f"max {stats.get('interval_max_ms', 0):.2f} ms)")
+        if capture.pre_truncated:
+            self.add_log(station, f"⚠ Capture pre-trigger window is {capture.captured_pre_s:.3f} s "
+                                  f"of {capture.pre_s:g} s (trigger fired soon after arming)")
+    
+    def toggle_trend_tags(self):
+        """Add the selected tags to the trend chart, or remove them if all are shown"""
+        if not self.trend_widget or not self.current_selected_station:
+            return
+        station = self.current_selected_station
+        names = []
+        for row in sorted({index.row() for index in self.tag_table.selectedIndexes()}):
+            name_item = self.tag_table.item(row, 0)
+            if name_item and name_item.text().strip():
+                names.append(name_item.text().strip())
+        if not names:
+            self.add_log(station, "Select tag rows to show them in the trend chart")
+            return
+        if all(self.trend_widget.has_series(station, name) for name in names):
+            for name in names:
+                self.trend_widget.remove_series(station, name)
+        else:
+            for name in names:
+                self.trend_widget.add_series(station, name)
+    
     def delete_tag_row(self, row):
         tag_name_item = self.tag_table.item(row, 0)
         tag_name = tag_name_item.text().strip() if tag_name_item else ''
@@ -1518,11 +2232,47 @@ class TIAPortalGUI(QMainWindow):
             if self.current_selected_station in self.tag_values:
                 if tag_name in self.tag_values[self.current_selected_station]:
                     del self.tag_values[self.current_selected_station][tag_name]
-                    self.save_tag_values()
+                    if self.current_selected_station in self.address_indexes:
+                        self.address_indexes[self.current_selected_station].remove(tag_name)
+                    if self.current_selected_station in self.search_indexes:
+                        self.search_indexes[self.current_selected_station].remove(tag_name)
+                    self.schedule_save(self.current_selected_station)
                     self.add_log(self.current_selected_station, f"Tag '{tag_name}' deleted")
         
         self.tag_table.removeRow(row)
         self.has_unsaved_changes = True
+        
+        # Rows below moved up by one
+        self._old_tag_names = {}
+        for r in range(self.tag_table.rowCount()):
+            item = self.tag_table.item(r, 0)
+            if item and item.text().strip():
+                self._old_tag_names[r] = item.text().strip()
+        self._row_by_name = {tag_name: r for r, tag_name in self._old_tag_names.items()}
+    
+    def filter_tag_table(self, text):
+        """
+        Show only rows whose name or address starts with text
+        Only rows whose visibility changes are touched.
+        """
+        index = self.search_indexes.get(self.current_selected_station)
+        matches = index.search(text) if index else None
+        previous = self._filter_matches
+        if matches is None and previous is None:
+            return
+        
+        if previous is None:
+            changed = self._row_by_name.keys() - matches
+        elif matches is None:
+            changed = self._row_by_name.keys() - previous
+        else:
+            changed = previous ^ matches
+        
+        for tag_name in changed:
+            row = self._row_by_name.get(tag_name)
+            if row is not None:
+                self.tag_table.setRowHidden(row, matches is not None and tag_name not in matches)
+        self._filter_matches = matches
     
     def toggle_sidebar(self):
         """Toggle left sidebar visibility"""
@@ -1531,42 +2281,9 @@ class TIAPortalGUI(QMainWindow):
         else:
             self.left_panel.show()
     
-    def format_value(self, value, display_format):
-        if not value or value == '-':
-            return '-'
-        
-        try:
-            if isinstance(value, str):
-                val = value.strip()
-                if val.startswith('0x') or val.startswith('0X'):
-                    num = int(val, 16)
-                elif val.startswith('0b') or val.startswith('0B'):
-                    num = int(val, 2)
-                else:
-                    num = int(float(val))
-            else:
-                num = int(value)
-            
-            if display_format == 'DEC/J' or display_format == 'DEC':
-                return str(num)
-            elif display_format == 'Hex':
-                return f'0x{num:X}'
-            elif display_format == 'Bin':
-                return f'0b{num:b}'
-            elif display_format == 'Octal':
-                return f'0o{num:o}'
-            elif display_format == 'BCD':
-                return f'0x{num:02X}'
-            elif display_format in ['Character', 'Unicode character']:
-                if 0 <= num <= 127:
-                    return chr(num)
-                else:
-                    return str(num)
-            else:
-                return str(num)
-        
-        except (ValueError, TypeError):
-            return value
+    def format_value(self, value, display_format, data_type=None):
+        """Format a native or stored value for the table (see value_format)"""
+        return format_value(value, display_format, data_type)
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
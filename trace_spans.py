@@ -0,0 +1,115 @@
+
+import json
+import os
+import threading
+from collections import deque
+from time import perf_counter_ns
+
+# Events kept while tracing, the oldest are dropped first
+DEFAULT_CAPACITY = 200000
+
+
+class _NullSpan:
+    """Returned by span() while tracing is off, does nothing"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'category', 'args', 'start')
+
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.complete(self.name, self.start, perf_counter_ns() - self.start, self.args, self.category)
+        return False
+
+
+class Tracer:
+    """
+    Span recorder for Chrome Trace Event JSON (chrome://tracing, Perfetto)
+
+    While disabled, span() returns a shared no-op object and callers with
+    their own timestamps check `enabled` before complete(), so leaving the
+    calls in the code costs next to nothing. While enabled, every finished
+    span is one tuple appended to a bounded deque.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.enabled = False
+        self.capacity = capacity
+        self.events = deque(maxlen=capacity)
+        self.thread_names = {}
+        self.origin_ns = perf_counter_ns()
+
+    def start(self, capacity=None):
+        """Clear the buffer and start recording"""
+        if capacity:
+            self.capacity = capacity
+        self.events = deque(maxlen=self.capacity)
+        self.thread_names = {}
+        self.origin_ns = perf_counter_ns()
+        self.enabled = True
+
+    def stop(self):
+        self.enabled = False
+
+    def span(self, name, category='app', **args):
+        """Context manager timing the with block"""
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, name, category, args)
+
+    def complete(self, name, start_ns, duration_ns, args=None, category='app'):
+        """Record a finished span measured with perf_counter_ns()"""
+        tid = threading.get_ident()
+        if tid not in self.thread_names:
+            self.thread_names[tid] = threading.current_thread().name
+        self.events.append((name, category, start_ns, duration_ns, tid, args))
+
+    def trace_events(self):
+        """Buffer as a list of Chrome trace events (complete 'X' events, times in µs)"""
+        pid = os.getpid()
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+                  for tid, name in list(self.thread_names.items())]
+        origin = self.origin_ns
+        for name, category, start_ns, duration_ns, tid, args in list(self.events):
+            event = {'name': name, 'cat': category, 'ph': 'X', 'pid': pid, 'tid': tid,
+                     'ts': (start_ns - origin) / 1000.0, 'dur': duration_ns / 1000.0}
+            if args:
+                event['args'] = {key: value if isinstance(value, (int, float, bool)) else str(value)
+                                 for key, value in args.items()}
+            events.append(event)
+        return events
+
+    def dump(self, path):
+        """
+        Write the buffer as Chrome Trace Event JSON
+        Returns: number of span events written
+        """
+        events = self.trace_events()
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        return sum(1 for event in events if event['ph'] == 'X')
+
+
+# Process-wide tracer used by the GUI, PLCConnection and the worker threads
+TRACER = Tracer()
+span = TRACER.span
@@ -0,0 +1,213 @@
+
+import time
+
+import numpy as np
+from PyQt5.QtCore import Qt, QPointF
+from PyQt5.QtGui import QColor, QFont, QPainter, QPen, QPolygonF
+from PyQt5.QtWidgets import QWidget
+
+DEFAULT_WINDOW_S = 300
+SERIES_COLORS = ['#27ae60', '#2980b9', '#c0392b', '#8e44ad', '#d35400', '#16a085', '#2c3e50', '#f39c12']
+MARGIN = 40
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling, vectorized
+    Every bucket keeps the point forming the largest triangle with the
+    neighbouring buckets. All buckets are computed at once, so the left
+    corner is the average of the previous bucket instead of the point
+    chosen there (the usual sequential form).
+    Args:
+        x, y: arrays of equal length, x ascending
+        threshold: number of points to keep (>= 3)
+    Returns: (x, y) with at most threshold points, first and last kept
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return x, y
+
+    # Interior points 1..n-2 split into threshold-2 buckets of >= 1 point
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    counts = np.diff(edges)
+    sum_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sum_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    avg_x = np.concatenate(([x[0]], sum_x / counts, [x[-1]]))
+    avg_y = np.concatenate(([y[0]], sum_y / counts, [y[-1]]))
+
+    index = edges[:-1, None] + np.arange(counts.max())[None, :]
+    valid = index < edges[1:, None]
+    index = np.minimum(index, n - 2)
+
+    ax = avg_x[:-2, None]
+    ay = avg_y[:-2, None]
+    cx = avg_x[2:, None]
+    cy = avg_y[2:, None]
+    area = np.abs((ax - cx) * (y[index] - ay) - (ax - x[index]) * (cy - ay))
+    area[~valid] = -1.0
+    picked = index[np.arange(len(index)), np.argmax(area, axis=1)]
+
+    keep = np.concatenate(([0], picked, [n - 1]))
+    return x[keep], y[keep]
+
+
+class TrendSeries:
+    """Samples of one plotted tag in the visible window"""
+
+    __slots__ = ('station', 'tag_name', 'color', 'times', 'values', 'resolution', 'plot')
+
+    def __init__(self, station, tag_name, color):
+        self.station = station
+        self.tag_name = tag_name
+        self.color = QColor(color)
+        self.times = np.empty(0)
+        self.values = np.empty(0)
+        self.resolution = 0.0
+        self.plot = None  # Downsampled (times, values), None when stale
+
+
+class TrendWidget(QWidget):
+    """
+    Live trend of historian tags
+
+    refresh() fetches only the samples newer than the last one shown (or
+    the rollup buckets from the last one shown on, when the window is wider
+    than one second per pixel) and downsamples with LTTB to the widget width, so the drawing cost depends
+    on the pixel width, not on the number of samples.
+    """
+
+    def __init__(self, historian, parent=None):
+        super().__init__(parent)
+        self.historian = historian
+        self.window_s = DEFAULT_WINDOW_S
+        self.series = {}  # (station, tag_name) -> TrendSeries
+        self.setMinimumWidth(250)
+        self.setMinimumHeight(150)
+
+    def add_series(self, station, tag_name):
+        key = (station, tag_name)
+        if key not in self.series:
+            color = SERIES_COLORS[len(self.series) % len(SERIES_COLORS)]
+            self.series[key] = TrendSeries(station, tag_name, color)
+            self.refresh()
+
+    def remove_series(self, station, tag_name):
+        if self.series.pop((station, tag_name), None) is not None:
+            self.update()
+
+    def has_series(self, station, tag_name):
+        return (station, tag_name) in self.series
+
+    def clear(self):
+        self.series.clear()
+        self.update()
+
+    def set_window(self, seconds):
+        self.window_s = seconds
+        for series in self.series.values():
+            series.times = np.empty(0)
+            series.values = np.empty(0)
+        self.refresh()
+
+    def _plot_width(self):
+        return max(self.width() - 2 * MARGIN, 10)
+
+    def refresh(self, now=None):
+        """Pull new samples from the historian and repaint"""
+        if now is None:
+            now = time.time()
+        start = now - self.window_s
+        resolution = self.window_s / self._plot_width()
+        for series in self.series.values():
+            if resolution >= 1.0:
+                # Rollup buckets, about one per pixel. While the window stays on the same
+                # tier only the buckets from the last one shown on (it may still have been
+                # open) are fetched, asking for exactly that tier.
+                size = self.historian.rollup_size(series.station, series.tag_name, start, resolution)
+                incremental = size and size == series.resolution and len(series.times)
+                if incremental:
+                    since = series.times[-1] - size / 2
+                    size, buckets = self.historian.query_rollup(series.station, series.tag_name, since, None, size)
+                elif size:
+                    size, buckets = self.historian.query_rollup(series.station, series.tag_name, start, None,
+                                                                resolution)
+                if size:
+                    times = buckets['t'] + size / 2
+                    values = buckets['sum'] / np.maximum(buckets['count'], 1)
+                    if incremental:
+                        # Replace the buckets fetched again, drop the ones left of the window
+                        keep = np.searchsorted(series.times, start - size / 2, 'right')
+                        cut = np.searchsorted(series.times, times[0], 'left') if len(times) else len(series.times)
+                        times = np.concatenate((series.times[keep:max(cut, keep)], times))
+                        values = np.concatenate((series.values[keep:max(cut, keep)], values))
+                    series.times = times
+                    series.values = values
+                    series.resolution = size
+                    series.plot = None
+                    continue
+
+            if series.resolution or not len(series.times):
+                first = start
+                series.times = np.empty(0)
+                series.values = np.empty(0)
+            else:
+                first = np.nextafter(series.times[-1], np.inf)
+            series.resolution = 0.0
+            times, values = self.historian.query(series.station, series.tag_name, first, None)
+            keep = np.searchsorted(series.times, start, 'left')
+            if len(times) or keep:
+                series.times = np.concatenate((series.times[keep:], times))
+                series.values = np.concatenate((series.values[keep:], values))
+                series.plot = None
+        self.update()
+
+    def resizeEvent(self, event):
+        for series in self.series.values():
+            series.plot = None
+        super().resizeEvent(event)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.fillRect(self.rect(), QColor('#FFFFFF'))
+
+        left = MARGIN
+        top = 10
+        width = self._plot_width()
+        height = max(self.height() - top - MARGIN, 10)
+        painter.setPen(QPen(QColor('#d3d3d3')))
+        painter.drawRect(left, top, width, height)
+
+        plots = []
+        for series in self.series.values():
+            if series.plot is None:
+                series.plot = lttb(series.times, series.values, width)
+            if len(series.plot[0]):
+                plots.append((series, series.plot))
+
+        painter.setFont(QFont('Arial', 8))
+        if not plots:
+            painter.setPen(QColor('#7f8c8d'))
+            painter.drawText(self.rect(), Qt.AlignCenter, 'Select tags and press 📈 Trend')
+            return
+
+        t_end = max(plot[0][-1] for _, plot in plots)
+        t_start = t_end - self.window_s
+        low = min(float(plot[1].min()) for _, plot in plots)
+        high = max(float(plot[1].max()) for _, plot in plots)
+        if high == low:
+            high += 1.0
+            low -= 1.0
+
+        painter.setPen(QColor('#2c3e50'))
+        painter.drawText(2, top + 10, f'{high:g}')
+        painter.drawText(2, top + height, f'{low:g}')
+        painter.drawText(left, top + height + 15, f'-{self.window_s:g} s')
+
+        for i, (series, (times, values)) in enumerate(plots):
+            xs = left + (times - t_start) * (width / self.window_s)
+            ys = top + height - (values - low) * (height / (high - low))
+            polygon = QPolygonF([QPointF(x, y) for x, y in zip(xs.tolist(), ys.tolist())])
+            painter.setPen(QPen(series.color, 1.5))
+            painter.drawPolyline(polygon)
+            painter.drawText(left + 5, top + 24 + i * 12, f'{series.tag_name} ({series.station})')
@@ -0,0 +1,230 @@
+
+import json
+import threading
+import time
+
+import numpy as np
+
+from address_index import AddressIndex
+
+# Trigger conditions on the trigger tag, the threshold ones fire when the condition becomes true
+TRIGGER_MODES = ('rising', 'falling', 'change', 'above', 'below', 'equal')
+
+# Capture poll rate, the loop is paced to it and the pre-trigger ring sized for it
+DEFAULT_POLL_RATE_HZ = 1000
+DEFAULT_PRE_S = 1.0
+DEFAULT_POST_S = 1.0
+
+
+class Trigger:
+    """Edge or condition on one tag"""
+
+    def __init__(self, tag_name, mode='rising', threshold=0.0):
+        if mode not in TRIGGER_MODES:
+            raise ValueError(f"Unknown trigger mode: {mode}")
+        self.tag_name = tag_name
+        self.mode = mode
+        self.threshold = threshold
+
+    def condition(self, value):
+        if self.mode == 'above':
+            return value > self.threshold
+        if self.mode == 'below':
+            return value < self.threshold
+        if self.mode == 'equal':
+            return value == self.threshold
+        return bool(value)
+
+    def fires(self, previous, value):
+        """True if the change previous -> value is a trigger (previous None: first sample)"""
+        if previous is None or np.isnan(previous) or np.isnan(value):
+            return False
+        if self.mode == 'change':
+            return value != previous
+        if self.mode == 'falling':
+            return bool(previous) and not bool(value)
+        return self.condition(value) and not self.condition(previous)
+
+    def describe(self):
+        if self.mode in ('above', 'below', 'equal'):
+            return f"{self.tag_name} {self.mode} {self.threshold:g}"
+        return f"{self.tag_name} {self.mode}"
+
+
+def jitter_stats(times):
+    """Poll interval statistics of a capture, in milliseconds"""
+    if len(times) < 2:
+        return {'samples': int(len(times))}
+    intervals = np.diff(times) * 1000.0
+    return {
+        'samples': int(len(times)),
+        'rate_hz': float(1000.0 / intervals.mean()),
+        'interval_mean_ms': float(intervals.mean()),
+        'interval_std_ms': float(intervals.std()),
+        'interval_min_ms': float(intervals.min()),
+        'interval_p50_ms': float(np.percentile(intervals, 50)),
+        'interval_p99_ms': float(np.percentile(intervals, 99)),
+        'interval_max_ms': float(intervals.max()),
+    }
+
+
+class Capture:
+    """Frozen pre/post trigger window"""
+
+    def __init__(self, station, tag_names, times, values, trigger, trigger_time, pre_s, post_s, rate_hz=None):
+        self.station = station
+        self.tag_names = tag_names
+        self.times = times        # time.time() seconds
+        self.values = values      # (samples, tags), NaN where a read failed
+        self.trigger = trigger
+        self.trigger_time = trigger_time
+        self.pre_s = pre_s
+        self.post_s = post_s
+        self.rate_hz = rate_hz
+        # Less than pre_s if the trigger fired soon after arming
+        self.captured_pre_s = float(trigger_time - times[0]) if len(times) else 0.0
+        self.stats = jitter_stats(times)
+
+    @property
+    def pre_truncated(self):
+        """True if the window starts later than pre_s before the trigger"""
+        tolerance = 1.0 / self.rate_hz if self.rate_hz else 0.0
+        return self.captured_pre_s + tolerance < self.pre_s
+
+    def metadata(self):
+        return {
+            'station': self.station,
+            'tags': self.tag_names,
+            'trigger': self.trigger.describe(),
+            'trigger_time': self.trigger_time,
+            'pre_s': self.pre_s,
+            'captured_pre_s': self.captured_pre_s,
+            'post_s': self.post_s,
+            'rate_hz': self.rate_hz,
+            'stats': self.stats,
+        }
+
+
+def save_capture(path, capture):
+    """Write a capture as .npz (times, values, JSON metadata)"""
+    np.savez_compressed(path, times=capture.times, values=capture.values,
+                        metadata=np.array(json.dumps(capture.metadata())))
+
+
+def load_capture(path):
+    """
+    Read a save_capture file
+    Returns: (metadata dict, times, values)
+    """
+    with np.load(path) as data:
+        return json.loads(str(data['metadata'])), data['times'], data['values']
+
+
+class TriggeredCapture:
+    """
+    Polls a small tag set at rate_hz (or slower if the connection cannot keep up)
+
+    All tags are read with the merged block reads of AddressIndex, every
+    scan goes into a pre-trigger ring buffer sized for pre_s + post_s at
+    rate_hz, the loop is paced so a fast backend cannot wrap it early. When the trigger fires, polling
+    continues for post_s seconds and the window from pre_s before the
+    trigger is frozen into a Capture.
+    """
+
+    def __init__(self, controller, station, tags, trigger, pre_s=DEFAULT_PRE_S, post_s=DEFAULT_POST_S,
+                 rate_hz=DEFAULT_POLL_RATE_HZ):
+        """
+        Args:
+            controller: PLCController
+            tags: {tag_name: Tag}, must contain the trigger tag
+            trigger: Trigger
+            rate_hz: Polls per second
+        """
+        if rate_hz <= 0:
+            raise ValueError(f"Invalid capture rate: {rate_hz} Hz")
+        if trigger.tag_name not in tags:
+            raise ValueError(f"Trigger tag {trigger.tag_name} is not in the capture tag set")
+        self.controller = controller
+        self.station = station
+        self.trigger = trigger
+        self.pre_s = pre_s
+        self.post_s = post_s
+        self.rate_hz = rate_hz
+
+        index = AddressIndex()
+        index.rebuild(tags)
+        self.ranges = index.read_ranges()
+        self.tag_names = sorted(name for _, _, _, _, members in self.ranges for name, _, _ in members)
+        if trigger.tag_name not in self.tag_names:
+            raise ValueError(f"Trigger tag {trigger.tag_name} cannot be read (unsupported address or type)")
+        self.columns = {name: i for i, name in enumerate(self.tag_names)}
+        self.trigger_column = self.columns[trigger.tag_name]
+
+        # A little headroom for polls that catch up after a slow read
+        self.capacity = int((pre_s + post_s) * rate_hz * 1.1) + 2
+        self.times = np.zeros(self.capacity)
+        self.values = np.full((self.capacity, len(self.tag_names)), np.nan)
+        self.head = 0
+        self.count = 0
+        self.stop_event = threading.Event()
+
+    def poll_once(self, now):
+        """Read all tags into the next ring row"""
+        row = self.values[self.head]
+        row.fill(np.nan)
+        for name, value in self.controller.read_ranges(self.ranges).items():
+            if value is not None:
+                row[self.columns[name]] = float(value)
+        self.times[self.head] = now
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        return row[self.trigger_column]
+
+    def window(self, start):
+        """Ring contents from start on, oldest first"""
+        if self.count < self.capacity:
+            times = self.times[:self.count]
+            values = self.values[:self.count]
+        else:
+            times = np.concatenate((self.times[self.head:], self.times[:self.head]))
+            values = np.concatenate((self.values[self.head:], self.values[:self.head]))
+        i = np.searchsorted(times, start, 'left')
+        return times[i:].copy(), values[i:].copy()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self, timeout_s=None):
+        """
+        Poll until the trigger fired and the post window is full
+        Returns: Capture, or None if stopped/timed out/disconnected first
+        """
+        # Wall clock at start, perf_counter for the intervals
+        wall_start = time.time()
+        perf_start = time.perf_counter()
+        period = 1.0 / self.rate_hz
+        next_poll = perf_start
+        previous = None
+        trigger_time = None
+        while not self.stop_event.is_set():
+            if not self.controller.is_connected():
+                return None
+            delay = next_poll - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -period:
+                next_poll = time.perf_counter()  # Slower than rate_hz, no burst to catch up
+            next_poll += period
+            now = wall_start + (time.perf_counter() - perf_start)
+            value = self.poll_once(now)
+            if trigger_time is None:
+                if self.trigger.fires(previous, value):
+                    trigger_time = now
+                elif timeout_s is not None and now - wall_start > timeout_s:
+                    return None
+                previous = value
+            elif now - trigger_time >= self.post_s:
+                times, values = self.window(trigger_time - self.pre_s)
+                return Capture(self.station, self.tag_names, times, values, self.trigger,
+                               trigger_time, self.pre_s, self.post_s, self.rate_hz)
+        return None
@@ -0,0 +1,244 @@
+
+from functools import lru_cache
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+from tag_model import (DataType, DisplayFormat, display_format_from_name, data_type_from_name,
+                       parse_value, value_to_text)
+
+MS_PER_DAY = 24 * 60 * 60 * 1000
+
+# IEC duration units, largest first
+_TIME_UNITS = (('D', 86400000), ('H', 3600000), ('M', 60000), ('S', 1000), ('MS', 1))
+
+
+def _bits_of(data_type):
+    return data_type.bits if isinstance(data_type, DataType) and data_type.bits >= 8 else None
+
+
+def _unsigned(num, bits):
+    """Value masked to the type width (two's complement), 32 bit for negatives of unknown width"""
+    if bits:
+        return num & ((1 << bits) - 1)
+    if num < 0:
+        return num & 0xFFFFFFFF
+    return num
+
+
+def fmt_dec(num, bits):
+    return str(num)
+
+
+def fmt_hex(num, bits):
+    return f'0x{_unsigned(num, bits):X}'
+
+
+def fmt_bin(num, bits):
+    return f'0b{_unsigned(num, bits):b}'
+
+
+def fmt_octal(num, bits):
+    return f'0o{_unsigned(num, bits):o}'
+
+
+def fmt_bcd(num, bits):
+    """123 -> 0x0123 (each decimal digit in one nibble)"""
+    digits = str(abs(num))
+    width = max(len(digits), (bits or 8) // 4)
+    return ('-' if num < 0 else '') + '0x' + digits.zfill(width)
+
+
+def fmt_character(num, bits):
+    if 0 <= num <= 127:
+        return chr(num)
+    return str(num)
+
+
+def fmt_unicode_character(num, bits):
+    if 0 <= num <= 0x10FFFF and chr(num).isprintable():
+        return chr(num)
+    return str(num)
+
+
+def fmt_dec_sequence(num, bits):
+    """Bytes of the value in decimal: 291 as Word -> B#(1, 35)"""
+    num = _unsigned(num, bits)
+    size = (bits // 8) if bits else max(1, (num.bit_length() + 7) // 8)
+    return 'B#(' + ', '.join(str(b) for b in num.to_bytes(size, byteorder='big')) + ')'
+
+
+def fmt_time(num, bits):
+    """IEC duration from milliseconds: 93784005 -> T#1D_2H_3M_4S_5MS"""
+    sign = '-' if num < 0 else ''
+    rest = abs(num)
+    parts = []
+    for unit, size in _TIME_UNITS:
+        count, rest = divmod(rest, size)
+        if count:
+            parts.append(f'{count}{unit}')
+    return f"T#{sign}{'_'.join(parts) or '0MS'}"
+
+
+def fmt_time_of_day(num, bits):
+    """Milliseconds since midnight -> TOD#HH:MM:SS.mmm"""
+    num %= MS_PER_DAY
+    seconds, ms = divmod(num, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'TOD#{hours:02d}:{minutes:02d}:{seconds:02d}.{ms:03d}'
+
+
+# One callable per display format, all take (int, bit width or None)
+FORMATTERS = {
+    DisplayFormat.DEC_J: fmt_dec,
+    DisplayFormat.DEC: fmt_dec,
+    DisplayFormat.HEX: fmt_hex,
+    DisplayFormat.BCD: fmt_bcd,
+    DisplayFormat.OCTAL: fmt_octal,
+    DisplayFormat.BIN: fmt_bin,
+    DisplayFormat.CHARACTER: fmt_character,
+    DisplayFormat.UNICODE_CHARACTER: fmt_unicode_character,
+    DisplayFormat.DEC_SEQUENCE: fmt_dec_sequence,
+    DisplayFormat.TIME_OF_DAY: fmt_time_of_day,
+    DisplayFormat.TIME: fmt_time,
+}
+
+# Formats that show a Real as a real number instead of truncating it (and ON/OFF as text)
+_DECIMAL_FORMATS = (DisplayFormat.DEC_J, DisplayFormat.DEC)
+
+
+@lru_cache(maxsize=None)
+def get_formatter(display_format, data_type=None):
+    """
+    Precomputed formatter for a display format and data type
+    Args:
+        display_format: DisplayFormat or its name
+        data_type: DataType, its name or None
+    Returns:
+        callable(value) -> str, value may be native or a stored string
+    """
+    if isinstance(display_format, str):
+        display_format = display_format_from_name(display_format)
+    if isinstance(data_type, str):
+        data_type = data_type_from_name(data_type)
+
+    formatter = FORMATTERS.get(display_format, fmt_dec)
+    bits = _bits_of(data_type)
+    keep_float = display_format in _DECIMAL_FORMATS
+
+    def format_one(value):
+        original = value
+        if isinstance(value, str):
+            value = parse_value(value)
+            if isinstance(value, str):
+                return value
+        if value is None:
+            return '-'
+        if isinstance(value, bool) and keep_float:
+            return value_to_text(value)
+        try:
+            if isinstance(value, float):
+                if keep_float and not value.is_integer():
+                    return str(value)
+                value = int(value)
+            return formatter(int(value), bits)
+        except (ValueError, OverflowError):
+            # nan/inf or a value the format cannot show: shown unchanged
+            return str(original)
+
+    return format_one
+
+
+def format_value(value, display_format, data_type=None):
+    """Format one value, see get_formatter"""
+    return get_formatter(display_format, data_type)(value)
+
+
+# Column formatting: the integers of the simple formats as one int64 array
+
+_DIGITS = b'0123456789ABCDEF'
+
+
+def _vec_unsigned(array, bits):
+    """_unsigned of an int64 array, as uint64"""
+    if bits and bits < 64:
+        return array.astype(np.uint64) & np.uint64((1 << bits) - 1)
+    if bits:
+        return array.astype(np.uint64)
+    return np.where(array < 0, array & 0xFFFFFFFF, array).astype(np.uint64)
+
+
+def _vec_radix(array, bits, shift, prefix):
+    """Hex/Octal/Bin text of an int64 array, shift = bits per digit"""
+    unsigned = _vec_unsigned(array, bits)
+    width = max(1, -(-int(unsigned.max()).bit_length() // shift))  # Digits of the largest value
+    shifts = np.arange((width - 1) * shift, -1, -shift, dtype=np.uint64)
+    digit_values = (unsigned[:, None] >> shifts) & np.uint64((1 << shift) - 1)
+    digits = np.frombuffer(_DIGITS, dtype=np.uint8)[digit_values.astype(np.intp)]
+    text = np.ascontiguousarray(digits).view(f'S{width}').ravel()
+    text = np.char.lstrip(text, b'0')
+    text[text == b''] = b'0'
+    return np.char.add(prefix, text.astype(str)).tolist()
+
+
+def _vec_dec(array, bits):
+    return array.astype(str).tolist()
+
+
+def _vec_bcd(array, bits):
+    digits = np.char.zfill(np.abs(array).astype(str), (bits or 8) // 4)
+    return np.char.add(np.where(array < 0, '-0x', '0x'), digits).tolist()
+
+
+_VECTOR_FORMATTERS = {
+    DisplayFormat.DEC_J: _vec_dec,
+    DisplayFormat.DEC: _vec_dec,
+    DisplayFormat.HEX: lambda array, bits: _vec_radix(array, bits, 4, '0x'),
+    DisplayFormat.OCTAL: lambda array, bits: _vec_radix(array, bits, 3, '0o'),
+    DisplayFormat.BIN: lambda array, bits: _vec_radix(array, bits, 1, '0b'),
+    DisplayFormat.BCD: _vec_bcd,
+}
+
+
+def format_values(values, display_format, data_type=None):
+    """
+    Format a whole column of values of one display format and data type
+    Same text as format_value for every element, the formatter is looked up
+    once. With NumPy the integers of a DEC/Hex/Bin/Octal/BCD column (or an
+    integer array) are formatted in one vectorized pass; None, text, bools
+    and floats go through the single value formatter.
+    Returns: [str, ...]
+    """
+    format_one = get_formatter(display_format, data_type)
+    if isinstance(display_format, str):
+        display_format = display_format_from_name(display_format)
+    if isinstance(data_type, str):
+        data_type = data_type_from_name(data_type)
+    vector = _VECTOR_FORMATTERS.get(display_format) if NUMPY_AVAILABLE else None
+    bits = _bits_of(data_type)
+
+    if NUMPY_AVAILABLE and isinstance(values, np.ndarray):
+        if vector is not None and values.dtype.kind in 'iu' and len(values):
+            return vector(values.astype(np.int64).ravel(), bits)
+        values = values.tolist()
+    if vector is None:
+        return list(map(format_one, values))
+
+    values = list(values)
+    positions = [i for i, value in enumerate(values) if type(value) is int]
+    if not positions:
+        return list(map(format_one, values))
+    try:
+        array = np.array([values[i] for i in positions], dtype=np.int64)
+    except OverflowError:
+        return list(map(format_one, values))
+    if len(positions) == len(values):
+        return vector(array, bits)
+    results = [None if type(value) is int else format_one(value) for value in values]
+    for i, text in zip(positions, vector(array, bits)):
+        results[i] = text
+    return results